@@ -1,22 +1,96 @@
+import ctypes
 import gc
+import logging
+import sys
 import time
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import asdict, is_dataclass, replace
+from io import StringIO
 from threading import Lock
-from typing import Tuple, Union
-
-import torch
+from typing import Iterator, List, Optional, Tuple, Union
 
+from app.asr_models.priority_lock import PriorityLock
+from app.audio import SpooledAudio
 from app.config import CONFIG
+from app.exceptions import TranscriptionCancelledError, UnsupportedModelError
+from app.output.result_writers import get_writer
+
+logger = logging.getLogger(__name__)
+
+# Idle tiers of a model, see IdleSupervisor
+MODEL_LOADED = "loaded"
+MODEL_CACHES_RELEASED = "caches_released"
+MODEL_OFFLOADED = "offloaded"
+MODEL_UNLOADED = "unloaded"
 
 
 class ASRModel(ABC):
     """
     Abstract base class for ASR (Automatic Speech Recognition) models.
+    Each instance owns its model and lock, so several instances can serve requests in parallel.
     """
 
-    model = None
-    model_lock = Lock()
-    last_activity_time = time.time()
+    # Subtitle layout options passed to the result writers
+    writer_options: dict = {}
+    # Whether transcribe_batch() runs several inputs in one forward pass
+    supports_batching: bool = False
+
+    def __init__(self, cpu_threads: int = 0, model_name: Optional[str] = None):
+        """
+        cpu_threads limits the intra-op threads used by this instance, 0 keeps the engine default.
+        model_name is the model the engine loads, ASR_MODEL by default.
+        """
+        self.model_name = model_name or CONFIG.MODEL_NAME
+        self.model = None
+        # Waiting live chunks get the model before uploads, see InferenceExecutor
+        self.model_lock = PriorityLock()
+        self.last_activity_time = time.time()
+        self.cpu_threads = cpu_threads
+        self._idle_state = MODEL_LOADED
+        self._idle_lock = Lock()
+        # Calls inside active(), the idle supervisor leaves the model alone while there are any
+        self._active = 0
+        # Count and total seconds of the loads and restores done in the request path
+        self._reloads = {"load": [0, 0.0, None], "restore": [0, 0.0, None]}
+
+    def resolve_model_name(self, model_name: Optional[str] = None) -> str:
+        """
+        Return the name of the model that serves ``model_name``, None meaning the default model, without
+        loading it. Raises UnsupportedModelError for a model that is not served.
+        """
+        if model_name is None or model_name == self.model_name:
+            return self.model_name
+        raise UnsupportedModelError(f"Unsupported model: {model_name}. Choose '{self.model_name}'.")
+
+    def select(self, model_name: Optional[str] = None) -> "ASRModel":
+        """
+        Return the model that serves requests for ``model_name``, None meaning the default model.
+        A single engine only serves its own model, ModelRegistry serves several.
+        """
+        self.resolve_model_name(model_name)
+        return self
+
+    def pin(self, model_name: Optional[str] = None) -> str:
+        """
+        Keep the model for ``model_name`` from being unloaded to make room for other models until unpin(), and
+        return its name. Nothing is loaded. Only ModelRegistry unloads models for others, so by default this only
+        resolves the name.
+        """
+        return self.resolve_model_name(model_name)
+
+    def unpin(self, model_name: str):
+        """Release a pin() of ``model_name``. A single engine has nothing to release."""
+        return None
+
+    @contextmanager
+    def use(self, model_name: Optional[str] = None) -> Iterator["ASRModel"]:
+        """select() the model for ``model_name`` and keep it pinned until the block ends. Loading blocks."""
+        model_name = self.pin(model_name)
+        try:
+            yield self.select(model_name)
+        finally:
+            self.unpin(model_name)
 
     @abstractmethod
     def load_model(self):
@@ -26,6 +100,23 @@ class ASRModel(ABC):
         pass
 
     @abstractmethod
+    def transcribe_result(
+        self,
+        audio,
+        task: Union[str, None],
+        language: Union[str, None],
+        initial_prompt: Union[str, None],
+        vad_filter: Union[bool, None],
+        word_timestamps: Union[bool, None],
+        options: Union[dict, None],
+    ) -> dict:
+        """
+        Perform transcription on the given audio and return the result as a dict with ``text``, ``segments``
+        and ``language``. Segments are dicts or the engine's own segment objects, which the result writers read
+        directly, so callers can adjust a result and serialize it once in the format they need.
+        """
+        pass
+
     def transcribe(
         self,
         audio,
@@ -38,9 +129,33 @@ class ASRModel(ABC):
         output,
     ):
         """
-        Perform transcription on the given audio file.
+        Perform transcription on the given audio file and return the result written in the requested format.
         """
-        pass
+        result = self.transcribe_result(audio, task, language, initial_prompt, vad_filter, word_timestamps, options)
+        output_file = StringIO()
+        self.write_result(result, output_file, output)
+        output_file.seek(0)
+        return output_file
+
+    def transcribe_batch(
+        self,
+        audios: List,
+        task: Union[str, None],
+        language: Union[str, None],
+        initial_prompt: Union[str, None],
+        vad_filter: Union[bool, None],
+        word_timestamps: Union[bool, None],
+        options: Union[dict, None],
+    ) -> List[dict]:
+        """
+        Transcribe several inputs of up to 30 seconds with the same options and return one result per input,
+        in order. Engines that set supports_batching run them as one batch; the default transcribes them
+        one after another.
+        """
+        return [
+            self.transcribe_result(audio, task, language, initial_prompt, vad_filter, word_timestamps, options)
+            for audio in audios
+        ]
 
     @abstractmethod
     def language_detection(self, audio) -> Union[str, Tuple[str, float]]:
@@ -50,25 +165,276 @@ class ASRModel(ABC):
         """
         pass
 
-    def monitor_idleness(self):
+    def write_result(self, result: dict, file, output: Union[str, None]):
         """
-        Monitors the idleness of the ASR model and releases the model if it has been idle for too long.
+        Write a transcription result in the requested output format.
+        Also accepts a result loaded back from this engine's JSON output.
         """
-        if CONFIG.MODEL_IDLE_TIMEOUT <= 0:
+        get_writer(output, **self.writer_options).write_result(result, file)
+
+    def transcribe_windowed(
+        self,
+        audio: SpooledAudio,
+        task: Union[str, None],
+        language: Union[str, None],
+        initial_prompt: Union[str, None],
+        vad_filter: Union[bool, None],
+        word_timestamps: Union[bool, None],
+        options: Union[dict, None],
+        output,
+    ):
+        """
+        Transcribe spooled audio window by window, so only one window is held as float32 at a time.
+        Each window goes through transcribe_result(), its timestamps are shifted to the window offset
+        and the merged result is written in the requested format.
+        The language detected in the first window is used for the following ones.
+        """
+        options = dict(options or {})
+        progress_callback = options.get("progress_callback")
+        total = max(1, len(audio))
+        segments = []
+        texts = []
+        for offset, window in audio.windows():
+            self.raise_if_cancelled(options)
+            if progress_callback:
+                options["progress_callback"] = self._window_progress(progress_callback, offset, len(window), total)
+
+            window_result = self.transcribe_result(
+                window, task, language, initial_prompt, vad_filter, word_timestamps, options
+            )
+            language = language or window_result.get("language")
+
+            shift = offset / audio.sample_rate
+            for segment in window_result.get("segments", []):
+                segments.append(self._shift_timestamps(segment, shift))
+            texts.append(window_result.get("text", "").strip())
+            if progress_callback:
+                progress_callback((offset + len(window)) / total)
+
+        for index, segment in enumerate(segments):
+            segments[index] = self._renumber(segment, index)
+        result = {"text": " ".join(text for text in texts if text), "segments": segments, "language": language}
+
+        output_file = StringIO()
+        self.write_result(result, output_file, output)
+        output_file.seek(0)
+        return output_file
+
+    def transcribe_stream(
+        self,
+        audio,
+        task: Union[str, None],
+        language: Union[str, None],
+        initial_prompt: Union[str, None],
+        vad_filter: Union[bool, None],
+        word_timestamps: Union[bool, None],
+        options: Union[dict, None],
+    ) -> Iterator[dict]:
+        """
+        Yield the segments of a transcription as dicts, as soon as the engine produces them.
+        Spooled audio is transcribed window by window with the timestamps shifted to the window offset.
+        """
+        if not isinstance(audio, SpooledAudio):
+            yield from self.iter_segments(audio, task, language, initial_prompt, vad_filter, word_timestamps, options)
             return
-        while True:
-            time.sleep(15)
-            if time.time() - self.last_activity_time > CONFIG.MODEL_IDLE_TIMEOUT:
+
+        for offset, window in audio.windows():
+            self.raise_if_cancelled(options)
+            shift = offset / audio.sample_rate
+            for segment in self.iter_segments(
+                window, task, language, initial_prompt, vad_filter, word_timestamps, options
+            ):
+                yield self._shift_timestamps(segment, shift)
+
+    def iter_segments(
+        self,
+        audio,
+        task: Union[str, None],
+        language: Union[str, None],
+        initial_prompt: Union[str, None],
+        vad_filter: Union[bool, None],
+        word_timestamps: Union[bool, None],
+        options: Union[dict, None],
+    ) -> Iterator[dict]:
+        """
+        Yield segment dicts for in-memory audio. Engines that decode incrementally override this;
+        the default runs transcribe_result() to completion and yields its segments.
+        """
+        result = self.transcribe_result(audio, task, language, initial_prompt, vad_filter, word_timestamps, options)
+        for segment in result.get("segments", []):
+            yield asdict(segment) if is_dataclass(segment) else segment
+
+    @staticmethod
+    def _window_progress(callback, offset: int, length: int, total: int):
+        return lambda progress: callback((offset + progress * length) / total)
+
+    @classmethod
+    def _shift_timestamps(cls, segment, shift: float):
+        """Move a segment dict (in place) or an engine segment object (as a copy) and its words by ``shift``."""
+        if not isinstance(segment, dict):
+            changes = {
+                key: getattr(segment, key) + shift
+                for key in ("start", "end")
+                if isinstance(getattr(segment, key, None), (int, float))
+            }
+            if isinstance(getattr(segment, "words", None), list):
+                changes["words"] = [cls._shift_timestamps(word, shift) for word in segment.words]
+            return replace(segment, **changes)
+        for key in ("start", "end"):
+            # HuggingFace leaves the end of an unfinished last chunk as None
+            if isinstance(segment.get(key), (int, float)):
+                segment[key] += shift
+        if isinstance(segment.get("words"), list):
+            segment["words"] = [cls._shift_timestamps(word, shift) for word in segment["words"]]
+        return segment
+
+    @staticmethod
+    def _renumber(segment, index: int):
+        if isinstance(segment, dict):
+            if "id" in segment:
+                segment["id"] = index
+            return segment
+        return replace(segment, id=index) if hasattr(segment, "id") else segment
+
+    @staticmethod
+    def raise_if_cancelled(options: Union[dict, None]):
+        """
+        Abort the transcription when the caller has set the cancel_event passed in options.
+        Engines call this at segment or chunk boundaries so an abandoned request frees the model early.
+        """
+        cancel_event = options.get("cancel_event") if options else None
+        if cancel_event is not None and cancel_event.is_set():
+            raise TranscriptionCancelledError("Transcription cancelled by the client")
+
+    @contextmanager
+    def active(self) -> Iterator[None]:
+        """
+        Mark the model as in use for the duration of a call. A model that was unloaded or offloaded while
+        idle is loaded or restored first, and the idle supervisor leaves it alone until the call returns.
+        """
+        with self._idle_lock:
+            if self.model is None:
+                self._timed("load", self.load_model)
+            elif self._idle_state == MODEL_OFFLOADED:
+                self._timed("restore", self.restore_model)
+            self._idle_state = MODEL_LOADED
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._idle_lock:
+                self._active -= 1
+                self.last_activity_time = time.time()
+
+    @property
+    def idle_state(self) -> str:
+        return MODEL_UNLOADED if self.model is None else self._idle_state
+
+    def instances(self) -> List["ASRModel"]:
+        """The models that hold weights, for the idle supervisor to watch."""
+        return [self]
+
+    def settle(self, now: float, cache_timeout: float, offload_timeout: float) -> Optional[str]:
+        """
+        Move an idle model down to the tier its idle time has reached and return the new tier,
+        or None if it stays where it is. Models in use are skipped.
+        """
+        with self._idle_lock:
+            if self._active or self.model is None:
+                return None
+            idle = now - self.last_activity_time
+            if 0 < offload_timeout < idle and self._idle_state != MODEL_OFFLOADED:
                 with self.model_lock:
-                    self.release_model()
-                    break
+                    self._idle_state = self.offload_model()
+                return self.idle_state
+            if 0 < cache_timeout < idle and self._idle_state == MODEL_LOADED:
+                self.release_caches()
+                self._idle_state = MODEL_CACHES_RELEASED
+                return self._idle_state
+            return None
+
+    def release_caches(self):
+        """
+        First idle tier: return memory that only speeds up inference while the weights stay loaded,
+        i.e. the GPU memory torch keeps cached and the freed heap glibc has not given back yet.
+        """
+        gc.collect()
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_initialized():
+            torch.cuda.empty_cache()
+        _malloc_trim()
+
+    def offload_model(self) -> str:
+        """
+        Second idle tier: free the weights and return the tier the model ends up in. Engines that can keep
+        their weights somewhere cheap to restore from override this with MODEL_IDLE_OFFLOAD=snapshot and
+        return MODEL_OFFLOADED; the default unloads the model, so the next call loads it again.
+        """
+        self.release_model()
+        return MODEL_UNLOADED
+
+    def restore_model(self):
+        """Bring back the weights offload_model() kept."""
+        self.load_model()
+
+    def unload_if_idle(self) -> bool:
+        """Unload the model unless a call is using it, returns whether it was unloaded."""
+        with self._idle_lock:
+            if self._active or self.model is None:
+                return False
+            with self.model_lock:
+                self.release_model()
+            return True
+
+    def weight_bytes(self) -> int:
+        """Approximate memory taken by the loaded weights, for ModelRegistry's budget. 0 when not known."""
+        return 0
+
+    def idle_snapshot(self) -> dict:
+        with self._idle_lock:
+            return {
+                "state": self.idle_state,
+                "active": self._active,
+                "idle_seconds": 0.0 if self._active else round(time.time() - self.last_activity_time, 1),
+                **{
+                    f"{kind}s": {
+                        "count": count,
+                        "mean_ms": round(total * 1000 / count, 1) if count else None,
+                        "last_ms": None if last is None else round(last * 1000, 1),
+                    }
+                    for kind, (count, total, last) in self._reloads.items()
+                },
+            }
+
+    def _timed(self, kind: str, reload):
+        started = time.perf_counter()
+        reload()
+        seconds = time.perf_counter() - started
+        stats = self._reloads[kind]
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2] = seconds
+        logger.info(f"Model {kind} took {seconds * 1000:.0f} ms")
 
     def release_model(self):
         """
         Unloads the model from memory and clears any cached GPU memory.
         """
         del self.model
-        torch.cuda.empty_cache()
+        # Engines built on torch keep freed GPU memory cached in its allocator, the others never import it
+        torch = sys.modules.get("torch")
+        if torch is not None:
+            torch.cuda.empty_cache()
         gc.collect()
         self.model = None
-        print("Model unloaded due to timeout")
+        logger.info(f"Model {self.model_name} unloaded")
+
+
+def _malloc_trim():
+    """Ask glibc to return freed heap pages to the system, other C libraries have no malloc_trim."""
+    if not sys.platform.startswith("linux"):
+        return
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
@@ -1,29 +1,45 @@
-import time
-from io import StringIO
-from threading import Thread
-from typing import TextIO, Union
+import os
+from bisect import bisect_right
+from dataclasses import asdict
+from typing import Iterator, List, Union
 
-from faster_whisper import WhisperModel
+import numpy as np
+from faster_whisper import BatchedInferencePipeline, WhisperModel
+from faster_whisper.utils import download_model
 
-from app.asr_models.asr_model import ASRModel
+from app.asr_models.asr_model import MODEL_OFFLOADED, ASRModel
 from app.config import CONFIG
-from app.output.result_writers import WriteJSON, WriteSRT, WriteTSV, WriteTXT, WriteVTT
 
 
 class FasterWhisperASR(ASRModel):
+    supports_batching = True
 
     def load_model(self):
 
         self.model = WhisperModel(
-            model_size_or_path=CONFIG.MODEL_NAME,
+            model_size_or_path=self.model_name,
             device=CONFIG.DEVICE,
             compute_type=CONFIG.MODEL_QUANTIZATION,
             download_root=CONFIG.MODEL_PATH,
+            cpu_threads=self.cpu_threads,
         )
 
-        Thread(target=self.monitor_idleness, daemon=True).start()
+    def weight_bytes(self) -> int:
+        return converted_model_bytes(self.model_name, CONFIG.MODEL_PATH)
 
-    def transcribe(
+    def offload_model(self) -> str:
+        if CONFIG.MODEL_IDLE_OFFLOAD != "snapshot":
+            return super().offload_model()
+        # CTranslate2 frees the weights but keeps the model, tokenizer and feature extractor. On a GPU they move to
+        # host memory and restoring is a copy back; on the CPU they are read again from the converted model file.
+        self.model.model.unload_model(to_cpu=CONFIG.DEVICE == "cuda")
+        self.release_caches()
+        return MODEL_OFFLOADED
+
+    def restore_model(self):
+        self.model.model.load_model()
+
+    def transcribe_result(
         self,
         audio,
         task: Union[str, None],
@@ -32,14 +48,93 @@ class FasterWhisperASR(ASRModel):
         vad_filter: Union[bool, None],
         word_timestamps: Union[bool, None],
         options: Union[dict, None],
-        output,
-    ):
-        self.last_activity_time = time.time()
+    ) -> dict:
+        options_dict = self._decode_options(task, language, initial_prompt, vad_filter, word_timestamps)
+        progress_callback = options.get("progress_callback") if options else None
 
-        with self.model_lock:
-            if self.model is None:
-                self.load_model()
+        with self.active(), self.model_lock:
+            self.raise_if_cancelled(options)
+            segments = []
+            text = ""
+            segment_generator, info = self.model.transcribe(audio, beam_size=5, **options_dict)
+            for segment in segment_generator:
+                # Segments are decoded lazily, stop between them if the client went away
+                self.raise_if_cancelled(options)
+                segments.append(segment)
+                text = text + segment.text
+                if progress_callback and info.duration:
+                    progress_callback(min(segment.end / info.duration, 1.0))
+            result = {"language": options_dict.get("language", info.language), "segments": segments, "text": text}
+        return result
+
+    def transcribe_batch(
+        self,
+        audios: List,
+        task: Union[str, None],
+        language: Union[str, None],
+        initial_prompt: Union[str, None],
+        vad_filter: Union[bool, None],
+        word_timestamps: Union[bool, None],
+        options: Union[dict, None],
+    ) -> List[dict]:
+        """
+        Decode the inputs as the clips of one batched pass: they are laid end to end and every clip is
+        encoded and decoded as one item of the batch. The batch shares one language, so inputs without
+        a language are transcribed one after another to detect their own.
+        """
+        if len(audios) < 2 or not language:
+            return super().transcribe_batch(
+                audios, task, language, initial_prompt, vad_filter, word_timestamps, options
+            )
+        # The clips are cut from the joined audio, so they need no VAD
+        options_dict = self._decode_options(task, language, initial_prompt, None, word_timestamps)
+        positions = np.cumsum([0] + [len(audio) for audio in audios]).tolist()
+        starts = [position / CONFIG.SAMPLE_RATE for position in positions[:-1]]
+        clips = [
+            {"start": start, "end": end / CONFIG.SAMPLE_RATE} for start, end in zip(starts, positions[1:], strict=True)
+        ]
+
+        with self.active(), self.model_lock:
+            self.raise_if_cancelled(options)
+            segment_generator, _ = BatchedInferencePipeline(self.model).transcribe(
+                np.concatenate(audios), beam_size=5, clip_timestamps=clips, batch_size=len(audios), **options_dict
+            )
+            segments = list(segment_generator)
+
+        results = [{"language": language, "segments": [], "text": ""} for _ in audios]
+        for segment in segments:
+            # Segments carry timestamps of the joined audio, move them back to the start of their input
+            index = max(0, bisect_right(starts, segment.start + 0.001) - 1)
+            results[index]["segments"].append(self._shift_timestamps(segment, -starts[index]))
+            results[index]["text"] += segment.text
+        return results
+
+    def iter_segments(
+        self,
+        audio,
+        task: Union[str, None],
+        language: Union[str, None],
+        initial_prompt: Union[str, None],
+        vad_filter: Union[bool, None],
+        word_timestamps: Union[bool, None],
+        options: Union[dict, None],
+    ) -> Iterator[dict]:
+        options_dict = self._decode_options(task, language, initial_prompt, vad_filter, word_timestamps)
+        with self.active(), self.model_lock:
+            self.raise_if_cancelled(options)
+            segment_generator, _ = self.model.transcribe(audio, beam_size=5, **options_dict)
+            for segment in segment_generator:
+                self.raise_if_cancelled(options)
+                yield asdict(segment)
 
+    @staticmethod
+    def _decode_options(
+        task: Union[str, None],
+        language: Union[str, None],
+        initial_prompt: Union[str, None],
+        vad_filter: Union[bool, None],
+        word_timestamps: Union[bool, None],
+    ) -> dict:
         options_dict = {}
         if task:
             options_dict["task"] = task
@@ -51,51 +146,26 @@ class FasterWhisperASR(ASRModel):
             options_dict["vad_filter"] = True
         if word_timestamps:
             options_dict["word_timestamps"] = True
-
-        with self.model_lock:
-            segments = []
-            text = ""
-            segment_generator, info = self.model.transcribe(audio, beam_size=5, **options_dict)
-            for segment in segment_generator:
-                segments.append(segment)
-                text = text + segment.text
-            result = {"language": options_dict.get("language", info.language), "segments": segments, "text": text}
-
-        output_file = StringIO()
-        self.write_result(result, output_file, output)
-        output_file.seek(0)
-
-        return output_file
+        return options_dict
 
     def language_detection(self, audio):
 
-        self.last_activity_time = time.time()
-
-        with self.model_lock:
-            if self.model is None:
-                self.load_model()
-
         # detect the spoken language
-        with self.model_lock:
+        with self.active(), self.model_lock:
             segments, info = self.model.transcribe(audio, beam_size=5)
             detected_lang_code = info.language
             detected_language_confidence = info.language_probability
 
         return detected_lang_code, detected_language_confidence
 
-    def write_result(self, result: dict, file: TextIO, output: Union[str, None]):
-        if output == "srt":
-            writer = WriteSRT("")
-            writer.write_result(result, file=file)
-        elif output == "vtt":
-            writer = WriteVTT("")
-            writer.write_result(result, file=file)
-        elif output == "tsv":
-            writer = WriteTSV("")
-            writer.write_result(result, file=file)
-        elif output == "json":
-            writer = WriteJSON("")
-            writer.write_result(result, file=file)
+
+def converted_model_bytes(model_name: str, cache_dir) -> int:
+    """Size of a CTranslate2 model file, close to the memory its weights take. 0 if it is not on disk."""
+    try:
+        if os.path.isdir(model_name):
+            path = model_name
         else:
-            writer = WriteTXT("")
-            writer.write_result(result, file=file)
+            path = download_model(model_name, local_files_only=True, cache_dir=cache_dir)
+        return os.path.getsize(os.path.join(path, "model.bin"))
+    except Exception:
+        return 0
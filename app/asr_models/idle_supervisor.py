@@ -0,0 +1,77 @@
+import logging
+import time
+from threading import Event, Thread
+from typing import List, Optional
+
+from app.asr_models.asr_model import ASRModel
+from app.config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class IdleSupervisor:
+    """
+    One thread that moves idle models down two tiers, instead of a monitor thread per load.
+
+    After ``cache_timeout`` seconds without a call a model releases its inference caches and keeps its
+    weights. After ``offload_timeout`` seconds it offloads the weights (see ASRModel.offload_model), and the
+    next call restores or loads them inside ASRModel.active(), which records how long that took.
+    A timeout of 0 disables its tier. Replicas are watched one by one, so a busy pool keeps them all loaded.
+    """
+
+    def __init__(
+        self,
+        cache_timeout: float = CONFIG.MODEL_IDLE_CACHE_TIMEOUT,
+        offload_timeout: float = CONFIG.MODEL_IDLE_TIMEOUT,
+        interval: float = 15.0,
+    ):
+        self.cache_timeout = cache_timeout
+        self.offload_timeout = offload_timeout
+        self.interval = interval
+        self.models: List[ASRModel] = []
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.cache_timeout > 0 or self.offload_timeout > 0
+
+    def watch(self, model: ASRModel):
+        self.models.extend(model.instances())
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name="idle-supervisor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def check(self, now: Optional[float] = None):
+        """Settle every watched model once."""
+        now = time.time() if now is None else now
+        for index, model in enumerate(self.models):
+            state = model.settle(now, self.cache_timeout, self.offload_timeout)
+            if state is not None:
+                logger.info(f"Model instance {index} idle, now {state}")
+
+    def stats(self) -> dict:
+        return {
+            "cache_timeout": self.cache_timeout,
+            "offload_timeout": self.offload_timeout,
+            "offload": CONFIG.MODEL_IDLE_OFFLOAD,
+            "instances": [model.idle_snapshot() for model in self.models],
+        }
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Idle supervisor check failed")
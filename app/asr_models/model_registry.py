@@ -0,0 +1,193 @@
+import logging
+from collections import Counter, OrderedDict
+from threading import Lock
+from typing import Callable, Iterator, List, Optional, TextIO, Union
+
+from app.asr_models.asr_model import MODEL_UNLOADED, ASRModel
+from app.exceptions import UnsupportedModelError
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry(ASRModel):
+    """
+    Serves several models of one engine side by side, selected per request with select().
+
+    Every model is its own ASRModel (or replica pool) with its own locks. A model is created and loaded the
+    first time it is selected; when the weights of the loaded models exceed ``memory_budget_mb``, the least
+    recently selected models that are neither pinned nor in a call are unloaded until they fit, and load again on
+    their next use. Callers keep their model with use(), or pin() before select() and unpin() when done.
+    Calls made on the registry itself go to the default model.
+    """
+
+    def __init__(
+        self,
+        model_factory: Callable[[str], ASRModel],
+        default_model: str,
+        models: List[str],
+        memory_budget_mb: int = 0,
+    ):
+        super().__init__(model_name=default_model)
+        self.model_factory = model_factory
+        self.model_names = list(dict.fromkeys([default_model, *models]))
+        self.memory_budget = max(0, memory_budget_mb) * 1024 * 1024
+        self.evictions = 0
+        # Least recently selected first
+        self.models: "OrderedDict[str, ASRModel]" = OrderedDict()
+        # Models kept loaded for callers between selecting and calling them
+        self._pins: Counter = Counter()
+        self._lock = Lock()
+        self._on_create: List[Callable[[ASRModel], None]] = []
+
+    def resolve_model_name(self, model_name: Optional[str] = None) -> str:
+        model_name = model_name or self.model_name
+        if model_name not in self.model_names:
+            choices = ", ".join(f"'{name}'" for name in self.model_names)
+            raise UnsupportedModelError(f"Unsupported model: {model_name}. Choose {choices}.")
+        return model_name
+
+    def select(self, model_name: Optional[str] = None) -> ASRModel:
+        """
+        Return the model for ``model_name``, creating and loading it if needed, and evict others beyond the
+        budget. Loading blocks, so call this off the event loop.
+        """
+        model_name = self.resolve_model_name(model_name)
+        with self._lock:
+            model = self._get(model_name)
+            self.models.move_to_end(model_name)
+        loaded = False
+        for instance in model.instances():
+            if instance.idle_state == MODEL_UNLOADED:
+                # Loaded here rather than by the first call, so the budget sees its size
+                with instance.active():
+                    loaded = True
+        if loaded:
+            with self._lock:
+                self._evict(keep=model_name)
+        return model
+
+    def pin(self, model_name: Optional[str] = None) -> str:
+        model_name = self.resolve_model_name(model_name)
+        with self._lock:
+            self._pins[model_name] += 1
+        return model_name
+
+    def unpin(self, model_name: str):
+        with self._lock:
+            self._pins[model_name] -= 1
+            if self._pins[model_name] <= 0:
+                del self._pins[model_name]
+
+    def on_create(self, callback: Callable[[ASRModel], None]):
+        """Call ``callback`` with every model the registry creates, e.g. to have it watched by the idle supervisor."""
+        self._on_create.append(callback)
+        for model in self.models.values():
+            callback(model)
+
+    def _get(self, model_name: str) -> ASRModel:
+        """The model for ``model_name``, created on first use but not loaded. Callers hold the lock."""
+        model = self.models.get(model_name)
+        if model is None:
+            model = self.models[model_name] = self.model_factory(model_name)
+            for callback in self._on_create:
+                callback(model)
+        return model
+
+    def loaded_bytes(self) -> int:
+        return sum(
+            instance.weight_bytes()
+            for model in self.models.values()
+            for instance in model.instances()
+            if instance.idle_state != MODEL_UNLOADED
+        )
+
+    def _evict(self, keep: str):
+        if not self.memory_budget:
+            return
+        for name, model in self.models.items():
+            if self.loaded_bytes() <= self.memory_budget:
+                return
+            if name == keep or self._pins[name]:
+                continue
+            unloaded = [instance.unload_if_idle() for instance in model.instances()]
+            if True in unloaded:
+                self.evictions += 1
+                logger.info(f"Unloaded model {name} to stay within the memory budget")
+        if self.loaded_bytes() > self.memory_budget:
+            logger.warning(f"Loaded models take {self.loaded_bytes() // (1024 * 1024)} MB, over the memory budget")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "default": self.model_name,
+                "available": self.model_names,
+                "memory_budget_mb": self.memory_budget // (1024 * 1024),
+                "loaded_mb": round(self.loaded_bytes() / (1024 * 1024), 1),
+                "evictions": self.evictions,
+                # Most recently selected first
+                "models": {
+                    name: [instance.idle_state for instance in model.instances()]
+                    for name, model in reversed(self.models.items())
+                },
+            }
+
+    def load_model(self):
+        self.select()
+
+    def instances(self) -> List[ASRModel]:
+        return [instance for model in self.models.values() for instance in model.instances()]
+
+    @property
+    def supports_batching(self) -> bool:
+        # The same for every model of the engine, asked without loading one
+        with self._lock:
+            return self._get(self.model_name).supports_batching
+
+    def transcribe_result(
+        self,
+        audio,
+        task: Union[str, None],
+        language: Union[str, None],
+        initial_prompt: Union[str, None],
+        vad_filter: Union[bool, None],
+        word_timestamps: Union[bool, None],
+        options: Union[dict, None],
+    ) -> dict:
+        with self.use() as model:
+            return model.transcribe_result(audio, task, language, initial_prompt, vad_filter, word_timestamps, options)
+
+    def transcribe_batch(
+        self,
+        audios: List,
+        task: Union[str, None],
+        language: Union[str, None],
+        initial_prompt: Union[str, None],
+        vad_filter: Union[bool, None],
+        word_timestamps: Union[bool, None],
+        options: Union[dict, None],
+    ) -> List[dict]:
+        with self.use() as model:
+            return model.transcribe_batch(audios, task, language, initial_prompt, vad_filter, word_timestamps, options)
+
+    def iter_segments(
+        self,
+        audio,
+        task: Union[str, None],
+        language: Union[str, None],
+        initial_prompt: Union[str, None],
+        vad_filter: Union[bool, None],
+        word_timestamps: Union[bool, None],
+        options: Union[dict, None],
+    ) -> Iterator[dict]:
+        with self.use() as model:
+            yield from model.iter_segments(audio, task, language, initial_prompt, vad_filter, word_timestamps, options)
+
+    def language_detection(self, audio):
+        with self.use() as model:
+            return model.language_detection(audio)
+
+    def write_result(self, result: dict, file: TextIO, output: Union[str, None]):
+        # Every model has the writer options of the engine, any created one can write without being loaded
+        with self._lock:
+            model = next(iter(self.models.values()), None)
+        (model or self.select()).write_result(result, file, output)
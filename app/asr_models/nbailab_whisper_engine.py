@@ -0,0 +1,93 @@
+from contextlib import nullcontext
+from typing import List, Optional, Union
+
+from app.asr_models.asr_model import MODEL_OFFLOADED, ASRModel
+from app.asr_models.weight_snapshot import WeightSnapshot, module_bytes, snapshot_path
+from app.config import CONFIG
+from app.nbailab_whisper import core as nbailab_core
+from app.nbailab_whisper.batching import BatchScheduler
+
+
+class NbAiLabWhisperASR(ASRModel):
+    supports_batching = True
+
+    def __init__(self, cpu_threads: int = 0, model_name: Optional[str] = None):
+        super().__init__(cpu_threads, model_name)
+        self.batcher = None
+        self.snapshot = None
+
+    def load_model(self):
+        self.model = nbailab_core.create_pipeline(self.model_name)
+        self.snapshot = None
+        if CONFIG.NBAILAB_MAX_BATCH_SIZE > 1:
+            self.batcher = BatchScheduler(self.model)
+
+    def release_model(self):
+        if self.batcher is not None:
+            self.batcher.close()
+            self.batcher = None
+        super().release_model()
+
+    def weight_bytes(self) -> int:
+        return module_bytes(self.model.model)
+
+    def offload_model(self) -> str:
+        if CONFIG.MODEL_IDLE_OFFLOAD != "snapshot":
+            return super().offload_model()
+        # Only the weights of the HuggingFace model go, the pipeline and the batcher thread stay
+        if self.snapshot is None:
+            self.snapshot = WeightSnapshot(self.model.model, snapshot_path("nbailab_whisper", self.model_name))
+        self.snapshot.offload()
+        self.release_caches()
+        return MODEL_OFFLOADED
+
+    def restore_model(self):
+        self.snapshot.restore()
+
+    def _get_pipeline(self):
+        """
+        Return the pipeline to call and the lock guarding it, callers hold active().
+        With batching enabled the scheduler serializes pipeline access itself, so no lock is needed.
+        """
+        if self.batcher is not None:
+            return self.batcher, nullcontext()
+        return self.model, self.model_lock
+
+    def transcribe_result(
+        self,
+        audio,
+        task: Union[str, None],
+        language: Union[str, None],
+        initial_prompt: Union[str, None],
+        vad_filter: Union[bool, None],
+        word_timestamps: Union[bool, None],
+        options: Union[dict, None],
+    ) -> dict:
+        with self.active():
+            pipe, lock = self._get_pipeline()
+            self.raise_if_cancelled(options)
+            return nbailab_core.transcribe_result(
+                audio, task, language, initial_prompt, vad_filter, word_timestamps, pipe=pipe, lock=lock
+            )
+
+    def transcribe_batch(
+        self,
+        audios: List,
+        task: Union[str, None],
+        language: Union[str, None],
+        initial_prompt: Union[str, None],
+        vad_filter: Union[bool, None],
+        word_timestamps: Union[bool, None],
+        options: Union[dict, None],
+    ) -> List[dict]:
+        with self.active():
+            pipe, lock = self._get_pipeline()
+            self.raise_if_cancelled(options)
+            return nbailab_core.transcribe_batch_result(
+                audios, task, language, initial_prompt, vad_filter, word_timestamps, pipe=pipe, lock=lock
+            )
+
+    def language_detection(self, audio):
+        with self.active():
+            pipe, lock = self._get_pipeline()
+            return nbailab_core.language_detection(audio, pipe=pipe, lock=lock)
@@ -1,28 +1,44 @@
-import time
-from io import StringIO
-from threading import Thread
-from typing import BinaryIO, Union
+from typing import Optional, Union
 
 import torch
 import whisper
-from whisper.utils import ResultWriter, WriteJSON, WriteSRT, WriteTSV, WriteTXT, WriteVTT
 
-from app.asr_models.asr_model import ASRModel
+from app.asr_models.asr_model import MODEL_OFFLOADED, ASRModel
+from app.asr_models.weight_snapshot import WeightSnapshot, module_bytes, snapshot_path
 from app.config import CONFIG
 
 
 class OpenAIWhisperASR(ASRModel):
+    writer_options = {"max_line_width": 1000, "max_line_count": 10, "highlight_words": False}
+
+    def __init__(self, cpu_threads: int = 0, model_name: Optional[str] = None):
+        super().__init__(cpu_threads, model_name)
+        self.snapshot = None
 
     def load_model(self):
 
         if torch.cuda.is_available():
-            self.model = whisper.load_model(name=CONFIG.MODEL_NAME, download_root=CONFIG.MODEL_PATH).cuda()
+            self.model = whisper.load_model(name=self.model_name, download_root=CONFIG.MODEL_PATH).cuda()
         else:
-            self.model = whisper.load_model(name=CONFIG.MODEL_NAME, download_root=CONFIG.MODEL_PATH)
+            self.model = whisper.load_model(name=self.model_name, download_root=CONFIG.MODEL_PATH)
+        self.snapshot = None
+
+    def weight_bytes(self) -> int:
+        return module_bytes(self.model)
+
+    def offload_model(self) -> str:
+        if CONFIG.MODEL_IDLE_OFFLOAD != "snapshot":
+            return super().offload_model()
+        if self.snapshot is None:
+            self.snapshot = WeightSnapshot(self.model, snapshot_path("openai_whisper", self.model_name))
+        self.snapshot.offload()
+        self.release_caches()
+        return MODEL_OFFLOADED
 
-        Thread(target=self.monitor_idleness, daemon=True).start()
+    def restore_model(self):
+        self.snapshot.restore()
 
-    def transcribe(
+    def transcribe_result(
         self,
         audio,
         task: Union[str, None],
@@ -31,14 +47,7 @@ class OpenAIWhisperASR(ASRModel):
         vad_filter: Union[bool, None],
         word_timestamps: Union[bool, None],
         options: Union[dict, None],
-        output,
-    ):
-        self.last_activity_time = time.time()
-
-        with self.model_lock:
-            if self.model is None:
-                self.load_model()
-
+    ) -> dict:
         options_dict = {"task": task}
         if language:
             options_dict["language"] = language
@@ -46,45 +55,23 @@ class OpenAIWhisperASR(ASRModel):
             options_dict["initial_prompt"] = initial_prompt
         if word_timestamps:
             options_dict["word_timestamps"] = word_timestamps
-        with self.model_lock:
+        with self.active(), self.model_lock:
+            # whisper decodes the whole file in one call, so cancellation is only checked before it starts
+            self.raise_if_cancelled(options)
             result = self.model.transcribe(audio, **options_dict)
-
-        output_file = StringIO()
-        self.write_result(result, output_file, output)
-        output_file.seek(0)
-
-        return output_file
+        return result
 
     def language_detection(self, audio):
-
-        self.last_activity_time = time.time()
-
-        with self.model_lock:
-            if self.model is None:
-                self.load_model()
-
         # load audio and pad/trim it to fit 30 seconds
         audio = whisper.pad_or_trim(audio)
 
-        # make log-Mel spectrogram and move to the same device as the model
-        mel = whisper.log_mel_spectrogram(audio, self.model.dims.n_mels).to(self.model.device)
+        with self.active():
+            # make log-Mel spectrogram and move to the same device as the model
+            mel = whisper.log_mel_spectrogram(audio, self.model.dims.n_mels).to(self.model.device)
 
-        # detect the spoken language
-        with self.model_lock:
-            _, probs = self.model.detect_language(mel)
+            # detect the spoken language
+            with self.model_lock:
+                _, probs = self.model.detect_language(mel)
         detected_lang_code = max(probs, key=probs.get)
 
         return detected_lang_code, probs[max(probs)]
-
-    def write_result(self, result: dict, file: BinaryIO, output: Union[str, None]):
-        options = {"max_line_width": 1000, "max_line_count": 10, "highlight_words": False}
-        if output == "srt":
-            WriteSRT(ResultWriter).write_result(result, file=file, options=options)
-        elif output == "vtt":
-            WriteVTT(ResultWriter).write_result(result, file=file, options=options)
-        elif output == "tsv":
-            WriteTSV(ResultWriter).write_result(result, file=file, options=options)
-        elif output == "json":
-            WriteJSON(ResultWriter).write_result(result, file=file, options=options)
-        else:
-            WriteTXT(ResultWriter).write_result(result, file=file, options=options)
@@ -0,0 +1,100 @@
+import itertools
+from contextlib import contextmanager
+from threading import Condition, local
+from typing import Iterator, List, Optional
+
+from app.config import CONFIG
+
+# Priority of the calls made by the current thread, lower is served first
+PRIORITY_LIVE = 0
+PRIORITY_BATCH = 1
+
+_thread = local()
+
+
+@contextmanager
+def call_priority(priority: int) -> Iterator[None]:
+    """Run the block with the given priority for every PriorityLock and replica lease it waits for."""
+    previous = current_priority()
+    _thread.priority = priority
+    try:
+        yield
+    finally:
+        _thread.priority = previous
+
+
+def current_priority() -> int:
+    return getattr(_thread, "priority", PRIORITY_BATCH)
+
+
+class PrioritySemaphore:
+    """
+    Semaphore that hands a released slot to the waiter with the highest call_priority(), in arrival order
+    within a priority. After ``weight`` consecutive grants that skipped a waiting lower priority call, the
+    oldest of those gets the next slot, so uploads are delayed by live chunks but never starved.
+    """
+
+    def __init__(self, value: int = 1, weight: int = CONFIG.LIVE_LANE_WEIGHT):
+        self.weight = max(1, weight)
+        self._value = value
+        # [priority, arrival, granted] of every blocked acquire()
+        self._waiters: List[list] = []
+        self._arrivals = itertools.count()
+        self._streak = 0
+        self._condition = Condition()
+
+    @property
+    def waiting(self) -> int:
+        """Number of threads blocked in acquire()."""
+        with self._condition:
+            return len(self._waiters)
+
+    def acquire(self, blocking: bool = True, timeout: Optional[float] = None) -> bool:
+        with self._condition:
+            if self._value > 0 and not self._waiters:
+                self._value -= 1
+                return True
+            if not blocking:
+                return False
+            waiter = [current_priority(), next(self._arrivals), False]
+            self._waiters.append(waiter)
+            if not self._condition.wait_for(lambda: waiter[2], timeout):
+                self._waiters.remove(waiter)
+                return False
+            return True
+
+    def release(self):
+        with self._condition:
+            self._value += 1
+            while self._value > 0 and self._waiters:
+                waiter = self._next_waiter()
+                self._waiters.remove(waiter)
+                waiter[2] = True
+                self._value -= 1
+            self._condition.notify_all()
+
+    def _next_waiter(self) -> list:
+        first = min(self._waiters)
+        skipped = [waiter for waiter in self._waiters if waiter[0] > first[0]]
+        if not skipped:
+            self._streak = 0
+            return first
+        if self._streak >= self.weight:
+            self._streak = 0
+            return min(skipped)
+        self._streak += 1
+        return first
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class PriorityLock(PrioritySemaphore):
+    """Lock that is handed to live callers before uploads that have been waiting for it longer."""
+
+    def __init__(self, weight: int = CONFIG.LIVE_LANE_WEIGHT):
+        super().__init__(1, weight)
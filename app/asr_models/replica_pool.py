@@ -0,0 +1,123 @@
+import logging
+import sys
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Iterator, List, Optional, TextIO, Union
+
+from app.asr_models.asr_model import ASRModel
+from app.asr_models.priority_lock import PrioritySemaphore
+
+logger = logging.getLogger(__name__)
+
+
+class ModelReplicaPool(ASRModel):
+    """
+    Serves requests from several independent replicas of one engine.
+    Each request leases a free replica for the duration of the call, so up to N requests
+    run in parallel while the transcribe/language_detection interface stays the same.
+    """
+
+    def __init__(
+        self,
+        replica_factory: Callable[[int], ASRModel],
+        replicas: int,
+        threads_per_replica: int = 0,
+        model_name: Optional[str] = None,
+    ):
+        super().__init__(threads_per_replica, model_name)
+        self.replicas: List[ASRModel] = [replica_factory(threads_per_replica) for _ in range(replicas)]
+        self._idle: Deque[ASRModel] = deque(self.replicas)
+        # Live chunks waiting for a replica are served before uploads
+        self._available = PrioritySemaphore(len(self.replicas))
+
+    def load_model(self):
+        for index, replica in enumerate(self.replicas, start=1):
+            logger.info(f"Loading model replica {index}/{len(self.replicas)}")
+            replica.load_model()
+
+    @contextmanager
+    def lease(self) -> Iterator[ASRModel]:
+        """Block until a replica is free and hand it out for exclusive use."""
+        self._available.acquire()
+        replica = self._idle.popleft()
+        try:
+            torch = sys.modules.get("torch")
+            if replica.cpu_threads > 0 and torch is not None:
+                # Torch engines size their intra-op pool per calling thread, the others never import torch
+                torch.set_num_threads(replica.cpu_threads)
+            yield replica
+        finally:
+            self._idle.append(replica)
+            self._available.release()
+
+    def stats(self) -> dict:
+        """Return the number of replicas and how many of them are free."""
+        return {"replicas": len(self.replicas), "idle": len(self._idle), "threads": self.cpu_threads}
+
+    def transcribe_result(
+        self,
+        audio,
+        task: Union[str, None],
+        language: Union[str, None],
+        initial_prompt: Union[str, None],
+        vad_filter: Union[bool, None],
+        word_timestamps: Union[bool, None],
+        options: Union[dict, None],
+    ) -> dict:
+        with self.lease() as replica:
+            return replica.transcribe_result(
+                audio, task, language, initial_prompt, vad_filter, word_timestamps, options
+            )
+
+    @property
+    def supports_batching(self) -> bool:
+        return self.replicas[0].supports_batching
+
+    def transcribe_batch(
+        self,
+        audios: List,
+        task: Union[str, None],
+        language: Union[str, None],
+        initial_prompt: Union[str, None],
+        vad_filter: Union[bool, None],
+        word_timestamps: Union[bool, None],
+        options: Union[dict, None],
+    ) -> List[dict]:
+        # The whole batch runs on one replica
+        with self.lease() as replica:
+            return replica.transcribe_batch(
+                audios, task, language, initial_prompt, vad_filter, word_timestamps, options
+            )
+
+    def iter_segments(
+        self,
+        audio,
+        task: Union[str, None],
+        language: Union[str, None],
+        initial_prompt: Union[str, None],
+        vad_filter: Union[bool, None],
+        word_timestamps: Union[bool, None],
+        options: Union[dict, None],
+    ) -> Iterator[dict]:
+        # The replica stays leased until the caller has consumed or closed the generator
+        with self.lease() as replica:
+            yield from replica.iter_segments(
+                audio, task, language, initial_prompt, vad_filter, word_timestamps, options
+            )
+
+    def language_detection(self, audio):
+        with self.lease() as replica:
+            return replica.language_detection(audio)
+
+    def write_result(self, result: dict, file: TextIO, output: Union[str, None]):
+        # Writers are stateless, so any replica can format the result without a lease
+        self.replicas[0].write_result(result, file, output)
+
+    def instances(self) -> List[ASRModel]:
+        # Every replica goes idle on its own
+        return self.replicas
+
+    def release_model(self):
+        for replica in self.replicas:
+            with replica.model_lock:
+                replica.release_model()
@@ -0,0 +1,78 @@
+import atexit
+import os
+import re
+from typing import Dict, List, Tuple
+
+from app.config import CONFIG
+
+
+def snapshot_path(engine: str, model_name: str = CONFIG.MODEL_NAME) -> str:
+    """File the weights of ``model_name`` are kept in while idle, one per process so stale weights are never read."""
+    name = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+    return os.path.join(CONFIG.MODEL_SNAPSHOT_DIR, f"{engine}-{name}-{os.getpid()}.pt")
+
+
+class WeightSnapshot:
+    """
+    Memory-mapped copy of the parameters of a torch module.
+
+    offload() writes the parameters to ``path`` once and replaces them with empty meta tensors, which frees their
+    memory while the module, its buffers and its configuration stay in place. restore() maps the file back in: on
+    the CPU the parameters are paged in from the page cache as they are used, on a GPU they are copied from it,
+    so neither reads and parses the model files again. Tied parameters stay tied.
+    Replicas of one model share the file, and with it the pages of a CPU model.
+    """
+
+    def __init__(self, module, path: str):
+        self.module = module
+        self.path = path
+        self.device = None
+
+    def offload(self):
+        import torch
+
+        groups = self._groups()
+        if not os.path.exists(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temporary = f"{self.path}.{id(self)}.tmp"
+            torch.save({key: parameter.detach().cpu() for key, _, parameter in groups}, temporary)
+            os.replace(temporary, self.path)
+            atexit.register(_remove, self.path)
+        self.device = groups[0][2].device
+        for _, owners, parameter in groups:
+            empty = torch.nn.Parameter(torch.empty_like(parameter, device="meta"), parameter.requires_grad)
+            for owner, name in owners:
+                owner._parameters[name] = empty
+
+    def restore(self):
+        import torch
+
+        tensors = torch.load(self.path, mmap=True, weights_only=True)
+        for key, owners, parameter in self._groups():
+            restored = torch.nn.Parameter(tensors[key].to(self.device), parameter.requires_grad)
+            for owner, name in owners:
+                owner._parameters[name] = restored
+
+    def _groups(self) -> List[Tuple[str, List[Tuple[object, str]], object]]:
+        """Parameters by identity: the name stored in the file, every (module, attribute) holding it, the tensor."""
+        groups: Dict[int, Tuple[str, List[Tuple[object, str]], object]] = {}
+        for prefix, owner in self.module.named_modules(remove_duplicate=False):
+            for name, parameter in owner._parameters.items():
+                if parameter is None:
+                    continue
+                key = f"{prefix}.{name}" if prefix else name
+                groups.setdefault(id(parameter), (key, [], parameter))[1].append((owner, name))
+        return list(groups.values())
+
+
+def module_bytes(module) -> int:
+    """Bytes of the parameters and buffers of a torch module, tied tensors counted once and offloaded ones not."""
+    tensors = {id(tensor): tensor for tensor in [*module.parameters(), *module.buffers()]}
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors.values() if not tensor.is_meta)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
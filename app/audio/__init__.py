@@ -0,0 +1,5 @@
+from .ring_buffer import AudioRingBuffer
+from .spooled_audio import SpooledAudio
+from .stream_decoder import STREAM_FORMATS, StreamDecoder
+
+__all__ = ["SpooledAudio", "AudioRingBuffer", "StreamDecoder", "STREAM_FORMATS"]
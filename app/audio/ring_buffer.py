@@ -0,0 +1,76 @@
+import numpy as np
+
+PCM_SCALE = np.float32(1.0 / 32768.0)
+
+
+class AudioRingBuffer:
+    """
+    Fixed-capacity float32 ring buffer for streamed 16-bit PCM.
+
+    Incoming frames are copied into a preallocated int16 staging area and converted into the ring
+    in one pass when a window is read, so neither frames nor chunks allocate new arrays. Every
+    sample is stored twice, ``capacity`` apart, so any window of up to ``capacity`` samples is one
+    contiguous slice and window() returns a view instead of a copy. Positions are absolute sample
+    counts since the stream started; a window stays valid until more than ``capacity`` samples have
+    been written after its start, which holds() checks.
+    """
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError("Ring buffer capacity must be positive")
+        self.capacity = capacity
+        self.written = 0
+        self._data = np.zeros(2 * capacity, dtype=np.float32)
+        self._staged = np.zeros(capacity + 1, dtype="<i2")
+        self._staged_bytes = memoryview(self._staged).cast("B")
+        # Bytes staged so far, an odd trailing byte is completed by the next frame
+        self._staged_size = 0
+
+    def write(self, pcm: bytes):
+        """Append little-endian int16 PCM. A frame longer than the buffer leaves only its last samples."""
+        staged = self._staged_size
+        if staged + len(pcm) > 2 * self.capacity + 1:
+            self._flush()
+            staged = self._staged_size
+            total = staged + len(pcm)
+            if total > 2 * self.capacity + 1:
+                # Only the tail of the frame can still be read back, drop whole samples from the front
+                skipped = total - 2 * self.capacity - total % 2
+                self.written += skipped // 2
+                pcm = memoryview(pcm)[skipped - staged :]
+                staged = 0
+        self._staged_bytes[staged : staged + len(pcm)] = pcm
+        self._staged_size = staged + len(pcm)
+        self.written += self._staged_size // 2 - staged // 2
+
+    def _flush(self):
+        count = self._staged_size // 2
+        if not count:
+            return
+        position = (self.written - count) % self.capacity
+        # The primary copy may run into the second half, which mirrors the start of the ring
+        np.multiply(self._staged[:count], PCM_SCALE, out=self._data[position : position + count])
+        head = min(count, self.capacity - position)
+        self._data[position + self.capacity : position + self.capacity + head] = self._data[position : position + head]
+        if head < count:
+            self._data[: count - head] = self._data[self.capacity : self.capacity + count - head]
+        if self._staged_size % 2:
+            self._staged_bytes[0] = self._staged_bytes[self._staged_size - 1]
+        self._staged_size %= 2
+
+    @property
+    def oldest(self) -> int:
+        """Position of the oldest sample still held."""
+        return max(0, self.written - self.capacity)
+
+    def holds(self, start: int) -> bool:
+        """Whether the samples from ``start`` on have not been overwritten yet."""
+        return start >= self.oldest
+
+    def window(self, start: int, end: int) -> np.ndarray:
+        """Return samples [start, end) as a view into the buffer, which later writes overwrite."""
+        if not self.oldest <= start <= end <= self.written:
+            raise ValueError(f"Window [{start}, {end}) is outside the buffered samples [{self.oldest}, {self.written})")
+        self._flush()
+        offset = start % self.capacity
+        return self._data[offset : offset + end - start]
@@ -0,0 +1,143 @@
+import mmap
+import os
+import tempfile
+from typing import Iterator, Tuple
+
+import numpy as np
+
+from app.config import CONFIG
+from app.exceptions import TranscriptionCancelledError
+
+# Frame length used to find a quiet point to cut windows at
+CUT_FRAME_SECONDS = 0.02
+
+
+class SpooledAudio:
+    """
+    Decoded 16-bit mono PCM kept in a memory-mapped spool file instead of one float32 array.
+
+    Samples are converted to float32 one window at a time, so the memory used per request is
+    bounded by the window size and not by the length of the recording. The spool file is unlinked
+    as soon as it is mapped, the operating system reclaims it once the last view is released.
+    close() may be called while a worker thread still reads the audio, e.g. when the client disconnects:
+    reads in progress finish on their own view, later reads raise TranscriptionCancelledError.
+    """
+
+    def __init__(self, directory: str = CONFIG.AUDIO_SPOOL_DIR, sample_rate: int = CONFIG.SAMPLE_RATE):
+        os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(prefix="asr-", suffix=".pcm", dir=directory)
+        self.sample_rate = sample_rate
+        self._file = os.fdopen(fd, "wb")
+        self._mmap = None
+        self._samples = None
+
+    def write(self, chunk: np.ndarray):
+        """Append a block of int16 samples, only valid until finish() is called."""
+        self._file.write(np.ascontiguousarray(chunk, dtype=np.int16).data)
+
+    def finish(self) -> "SpooledAudio":
+        """Close the spool file for writing and map it read-only."""
+        self._file.close()
+        if os.path.getsize(self.path):
+            with open(self.path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._samples = np.frombuffer(self._mmap, dtype=np.int16)
+        else:
+            self._samples = np.zeros(0, dtype=np.int16)
+        self._remove()
+        return self
+
+    @property
+    def closed(self) -> bool:
+        return self._samples is None and self._file.closed
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        # The map itself is released with the last array that still views it
+        self._samples = None
+        self._mmap = None
+        self._remove()
+
+    def __enter__(self) -> "SpooledAudio":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        return 0 if self._samples is None else len(self._samples)
+
+    @property
+    def duration(self) -> float:
+        return len(self) / self.sample_rate
+
+    def window(self, start: int, end: int) -> np.ndarray:
+        """Return samples [start, end) as a new float32 array in [-1, 1)."""
+        audio = self._view()[start:end].astype(np.float32)
+        audio *= 1.0 / 32768.0
+        return audio
+
+    def pcm_blocks(self, block_samples: int = 1024 * 1024) -> Iterator[np.ndarray]:
+        """Yield the raw int16 samples in blocks, e.g. to hash the recording without converting it."""
+        samples = self._view()
+        for start in range(0, len(samples), block_samples):
+            if self.closed:
+                raise TranscriptionCancelledError("Audio was closed while it was read")
+            yield samples[start : start + block_samples]
+
+    def windows(
+        self,
+        window_seconds: float = CONFIG.AUDIO_WINDOW_SECONDS,
+        search_seconds: float = 10.0,
+    ) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Yield (offset, samples) windows covering the recording. Each window ends at the quietest
+        point within the last ``search_seconds`` before its nominal end, so words are not split.
+        """
+        total = len(self._view())
+        window = max(1, int(window_seconds * self.sample_rate))
+        search = min(int(search_seconds * self.sample_rate), window // 2)
+        start = 0
+        while start < total:
+            end = min(start + window, total)
+            if end < total and search > 0:
+                end = self._quietest_point(end - search, end)
+            yield start, self.window(start, end)
+            self._drop_pages(start, end)
+            start = end
+
+    def _quietest_point(self, start: int, end: int) -> int:
+        frame = max(1, int(CUT_FRAME_SECONDS * self.sample_rate))
+        frames = (end - start) // frame
+        if frames < 2:
+            return end
+        region = self._view()[start : start + frames * frame].astype(np.float32).reshape(frames, frame)
+        energy = np.einsum("ij,ij->i", region, region)
+        # Prefer the latest of equally quiet frames, which keeps windows close to their nominal length
+        quietest = frames - 1 - int(np.argmin(energy[::-1]))
+        return start + quietest * frame + frame // 2
+
+    def _view(self) -> np.ndarray:
+        """The samples, held by the caller for the length of a read so close() cannot pull them away midway."""
+        samples = self._samples
+        if samples is None:
+            raise TranscriptionCancelledError("Audio was closed before it was read")
+        return samples
+
+    def _drop_pages(self, start: int, end: int):
+        """Let the kernel evict the mapped pages of a finished window, they are not read again."""
+        mapped = self._mmap
+        if mapped is None or not hasattr(mmap, "MADV_DONTNEED"):
+            return
+        first = start * 2 // mmap.PAGESIZE * mmap.PAGESIZE
+        length = end * 2 // mmap.PAGESIZE * mmap.PAGESIZE - first
+        if length > 0:
+            mapped.madvise(mmap.MADV_DONTNEED, first, length)
+
+    def _remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            # Already removed, or on Windows still mapped; close() retries once the map is released
+            pass
@@ -0,0 +1,90 @@
+import asyncio
+from asyncio.subprocess import PIPE
+from collections import deque
+from typing import AsyncIterator, Deque, Optional
+
+import ffmpeg
+
+from app.config import CONFIG
+
+# Compressed formats accepted on the live WebSocket, mapped to the ffmpeg demuxer that reads them
+STREAM_FORMATS = {"webm": "matroska", "ogg": "ogg", "flac": "flac"}
+# Largest block of PCM read back from ffmpeg at once
+READ_SIZE = 64 * 1024
+
+
+class StreamDecoder:
+    """
+    Long-lived ffmpeg process that decodes a compressed live stream to 16-bit mono PCM.
+
+    Encoded frames are written to ffmpeg's stdin as the client sends them and PCM is read back
+    from stdout, so one process serves the whole stream instead of one per chunk. The format is
+    given up front and probing is switched off, so decoding starts with the first frames.
+    """
+
+    def __init__(self, stream_format: str, sample_rate: int = CONFIG.SAMPLE_RATE):
+        if stream_format not in STREAM_FORMATS:
+            raise ValueError(
+                f"Invalid audio format '{stream_format}'. Choose 'pcm', {', '.join(map(repr, STREAM_FORMATS))}."
+            )
+        self.stream_format = stream_format
+        self.sample_rate = sample_rate
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._stderr: Deque[bytes] = deque(maxlen=20)
+        self._stderr_reader: Optional[asyncio.Task] = None
+
+    async def start(self):
+        args = (
+            ffmpeg.input(
+                "pipe:",
+                f=STREAM_FORMATS[self.stream_format],
+                probesize=32,
+                analyzeduration=0,
+                threads=1,
+            )
+            .output("pipe:", format="s16le", acodec="pcm_s16le", ac=1, ar=self.sample_rate, flush_packets=1)
+            .global_args("-loglevel", "error")
+            .compile(cmd="ffmpeg")
+        )
+        self._process = await asyncio.create_subprocess_exec(*args, stdin=PIPE, stdout=PIPE, stderr=PIPE)
+        # stderr has to be drained as well, or ffmpeg blocks once the pipe buffer is full
+        self._stderr_reader = asyncio.ensure_future(self._drain_stderr())
+
+    async def write(self, data: bytes):
+        """Feed encoded bytes, waiting while ffmpeg's input pipe is full."""
+        self._process.stdin.write(data)
+        await self._process.stdin.drain()
+
+    def finish(self):
+        """Signal the end of the stream, ffmpeg then flushes the frames it still holds."""
+        if not self._process.stdin.is_closing():
+            self._process.stdin.close()
+
+    async def pcm(self) -> AsyncIterator[bytes]:
+        """Yield decoded PCM as it becomes available until the stream ends or ffmpeg fails."""
+        while True:
+            data = await self._process.stdout.read(READ_SIZE)
+            if not data:
+                break
+            yield data
+        returncode = await self._process.wait()
+        await self._stderr_reader
+        if returncode != 0:
+            raise RuntimeError(f"Failed to decode audio: {b''.join(self._stderr).decode(errors='replace').strip()}")
+
+    async def close(self):
+        """Stop ffmpeg, e.g. because the client went away."""
+        if self._process is None:
+            return
+        if self._process.returncode is None:
+            self._process.kill()
+            await self._process.wait()
+        if self._stderr_reader is not None:
+            await self._stderr_reader
+
+    async def _drain_stderr(self):
+        while True:
+            line = await self._process.stderr.readline()
+            if not line:
+                return
+            self._stderr.append(line)
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional, Union
+
+import numpy as np
+
+from app.audio import SpooledAudio
+from app.config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+# Disk eviction scans the cache directory, so it frees a little more than needed each time
+DISK_EVICTION_TARGET = 0.9
+
+
+class ResultCache:
+    """
+    Two-tier cache of JSON transcription results, keyed by a hash of the decoded audio and the
+    parameters that influence the result.
+
+    The memory tier is an LRU bounded by the total size of the cached results. The disk tier stores
+    one file per result under ``directory`` and evicts the least recently used files once it grows
+    beyond ``disk_bytes``. Results read from disk are promoted to memory. All methods are thread-safe.
+    """
+
+    def __init__(
+        self,
+        memory_bytes: int = CONFIG.RESULT_CACHE_MEMORY_MB * MB,
+        directory: str = CONFIG.RESULT_CACHE_DIR,
+        disk_bytes: int = CONFIG.RESULT_CACHE_DISK_MB * MB,
+    ):
+        self.memory_bytes = max(0, memory_bytes)
+        self.directory = directory
+        self.disk_bytes = max(0, disk_bytes)
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._memory_used = 0
+        self._disk_used: Optional[int] = None
+        self._hits = 0
+        self._misses = 0
+        self._lock = Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.memory_bytes > 0 or self.disk_bytes > 0
+
+    @staticmethod
+    def key(audio: Union[np.ndarray, SpooledAudio], params: dict) -> str:
+        """Hash the decoded samples together with the engine, model and request parameters."""
+        digest = hashlib.blake2b(digest_size=32)
+        settings = {
+            "engine": CONFIG.ASR_ENGINE,
+            "model": CONFIG.MODEL_NAME,
+            "quantization": CONFIG.MODEL_QUANTIZATION,
+            **params,
+        }
+        digest.update(json.dumps(settings, sort_keys=True).encode())
+        if isinstance(audio, SpooledAudio):
+            digest.update(b"pcm16")
+            for block in audio.pcm_blocks():
+                digest.update(block.data)
+        else:
+            digest.update(np.ascontiguousarray(audio, dtype=np.float32).data)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self._hits += 1
+                return value
+
+        value = self._read_disk(key)
+        with self._lock:
+            if value is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._remember(key, value)
+        return value
+
+    def put(self, key: str, value: str):
+        with self._lock:
+            self._remember(key, value)
+        self._write_disk(key, value)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_used,
+                "disk_bytes": self._disk_used or 0,
+            }
+
+    def _remember(self, key: str, value: str):
+        size = len(value)
+        if size > self.memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_used -= len(previous)
+        self._memory[key] = value
+        self._memory_used += size
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[str]:
+        if not self.disk_bytes:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                value = f.read()
+            # The modification time orders files for eviction
+            os.utime(path)
+        except OSError:
+            return None
+        return value
+
+    def _write_disk(self, key: str, value: str):
+        if not self.disk_bytes or len(value) > self.disk_bytes:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(value)
+        except OSError as e:
+            logger.warning(f"Could not write cached result {key}: {e}")
+            return
+
+        with self._lock:
+            # A result stored again replaces its file, only the difference in size is added
+            try:
+                previous = os.path.getsize(path)
+            except OSError:
+                previous = 0
+            try:
+                os.replace(temp_path, path)
+            except OSError as e:
+                logger.warning(f"Could not write cached result {key}: {e}")
+                return
+            if self._disk_used is None:
+                self._disk_used = sum(size for _, size, _ in self._scan_disk())
+            else:
+                self._disk_used += os.path.getsize(path) - previous
+            if self._disk_used > self.disk_bytes:
+                self._evict_disk()
+
+    def _scan_disk(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _evict_disk(self):
+        entries = sorted(self._scan_disk(), key=lambda entry: entry[2])
+        used = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if used <= self.disk_bytes * DISK_EVICTION_TARGET:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            used -= size
+        self._disk_used = used
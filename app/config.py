@@ -1,6 +1,30 @@
+import ctypes
 import os
+import sys
+import tempfile
 
-import torch
+
+def _cuda_available() -> bool:
+    """
+    Whether a CUDA device can be used. The NVIDIA management library is asked instead of torch, so reading the
+    configuration stays cheap, and unlike initialising CUDA it does not break CUDA in forked processes.
+    """
+    if os.getenv("CUDA_VISIBLE_DEVICES", "0").strip() in {"", "-1"}:
+        return False
+    try:
+        nvml = ctypes.CDLL("nvml.dll" if sys.platform == "win32" else "libnvidia-ml.so.1")
+    except OSError:
+        return False
+    if nvml.nvmlInit_v2() != 0:
+        return False
+    try:
+        count = ctypes.c_uint(0)
+        return nvml.nvmlDeviceGetCount_v2(ctypes.byref(count)) == 0 and count.value > 0
+    finally:
+        nvml.nvmlShutdown()
+
+
+CUDA_AVAILABLE = _cuda_available()
 
 
 class CONFIG:
@@ -18,7 +42,7 @@ class CONFIG:
         print("You must set the HF_TOKEN environment variable to download the diarization model used by WhisperX.")
 
     # Determine the computation device (GPU or CPU)
-    DEVICE = os.getenv("ASR_DEVICE", "cuda" if torch.cuda.is_available() else "cpu")
+    DEVICE = os.getenv("ASR_DEVICE", "cuda" if CUDA_AVAILABLE else "cpu")
 
     # Model name to use (e.g., "base", "small", etc.)
     # Default to NbAiLab large model for best Norwegian quality
@@ -32,13 +56,23 @@ class CONFIG:
     #   'float16' - 16-bit floating-point precision (lower precision, faster inference)
     #   'int8' - 8-bit integer precision (lowest precision, fastest inference)
     # Defaults to 'float32' for GPU availability, 'int8' for CPU.
-    MODEL_QUANTIZATION = os.getenv("ASR_QUANTIZATION", "float32" if torch.cuda.is_available() else "int8")
+    MODEL_QUANTIZATION = os.getenv("ASR_QUANTIZATION", "float32" if CUDA_AVAILABLE else "int8")
     if MODEL_QUANTIZATION not in {"float32", "float16", "int8"}:
         raise ValueError("Invalid MODEL_QUANTIZATION. Choose 'float32', 'float16', or 'int8'.")
 
-    # Idle timeout in seconds. If set to a non-zero value, the model will be unloaded
-    # after being idle for this many seconds. A value of 0 means the model will never be unloaded.
+    # Idle timeout in seconds. If set to a non-zero value, the model will be offloaded
+    # after being idle for this many seconds. A value of 0 means the model will never be offloaded.
     MODEL_IDLE_TIMEOUT = int(os.getenv("MODEL_IDLE_TIMEOUT", 0))
+    # How an idle model is offloaded. "snapshot" keeps the weights in a memory-mapped file under MODEL_SNAPSHOT_DIR
+    # (torch engines) or unloads them from the CTranslate2 runtime (faster_whisper), so the next request restores
+    # them in a fraction of the load time. "unload" deletes the model and loads it again from scratch.
+    MODEL_IDLE_OFFLOAD = os.getenv("MODEL_IDLE_OFFLOAD", "snapshot")
+    if MODEL_IDLE_OFFLOAD not in {"snapshot", "unload"}:
+        raise ValueError("Invalid MODEL_IDLE_OFFLOAD. Choose 'snapshot' or 'unload'.")
+    MODEL_SNAPSHOT_DIR = os.getenv("MODEL_SNAPSHOT_DIR", os.path.join(tempfile.gettempdir(), "whisper-asr-snapshots"))
+    # Earlier idle tier in seconds: caches are released (GPU allocator cache, freed heap, whisperx alignment
+    # models) while the weights stay loaded. 0 disables it.
+    MODEL_IDLE_CACHE_TIMEOUT = int(os.getenv("MODEL_IDLE_CACHE_TIMEOUT", 0))
 
     # Default sample rate for audio input. 16 kHz is commonly used in speech-to-text tasks.
     SAMPLE_RATE = int(os.getenv("SAMPLE_RATE", 16000))
@@ -57,3 +91,96 @@ class CONFIG:
         os.getenv("LIVE_OVERLAP_CHUNKS", "true").lower() == "true"
     )  # Overlap chunks for better context
     LIVE_OVERLAP_SIZE = int(os.getenv("LIVE_OVERLAP_SIZE", "16000"))  # 0.5 seconds overlap
+    # Live decoding mode. "chunked" transcribes every chunk on its own. "local_agreement" transcribes the audio
+    # since the last commit on every chunk and commits the words two consecutive passes agree on; the rest is
+    # sent as tentative. The window is committed and cut when it grows beyond LIVE_AGREEMENT_MAX_WINDOW_SECONDS.
+    LIVE_DECODING = os.getenv("LIVE_DECODING", "chunked")
+    if LIVE_DECODING not in {"chunked", "local_agreement"}:
+        raise ValueError("Invalid LIVE_DECODING. Choose 'chunked' or 'local_agreement'.")
+    LIVE_AGREEMENT_MAX_WINDOW_SECONDS = float(os.getenv("LIVE_AGREEMENT_MAX_WINDOW_SECONDS", 15))
+    # Speech endpointing for live streams. Frames are classified as speech when they are LIVE_VAD_THRESHOLD_DB
+    # louder than the noise floor; an utterance ends after LIVE_ENDPOINT_SILENCE_MS of non-speech and is cut
+    # after LIVE_MAX_SEGMENT_SECONDS. Only utterances are transcribed. Set LIVE_ENDPOINTING=false to transcribe
+    # every LIVE_CHUNK_SIZE bytes instead.
+    LIVE_ENDPOINTING = os.getenv("LIVE_ENDPOINTING", "true").lower() == "true"
+    LIVE_ENDPOINT_SILENCE_MS = int(os.getenv("LIVE_ENDPOINT_SILENCE_MS", 500))
+    LIVE_MAX_SEGMENT_SECONDS = float(os.getenv("LIVE_MAX_SEGMENT_SECONDS", 8))
+    LIVE_VAD_THRESHOLD_DB = float(os.getenv("LIVE_VAD_THRESHOLD_DB", 10))
+
+    # Asynchronous job queue for long recordings. Jobs and their spooled audio are kept in a
+    # SQLite database under JOBS_DIR, so queued work survives a restart.
+    JOBS_DIR = os.getenv("JOBS_DIR", os.path.join(os.path.expanduser("~"), ".cache", "whisper-asr-webservice", "jobs"))
+    JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", 1))
+
+    # Number of independent model replicas to load. Each request leases a free replica,
+    # so up to MODEL_REPLICAS requests run in parallel. Every replica holds its own copy of the weights.
+    MODEL_REPLICAS = max(1, int(os.getenv("MODEL_REPLICAS", 1)))
+    # Intra-op threads per replica. 0 splits the CPU cores evenly between replicas
+    # (or keeps the engine default when only one replica is loaded).
+    MODEL_REPLICA_THREADS = int(os.getenv("MODEL_REPLICA_THREADS", 0))
+
+    # Further models of the same engine that requests may select with the `model` parameter, comma separated
+    # (e.g. "NbAiLab/nb-whisper-small"). ASR_MODEL is the default; the others are loaded on first use.
+    ASR_MODELS = [name.strip() for name in os.getenv("ASR_MODELS", "").split(",") if name.strip()]
+    # Memory in MB the weights of all loaded models may take. Beyond it the least recently used idle models
+    # are unloaded. 0 means no limit.
+    MODEL_MEMORY_BUDGET_MB = int(os.getenv("MODEL_MEMORY_BUDGET_MB", 0))
+
+    # Micro-batching for the nbailab_whisper HuggingFace pipeline. Requests arriving within
+    # NBAILAB_BATCH_WINDOW_MS of each other share one forward pass, up to NBAILAB_MAX_BATCH_SIZE.
+    # A batch size of 1 disables batching.
+    NBAILAB_MAX_BATCH_SIZE = int(os.getenv("NBAILAB_MAX_BATCH_SIZE", 8))
+    NBAILAB_BATCH_WINDOW_MS = float(os.getenv("NBAILAB_BATCH_WINDOW_MS", 10))
+
+    # Number of worker threads used to run audio decoding and model inference off the event loop.
+    # Requests beyond this limit wait in the executor queue. Defaults to two more than the replica count.
+    # Uploads use at most INFERENCE_WORKERS - 1 of them, one worker is kept free for live chunks.
+    INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", max(4, MODEL_REPLICAS + 2)))
+
+    # Admission control. At most MAX_PENDING_REQUESTS /asr and /detect-language requests are admitted
+    # (running or waiting), further requests are rejected with 429 and a Retry-After header. 0 disables the limit.
+    MAX_PENDING_REQUESTS = int(os.getenv("MAX_PENDING_REQUESTS", 32))
+    # Live WebSocket chunks use a separate priority lane with its own limit.
+    LIVE_MAX_PENDING_CHUNKS = int(os.getenv("LIVE_MAX_PENDING_CHUNKS", 64))
+    # Number of consecutive live chunks served before a waiting batch task gets a worker.
+    LIVE_LANE_WEIGHT = int(os.getenv("LIVE_LANE_WEIGHT", 4))
+    # Every live WebSocket is a session with its own buffer. Sessions take turns for at most
+    # LIVE_SCHEDULER_CONCURRENCY chunks in flight at once (defaults to one per replica), and each
+    # session queues at most LIVE_SESSION_MAX_PENDING chunks before its oldest chunk is dropped.
+    LIVE_SCHEDULER_CONCURRENCY = int(os.getenv("LIVE_SCHEDULER_CONCURRENCY", MODEL_REPLICAS))
+    LIVE_SESSION_MAX_PENDING = int(os.getenv("LIVE_SESSION_MAX_PENDING", 4))
+    # Cross-session batching. On engines that batch (nbailab_whisper, faster_whisper), chunks of up to
+    # LIVE_BATCH_SIZE sessions waiting for a slot are transcribed in one forward pass. 1 disables batching.
+    LIVE_BATCH_SIZE = int(os.getenv("LIVE_BATCH_SIZE", 8))
+    # Backpressure for live sessions. The chunk size of a session grows up to LIVE_MAX_CHUNK_SIZE while its
+    # real-time factor (inference time per second of audio) is above LIVE_TARGET_RTF and shrinks back when it
+    # recovers. When results lag more than LIVE_MAX_LAG_SECONDS behind the audio, waiting chunks are merged
+    # into one pass ("merge") or dropped ("drop").
+    LIVE_MAX_CHUNK_SIZE = int(os.getenv("LIVE_MAX_CHUNK_SIZE", 2 * LIVE_CHUNK_SIZE))
+    LIVE_TARGET_RTF = float(os.getenv("LIVE_TARGET_RTF", 0.7))
+    LIVE_MAX_LAG_SECONDS = float(os.getenv("LIVE_MAX_LAG_SECONDS", 6))
+    LIVE_LAG_POLICY = os.getenv("LIVE_LAG_POLICY", "merge")
+    if LIVE_LAG_POLICY not in {"merge", "drop"}:
+        raise ValueError("Invalid LIVE_LAG_POLICY. Choose 'merge' or 'drop'.")
+
+    # Decoded audio longer than AUDIO_SPOOL_THRESHOLD_SECONDS is kept as 16-bit PCM in a memory-mapped
+    # spool file under AUDIO_SPOOL_DIR and transcribed in windows of AUDIO_WINDOW_SECONDS, so multi-hour
+    # recordings are not held in memory as one float32 array. 0 disables spooling.
+    AUDIO_SPOOL_THRESHOLD_SECONDS = int(os.getenv("AUDIO_SPOOL_THRESHOLD_SECONDS", 1800))
+    AUDIO_SPOOL_DIR = os.getenv("AUDIO_SPOOL_DIR", tempfile.gettempdir())
+    AUDIO_WINDOW_SECONDS = int(os.getenv("AUDIO_WINDOW_SECONDS", 600))
+
+    # Transcription results are cached by a hash of the decoded audio, the engine, the model and the
+    # request parameters. The in-memory tier holds up to RESULT_CACHE_MEMORY_MB, the disk tier under
+    # RESULT_CACHE_DIR up to RESULT_CACHE_DISK_MB; least recently used results are evicted first.
+    # The disk tier keeps transcripts after a restart, so it is off unless RESULT_CACHE_DISK_MB is set.
+    # Setting both sizes to 0 disables the cache.
+    RESULT_CACHE_MEMORY_MB = int(os.getenv("RESULT_CACHE_MEMORY_MB", 64))
+    RESULT_CACHE_DIR = os.getenv(
+        "RESULT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "whisper-asr-webservice", "results")
+    )
+    RESULT_CACHE_DISK_MB = int(os.getenv("RESULT_CACHE_DISK_MB", 0))
+
+    # Transcript downloads of at least this size are compressed with brotli or gzip
+    # if the client sends a matching Accept-Encoding header. 0 compresses every transcript.
+    RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", 1024))
@@ -2,9 +2,16 @@ from .asr_exceptions import (
     ASRException,
     AudioLoadError,
     ConfigurationError,
+    InvalidTranscriptError,
+    JobNotFoundError,
+    JobNotReadyError,
     ModelLoadError,
+    ServiceOverloadedError,
+    TranscriptionCancelledError,
     TranscriptionError,
     UnsupportedEngineError,
+    UnsupportedModelError,
+    UnsupportedOutputError,
     WebSocketError,
 )
 
@@ -14,6 +21,13 @@ __all__ = [
     "TranscriptionError",
     "AudioLoadError",
     "UnsupportedEngineError",
+    "UnsupportedModelError",
+    "UnsupportedOutputError",
     "ConfigurationError",
     "WebSocketError",
+    "JobNotFoundError",
+    "JobNotReadyError",
+    "InvalidTranscriptError",
+    "ServiceOverloadedError",
+    "TranscriptionCancelledError",
 ]
@@ -28,6 +28,18 @@ class UnsupportedEngineError(ASRException):
     pass
 
 
+class UnsupportedModelError(ASRException):
+    """Raised when a request selects a model the service is not configured to serve."""
+
+    pass
+
+
+class UnsupportedOutputError(ASRException):
+    """Raised when a request asks for an output format the service cannot render."""
+
+    pass
+
+
 class ConfigurationError(ASRException):
     """Raised when there's a configuration error."""
 
@@ -38,3 +50,35 @@ class WebSocketError(ASRException):
     """Raised when there's an error in WebSocket communication."""
 
     pass
+
+
+class JobNotFoundError(ASRException):
+    """Raised when a transcription job does not exist."""
+
+    pass
+
+
+class JobNotReadyError(ASRException):
+    """Raised when the result of an unfinished transcription job is requested."""
+
+    pass
+
+
+class InvalidTranscriptError(ASRException):
+    """Raised when an uploaded transcript cannot be converted to another format."""
+
+    pass
+
+
+class TranscriptionCancelledError(ASRException):
+    """Raised when a transcription is abandoned because the client disconnected."""
+
+    pass
+
+
+class ServiceOverloadedError(ASRException):
+    """Raised when a request is rejected because the admission queue is full."""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
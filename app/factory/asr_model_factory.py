@@ -1,47 +1,59 @@
-from typing import Union
+import os
+from functools import partial
 
 from app.asr_models.asr_model import ASRModel
-from app.asr_models.faster_whisper_engine import FasterWhisperASR
-from app.asr_models.mbain_whisperx_engine import WhisperXASR
-from app.asr_models.openai_whisper_engine import OpenAIWhisperASR
+from app.asr_models.model_registry import ModelRegistry
+from app.asr_models.replica_pool import ModelReplicaPool
 from app.config import CONFIG
 from app.exceptions import UnsupportedEngineError
-from app.nbailab_whisper import core as nbailab_core
-
-
-class NbAiLabWhisperASR(ASRModel):
-    def load_model(self):
-        # Ingen eksplisitt lasting nødvendig for HuggingFace pipeline
-        pass
-
-    def transcribe(
-        self,
-        audio,
-        task: Union[str, None],
-        language: Union[str, None],
-        initial_prompt: Union[str, None],
-        vad_filter: Union[bool, None],
-        word_timestamps: Union[bool, None],
-        options: Union[dict, None],
-        output,
-    ):
-        return nbailab_core.transcribe(audio, task, language, initial_prompt, vad_filter, word_timestamps, output)
-
-    def language_detection(self, audio):
-        return nbailab_core.language_detection(audio)
 
 
 class ASRModelFactory:
     @staticmethod
     def create_asr_model() -> ASRModel:
-        """Create an ASR model instance based on configuration."""
+        """
+        Create an ASR model instance based on configuration.
+        With ASR_MODELS the models are served side by side by a registry that selects one per request.
+        """
+        if CONFIG.ASR_MODELS:
+            return ModelRegistry(
+                ASRModelFactory.create_model, CONFIG.MODEL_NAME, CONFIG.ASR_MODELS, CONFIG.MODEL_MEMORY_BUDGET_MB
+            )
+        return ASRModelFactory.create_model(CONFIG.MODEL_NAME)
+
+    @staticmethod
+    def create_model(model_name: str) -> ASRModel:
+        """
+        Create the engine for one model.
+        With MODEL_REPLICAS > 1 the engine is wrapped in a pool of independent replicas.
+        """
+        if CONFIG.MODEL_REPLICAS > 1:
+            threads = CONFIG.MODEL_REPLICA_THREADS or max(1, (os.cpu_count() or 1) // CONFIG.MODEL_REPLICAS)
+            replica_factory = partial(ASRModelFactory.create_engine, model_name=model_name)
+            return ModelReplicaPool(replica_factory, CONFIG.MODEL_REPLICAS, threads, model_name)
+        return ASRModelFactory.create_engine(CONFIG.MODEL_REPLICA_THREADS, model_name)
+
+    @staticmethod
+    def create_engine(cpu_threads: int = 0, model_name: str = CONFIG.MODEL_NAME) -> ASRModel:
+        """
+        Create a single instance of the configured engine for ``model_name``.
+        Engine modules are imported here, so only the configured engine's framework is loaded.
+        """
         if CONFIG.ASR_ENGINE == "openai_whisper":
-            return OpenAIWhisperASR()
+            from app.asr_models.openai_whisper_engine import OpenAIWhisperASR
+
+            return OpenAIWhisperASR(cpu_threads, model_name)
         elif CONFIG.ASR_ENGINE == "faster_whisper":
-            return FasterWhisperASR()
+            from app.asr_models.faster_whisper_engine import FasterWhisperASR
+
+            return FasterWhisperASR(cpu_threads, model_name)
         elif CONFIG.ASR_ENGINE == "whisperx":
-            return WhisperXASR()
+            from app.asr_models.mbain_whisperx_engine import WhisperXASR
+
+            return WhisperXASR(cpu_threads, model_name)
         elif CONFIG.ASR_ENGINE == "nbailab_whisper":
-            return NbAiLabWhisperASR()
+            from app.asr_models.nbailab_whisper_engine import NbAiLabWhisperASR
+
+            return NbAiLabWhisperASR(cpu_threads, model_name)
         else:
             raise UnsupportedEngineError(f"Unsupported ASR engine: {CONFIG.ASR_ENGINE}")
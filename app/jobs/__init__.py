@@ -0,0 +1,4 @@
+from .job_store import Job, JobStore
+from .job_worker import JobWorker
+
+__all__ = ["Job", "JobStore", "JobWorker"]
@@ -0,0 +1,174 @@
+import json
+import os
+import sqlite3
+import time
+import uuid
+from dataclasses import dataclass
+from threading import Lock
+from typing import Optional
+
+from app.config import CONFIG
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    filename TEXT,
+    audio_path TEXT NOT NULL,
+    params TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+
+@dataclass
+class Job:
+    id: str
+    status: str
+    progress: float
+    filename: Optional[str]
+    audio_path: str
+    params: dict
+    result: Optional[str]
+    error: Optional[str]
+    created_at: float
+    updated_at: float
+
+    def to_status(self) -> dict:
+        """Public view of the job, without the stored audio path and result."""
+        return {
+            "id": self.id,
+            "status": self.status,
+            "progress": round(self.progress, 3),
+            "filename": self.filename,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class JobStore:
+    """
+    Durable job queue backed by a local SQLite database.
+    Uploaded audio is spooled next to the database so queued jobs survive a restart.
+    """
+
+    def __init__(self, directory: str = CONFIG.JOBS_DIR):
+        self.directory = directory
+        self._connection = None
+        self._lock = Lock()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # Connect on first use so importing the webservice does not touch the disk
+        if self._connection is None:
+            os.makedirs(self.directory, exist_ok=True)
+            connection = sqlite3.connect(
+                os.path.join(self.directory, "jobs.sqlite3"), check_same_thread=False, isolation_level=None
+            )
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def audio_path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.audio")
+
+    def new_job_id(self) -> str:
+        return uuid.uuid4().hex
+
+    def create(self, job_id: str, filename: Optional[str], params: dict) -> Job:
+        now = time.time()
+        with self._lock:
+            self.connection.execute(
+                "INSERT INTO jobs (id, status, progress, filename, audio_path, params, created_at, updated_at) "
+                "VALUES (?, ?, 0, ?, ?, ?, ?, ?)",
+                (job_id, JOB_QUEUED, filename, self.audio_path(job_id), json.dumps(params), now, now),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self.connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row else None
+
+    def claim_next(self) -> Optional[Job]:
+        """Atomically move the oldest queued job to running and return it."""
+        with self._lock:
+            connection = self.connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (JOB_QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    connection.execute(
+                        "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?",
+                        (JOB_RUNNING, time.time(), row["id"]),
+                    )
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job = self._to_job(row)
+        job.status = JOB_RUNNING
+        return job
+
+    def requeue_interrupted(self) -> int:
+        """Return jobs left running by a previous process to the queue."""
+        with self._lock:
+            cursor = self.connection.execute(
+                "UPDATE jobs SET status = ?, progress = 0, updated_at = ? WHERE status = ?",
+                (JOB_QUEUED, time.time(), JOB_RUNNING),
+            )
+        return cursor.rowcount
+
+    def update_progress(self, job_id: str, progress: float):
+        self._update(job_id, progress=progress)
+
+    def complete(self, job_id: str, result: str):
+        self._update(job_id, status=JOB_COMPLETED, progress=1.0, result=result)
+
+    def fail(self, job_id: str, error: str):
+        self._update(job_id, status=JOB_FAILED, error=error)
+
+    def _update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        # Column names come from this module, never from the request
+        query = f"UPDATE jobs SET {assignments} WHERE id = ?"  # nosec B608
+        with self._lock:
+            self.connection.execute(query, (*fields.values(), job_id))
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> Job:
+        return Job(
+            id=row["id"],
+            status=row["status"],
+            progress=row["progress"],
+            filename=row["filename"],
+            audio_path=row["audio_path"],
+            params=json.loads(row["params"]),
+            result=row["result"],
+            error=row["error"],
+            created_at=row["created_at"],
+            updated_at=row["updated_at"],
+        )
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
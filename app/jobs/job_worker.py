@@ -0,0 +1,134 @@
+import logging
+import os
+from threading import Event, Thread
+from typing import Callable, List, Optional
+
+from app.asr_models.asr_model import ASRModel
+from app.audio import SpooledAudio
+from app.cache import ResultCache
+from app.config import CONFIG
+from app.jobs.job_store import Job, JobStore
+from app.utils import load_audio
+
+logger = logging.getLogger(__name__)
+
+
+class JobWorker:
+    """Runs queued jobs on background threads with the shared ASR model."""
+
+    def __init__(
+        self,
+        store: JobStore,
+        asr_model: ASRModel,
+        workers: int = CONFIG.JOBS_WORKERS,
+        cache: Optional[ResultCache] = None,
+    ):
+        self.store = store
+        self.asr_model = asr_model
+        self.workers = workers
+        self.cache = cache if cache is not None and cache.enabled else None
+        self.poll_interval = 1.0
+        self._wakeup = Event()
+        self._stopping = Event()
+        self._threads: List[Thread] = []
+
+    def start(self):
+        requeued = self.store.requeue_interrupted()
+        if requeued:
+            logger.info(f"Requeued {requeued} job(s) interrupted by a restart")
+        self._stopping.clear()
+        for index in range(self.workers):
+            thread = Thread(target=self._run, name=f"asr-job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def notify(self):
+        """Wake an idle worker after a job has been queued."""
+        self._wakeup.set()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop picking up new jobs. A job in progress is requeued on the next start if it does not finish."""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def _run(self):
+        while not self._stopping.is_set():
+            job = self.store.claim_next()
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._process(job)
+
+    def _process(self, job: Job):
+        logger.info(f"Processing job {job.id} ({job.filename})")
+        params = job.params
+        audio = None
+        model_name = None
+        try:
+            # Jobs queued before models could be selected run on the default model
+            model_name = self.asr_model.pin(params.get("model"))
+            asr_model = self.asr_model.select(model_name)
+            with open(job.audio_path, "rb") as audio_file:
+                audio = load_audio(audio_file, params.get("encode", True))
+
+            key = None
+            if self.cache is not None:
+                # Same key as a synchronous /asr request with these parameters
+                key = self.cache.key(audio, {name: value for name, value in params.items() if name != "encode"})
+                cached = self.cache.get(key)
+                if cached is not None:
+                    self.store.complete(job.id, cached)
+                    logger.info(f"Job {job.id} completed from the result cache")
+                    return
+
+            options = {
+                "diarize": params.get("diarize", False),
+                "min_speakers": params.get("min_speakers"),
+                "max_speakers": params.get("max_speakers"),
+                "progress_callback": self._progress_reporter(job.id),
+            }
+            # Multi-hour recordings are spooled to disk and transcribed window by window
+            transcribe = asr_model.transcribe_windowed if isinstance(audio, SpooledAudio) else asr_model.transcribe
+            # Results are stored as JSON and converted to the requested format on download
+            result = transcribe(
+                audio,
+                params.get("task", "transcribe"),
+                params.get("language"),
+                params.get("initial_prompt"),
+                params.get("vad_filter", False),
+                params.get("word_timestamps", False),
+                options,
+                "json",
+            )
+            if result is None:
+                raise RuntimeError("Transcription returned no result")
+            result = result.getvalue()
+            if key is not None:
+                self.cache.put(key, result)
+            self.store.complete(job.id, result)
+            logger.info(f"Job {job.id} completed")
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}")
+            self.store.fail(job.id, str(e))
+        finally:
+            if model_name is not None:
+                self.asr_model.unpin(model_name)
+            if isinstance(audio, SpooledAudio):
+                audio.close()
+            if os.path.exists(job.audio_path):
+                os.remove(job.audio_path)
+
+    def _progress_reporter(self, job_id: str) -> Callable[[float], None]:
+        last_reported = [0.0]
+
+        def report(progress: float):
+            # Only write to the database once progress moved by at least one percent
+            if progress - last_reported[0] >= 0.01:
+                last_reported[0] = progress
+                self.store.update_progress(job_id, progress)
+
+        return report
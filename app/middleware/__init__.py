@@ -1,12 +1,16 @@
 from .error_handler import (
     asr_exception_handler,
+    cancelled_exception_handler,
     general_exception_handler,
     http_exception_handler,
+    overload_exception_handler,
     validation_exception_handler,
 )
 
 __all__ = [
     "asr_exception_handler",
+    "cancelled_exception_handler",
+    "overload_exception_handler",
     "validation_exception_handler",
     "http_exception_handler",
     "general_exception_handler",
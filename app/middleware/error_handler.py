@@ -5,7 +5,7 @@ from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
-from app.exceptions import ASRException
+from app.exceptions import ASRException, ServiceOverloadedError, TranscriptionCancelledError
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +19,22 @@ async def asr_exception_handler(request: Request, exc: ASRException):
     )
 
 
+async def overload_exception_handler(request: Request, exc: ServiceOverloadedError):
+    """Handle rejected requests when the admission queue is full."""
+    logger.warning(f"Request rejected: {exc}")
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"error": "Too Many Requests", "message": str(exc), "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+async def cancelled_exception_handler(request: Request, exc: TranscriptionCancelledError):
+    """Handle transcriptions abandoned by the client. Nobody reads this response, 499 marks it in access logs."""
+    logger.info(f"Transcription cancelled: {exc}")
+    return JSONResponse(status_code=499, content={"error": "Client Closed Request", "message": str(exc)})
+
+
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """Handle validation errors."""
     logger.error(f"Validation Error: {exc}")
@@ -0,0 +1,190 @@
+import logging
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from threading import Condition, Thread
+from typing import Any, Deque, Dict, List, Optional
+
+from app.asr_models.priority_lock import PRIORITY_LIVE, current_priority
+from app.config import CONFIG
+
+# Whisper processes 30 second windows. Longer inputs use sequential long-form decoding
+# in the pipeline and are run on their own instead of being padded into a batch.
+MAX_BATCHED_SAMPLES = 30 * CONFIG.SAMPLE_RATE
+
+
+@dataclass
+class _PendingCall:
+    audio: Any
+    kwargs: Dict[str, Any]
+    future: Future = field(default_factory=Future)
+    # call_priority() of the calling thread, live chunks are collected and run first
+    priority: int = field(default_factory=current_priority)
+
+    @property
+    def batch_key(self):
+        return _freeze(self.kwargs)
+
+
+def _freeze(value):
+    """Hashable form of call options, so lists and dicts such as generate_kwargs can be compared."""
+    if isinstance(value, dict):
+        return tuple(sorted((str(key), _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(item) for item in value)
+    try:
+        hash(value)
+    except TypeError:
+        # Opaque objects only share a batch with calls passing the very same object
+        return (type(value).__name__, id(value))
+    return value
+
+
+def _num_samples(audio) -> Optional[int]:
+    """Length of an in-memory waveform, None for file names, raw bytes and other inputs the pipeline decodes."""
+    if isinstance(audio, dict):
+        audio = audio.get("raw", audio.get("array"))
+    if isinstance(audio, (str, bytes)) or not hasattr(audio, "__len__"):
+        return None
+    return len(audio)
+
+
+class BatchScheduler:
+    """
+    Dynamic micro-batching in front of a HuggingFace ASR pipeline.
+
+    Calls arriving within ``window_ms`` of each other are collected, up to ``max_batch_size``,
+    and run through the pipeline as one batch on a dedicated thread. Each caller blocks until
+    its own result is available, so the scheduler is a drop-in replacement for the pipeline.
+    batch() queues several inputs at once, they always share a forward pass.
+
+    The scheduler takes the place of the model lock, so it serves live chunks (see call_priority()) ahead
+    of uploads: they are collected and run first, but after ``live_weight`` consecutive collections that
+    started with a live chunk while uploads waited, the oldest upload goes first.
+    """
+
+    def __init__(
+        self,
+        asr_pipeline,
+        max_batch_size: int = CONFIG.NBAILAB_MAX_BATCH_SIZE,
+        window_ms: float = CONFIG.NBAILAB_BATCH_WINDOW_MS,
+        live_weight: int = CONFIG.LIVE_LANE_WEIGHT,
+    ):
+        self.asr_pipeline = asr_pipeline
+        self.max_batch_size = max(1, max_batch_size)
+        self.window = max(0.0, window_ms) / 1000.0
+        self.live_weight = max(1, live_weight)
+        # Queued calls of live chunks and of uploads, each entry holds the calls of one __call__ or batch()
+        self._live: Deque[List[_PendingCall]] = deque()
+        self._uploads: Deque[List[_PendingCall]] = deque()
+        self._live_streak = 0
+        self._closing = False
+        self._condition = Condition()
+        self._thread = Thread(target=self._run, name="nbailab-batcher", daemon=True)
+        self._thread.start()
+
+    def __call__(self, audio, **kwargs):
+        call = _PendingCall(audio, kwargs)
+        self._put([call])
+        return call.future.result()
+
+    def batch(self, audios: List[Any], **kwargs) -> List[Any]:
+        """Run several inputs with the same options and return their results in order."""
+        calls = [_PendingCall(audio, kwargs) for audio in audios]
+        self._put(calls)
+        return [call.future.result() for call in calls]
+
+    def close(self):
+        """Stop the scheduler thread once the calls already queued are processed."""
+        with self._condition:
+            self._closing = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _put(self, calls: List[_PendingCall]):
+        with self._condition:
+            (self._live if calls[0].priority == PRIORITY_LIVE else self._uploads).append(calls)
+            self._condition.notify()
+
+    def _get(self, timeout: Optional[float] = None, first: bool = False) -> Optional[List[_PendingCall]]:
+        """
+        Take the next queued calls, live ones first, waiting up to ``timeout`` seconds (None waits until
+        there are calls). Returns None on timeout, or once the scheduler is closing and nothing is queued.
+        ``first`` marks the calls that start a batch, which is where waiting uploads get their turn.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._live or self._uploads or self._closing, timeout):
+                return None
+            if self._live and not (first and self._uploads and self._live_streak >= self.live_weight):
+                if first:
+                    self._live_streak = self._live_streak + 1 if self._uploads else 0
+                return self._live.popleft()
+            if first:
+                self._live_streak = 0
+            return self._uploads.popleft() if self._uploads else None
+
+    def _run(self):
+        while True:
+            first = self._get(first=True)
+            if first is None:
+                return
+            batch = self._collect(first)
+            try:
+                for group in self._group(batch):
+                    self._run_batch(group)
+            except Exception as e:
+                # Never leave a caller waiting, whatever went wrong on this thread
+                logging.exception("Batch scheduler failed")
+                for call in batch:
+                    if not call.future.done():
+                        call.future.set_exception(e)
+
+    def _collect(self, first: List[_PendingCall]) -> List[_PendingCall]:
+        batch = list(first)
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            calls = self._get(timeout=remaining)
+            if calls is None:
+                break
+            batch.extend(calls)
+        return batch
+
+    @staticmethod
+    def _group(batch: List[_PendingCall]) -> List[List[_PendingCall]]:
+        """Split a collected batch into calls that can share one forward pass, live calls run first."""
+        groups: Dict[Any, List[_PendingCall]] = {}
+        singles = []
+        for call in batch:
+            try:
+                samples = _num_samples(call.audio)
+                if samples is None or samples > MAX_BATCHED_SAMPLES:
+                    singles.append([call])
+                else:
+                    groups.setdefault(call.batch_key, []).append(call)
+            except Exception as e:
+                call.future.set_exception(e)
+        return sorted(list(groups.values()) + singles, key=lambda group: min(call.priority for call in group))
+
+    def _run_batch(self, group: List[_PendingCall]):
+        kwargs = group[0].kwargs
+        try:
+            if len(group) == 1:
+                results = [self.asr_pipeline(group[0].audio, **kwargs)]
+            else:
+                logging.debug(f"Running batch of {len(group)} requests")
+                results = self.asr_pipeline([call.audio for call in group], batch_size=len(group), **kwargs)
+            if len(results) != len(group):
+                raise RuntimeError(f"Pipeline returned {len(results)} results for a batch of {len(group)}")
+        except Exception as e:
+            for call in group:
+                call.future.set_exception(e)
+            return
+
+        for call, result in zip(group, results, strict=True):
+            call.future.set_result(result)
@@ -3,10 +3,10 @@ import os
 import warnings
 from io import StringIO
 from threading import Lock
-from typing import TextIO, Union
+from typing import List, Union
 
-import torch
-from transformers.pipelines import pipeline
+from app.nbailab_whisper.batching import BatchScheduler
+from app.output.result_writers import get_writer
 
 # Suppress FutureWarning from transformers
 warnings.filterwarnings("ignore", category=FutureWarning, module="transformers")
@@ -15,36 +15,62 @@ warnings.filterwarnings("ignore", category=FutureWarning, module="transformers")
 model_name = os.getenv("ASR_MODEL", "NbAiLab/nb-whisper-large")
 model_path = os.getenv("ASR_MODEL_PATH", os.path.join(os.path.expanduser("~"), ".cache", "whisper"))
 
-# Bestem device automatisk: CUDA > MPS > CPU
-if torch.cuda.is_available():
-    device = 0
-elif torch.backends.mps.is_available():
-    device = "mps"
-else:
-    device = -1
-
 logging.basicConfig(level=logging.INFO)
-logging.info(f"[NbAiLab Whisper] Using model: {model_name} (device: {device})")
 
 # Initialiser HuggingFace pipeline
 asr_pipeline = None
 model_lock = Lock()
 
 
+def _device():
+    # Bestem device automatisk: CUDA > MPS > CPU
+    import torch
+
+    if torch.cuda.is_available():
+        return 0
+    elif torch.backends.mps.is_available():
+        return "mps"
+    return -1
+
+
+def create_pipeline(name: str = model_name):
+    """
+    Create a new HuggingFace pipeline instance for the model ``name``, the configured model by default.
+    torch and transformers are imported here, so importing the engine does not load them.
+    """
+    from transformers.pipelines import pipeline
+
+    device = _device()
+    logging.info(f"[NbAiLab Whisper] Using model: {name} (device: {device})")
+    logging.info(f"Loading model: {name}")
+    new_pipeline = pipeline(
+        "automatic-speech-recognition",
+        model=name,
+        device=device,
+        model_kwargs={"cache_dir": model_path},
+    )
+    logging.info("Model loaded successfully")
+    return new_pipeline
+
+
 def load_model():
     """Load the HuggingFace pipeline if not already loaded."""
     global asr_pipeline
     if asr_pipeline is None:
         with model_lock:
             if asr_pipeline is None:
-                logging.info(f"Loading model: {model_name}")
-                asr_pipeline = pipeline(
-                    "automatic-speech-recognition",
-                    model=model_name,
-                    device=device,
-                    model_kwargs={"cache_dir": model_path},
-                )
-                logging.info("Model loaded successfully")
+                asr_pipeline = create_pipeline()
+
+
+def _resolve_pipeline(pipe):
+    """Return the given pipeline, or the lazily loaded module pipeline when none is given."""
+    if pipe is not None:
+        return pipe
+
+    load_model()
+    if asr_pipeline is None:
+        raise RuntimeError("Model failed to load")
+    return asr_pipeline
 
 
 def transcribe(
@@ -55,13 +81,67 @@ def transcribe(
     vad_filter: Union[bool, None],
     word_timestamps: Union[bool, None],
     output,
+    pipe=None,
+    lock=model_lock,
 ):
-    """Transcribe audio using NbAiLab Whisper model."""
-    load_model()
+    """Transcribe audio using NbAiLab Whisper model and write the result in the requested format."""
+    result = transcribe_result(audio, task, language, initial_prompt, vad_filter, word_timestamps, pipe, lock)
+    output_file = StringIO()
+    get_writer(output).write_result(result, output_file)
+    output_file.seek(0)
+    return output_file
+
+
+def transcribe_result(
+    audio,
+    task: Union[str, None],
+    language: Union[str, None],
+    initial_prompt: Union[str, None],
+    vad_filter: Union[bool, None],
+    word_timestamps: Union[bool, None],
+    pipe=None,
+    lock=model_lock,
+) -> dict:
+    """
+    Transcribe audio using NbAiLab Whisper model and return the result in the Whisper layout.
+    pipe and lock default to the shared module pipeline, engine instances pass their own.
+    """
+    pipe = _resolve_pipeline(pipe)
+    kwargs = _pipeline_kwargs(language, word_timestamps)
+
+    with lock:
+        result = pipe(audio, **kwargs)
+
+    return _whisper_result(result)
+
+
+def transcribe_batch_result(
+    audios: List,
+    task: Union[str, None],
+    language: Union[str, None],
+    initial_prompt: Union[str, None],
+    vad_filter: Union[bool, None],
+    word_timestamps: Union[bool, None],
+    pipe=None,
+    lock=model_lock,
+) -> List[dict]:
+    """
+    Transcribe several inputs of up to 30 seconds in one forward pass and return their results in order.
+    A BatchScheduler in front of the pipeline runs them as one of its batches.
+    """
+    pipe = _resolve_pipeline(pipe)
+    kwargs = _pipeline_kwargs(language, word_timestamps)
+
+    if isinstance(pipe, BatchScheduler):
+        results = pipe.batch(list(audios), **kwargs)
+    else:
+        with lock:
+            results = pipe(list(audios), batch_size=len(audios), **kwargs)
+
+    return [_whisper_result(result) for result in results]
 
-    if asr_pipeline is None:
-        raise RuntimeError("Model failed to load")
 
+def _pipeline_kwargs(language: Union[str, None], word_timestamps: Union[bool, None]) -> dict:
     # Forbered transcribe options
     kwargs = {}
 
@@ -81,11 +161,11 @@ def transcribe(
         kwargs["return_timestamps"] = True
 
     # VAD filter støttes ikke direkte i transformers pipeline
+    return kwargs
 
-    with model_lock:
-        result = asr_pipeline(audio, **kwargs)
 
-    # Konverter til Whisper-format for write_result
+def _whisper_result(result) -> dict:
+    # Konverter til Whisper-format
     text = result.get("text", "") if isinstance(result, dict) else ""
 
     # Håndter segments basert på resultatet fra HuggingFace pipeline
@@ -110,27 +190,19 @@ def transcribe(
         # Fallback til enkelt segment
         segments = [{"text": text, "start": 0, "end": 0}]
 
-    whisper_result = {"text": text, "segments": segments}
+    return {"text": text, "segments": segments}
 
-    output_file = StringIO()
-    write_result(whisper_result, output_file, output)
-    output_file.seek(0)
-    return output_file
 
-
-def language_detection(audio):
+def language_detection(audio, pipe=None, lock=model_lock):
     """Detect language using Whisper model."""
-    load_model()
-
-    if asr_pipeline is None:
-        raise RuntimeError("Model failed to load")
+    pipe = _resolve_pipeline(pipe)
 
     # For HuggingFace pipeline, bruk en enkel språkgjenkjenning
     # eller returner norsk som standard for NbAiLab modeller
     try:
         # Prøv å gjøre en kort transkribering for språkgjenkjenning
-        with model_lock:
-            result = asr_pipeline(audio, return_timestamps=True)
+        with lock:
+            result = pipe(audio, return_timestamps=True)
 
         # Sjekk om resultatet inneholder norske ord
         if isinstance(result, dict):
@@ -148,75 +220,3 @@ def language_detection(audio):
     except Exception as e:
         logging.warning(f"Language detection failed: {e}")
         return "no", 0.8  # Standard til norsk for NbAiLab modeller
-
-
-def write_result(result: dict, file: TextIO, output: Union[str, None]):
-    """Write transcription result to file in specified format."""
-    if output == "txt":
-        # Enkel tekst output
-        for segment in result["segments"]:
-            if isinstance(segment, dict):
-                text = segment.get("text", "")
-            else:
-                text = str(segment)
-            print(text.strip(), file=file, flush=True)
-    elif output == "json":
-        # JSON output
-        import json
-
-        json.dump(result, file, ensure_ascii=False, indent=2)
-    elif output == "srt":
-        # SRT format
-        for i, segment in enumerate(result["segments"], start=1):
-            if isinstance(segment, dict):
-                text = segment.get("text", "")
-                start = segment.get("start", 0)
-                end = segment.get("end", 0)
-            else:
-                text = str(segment)
-                start = 0
-                end = 0
-
-            # Format timestamps
-            start_str = (
-                f"{int(start//3600):02d}:{int((start%3600)//60):02d}:{int(start%60):02d},{int((start%1)*1000):03d}"
-            )
-            end_str = f"{int(end//3600):02d}:{int((end%3600)//60):02d}:{int(end%60):02d},{int((end%1)*1000):03d}"
-
-            print(f"{i}\n{start_str} --> {end_str}\n{text.strip()}\n", file=file, flush=True)
-    elif output == "vtt":
-        # VTT format
-        print("WEBVTT\n", file=file)
-        for segment in result["segments"]:
-            if isinstance(segment, dict):
-                text = segment.get("text", "")
-                start = segment.get("start", 0)
-                end = segment.get("end", 0)
-            else:
-                text = str(segment)
-                start = 0
-                end = 0
-
-            # Format timestamps
-            start_str = (
-                f"{int(start//3600):02d}:{int((start%3600)//60):02d}:{int(start%60):02d}.{int((start%1)*1000):03d}"
-            )
-            end_str = f"{int(end//3600):02d}:{int((end%3600)//60):02d}:{int(end%60):02d}.{int((end%1)*1000):03d}"
-
-            print(f"{start_str} --> {end_str}\n{text.strip()}\n", file=file, flush=True)
-    elif output == "tsv":
-        # TSV format
-        print("start\tend\ttext", file=file)
-        for segment in result["segments"]:
-            if isinstance(segment, dict):
-                text = segment.get("text", "")
-                start = segment.get("start", 0)
-                end = segment.get("end", 0)
-            else:
-                text = str(segment)
-                start = 0
-                end = 0
-
-            print(f"{int(start*1000)}\t{int(end*1000)}\t{text.strip()}", file=file, flush=True)
-    else:
-        return "Please select an output method!"
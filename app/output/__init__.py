@@ -1,11 +1,18 @@
+from .binary import BINARY_FORMATS, pack_transcript, unpack_transcript
+from .bundle import OUTPUT_FORMATS, bundle_results, normalize_outputs, render_outputs, render_result
 from .result_writers import (
+    WRITERS,
     ResultWriter,
     WriteJSON,
     WriteSRT,
     WriteTSV,
     WriteTXT,
     WriteVTT,
+    dumps_json,
+    get_writer,
 )
+from .segments import Segment, Word
+from .streaming import STREAM_FORMATS, SegmentEventEncoder
 
 __all__ = [
     "ResultWriter",
@@ -14,4 +21,19 @@ __all__ = [
     "WriteSRT",
     "WriteTSV",
     "WriteJSON",
+    "WRITERS",
+    "dumps_json",
+    "get_writer",
+    "Segment",
+    "Word",
+    "OUTPUT_FORMATS",
+    "bundle_results",
+    "normalize_outputs",
+    "render_outputs",
+    "render_result",
+    "BINARY_FORMATS",
+    "pack_transcript",
+    "unpack_transcript",
+    "STREAM_FORMATS",
+    "SegmentEventEncoder",
 ]
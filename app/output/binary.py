@@ -0,0 +1,139 @@
+import math
+from typing import Dict, List, Optional
+
+import msgpack
+import numpy as np
+
+# Binary output formats and their media types
+BINARY_FORMATS: Dict[str, str] = {"msgpack": "application/vnd.msgpack"}
+
+TRANSCRIPT_FORMAT = "whisper-asr-transcript"
+TRANSCRIPT_VERSION = 1
+
+# Per-segment decoder statistics packed as float32 columns when the engine reports them
+SEGMENT_FLOAT_FIELDS = ("avg_logprob", "compression_ratio", "no_speech_prob", "temperature")
+
+
+def pack_transcript(result: dict) -> bytes:
+    """
+    Pack a JSON transcript into a columnar MessagePack document.
+
+    Segments and words are stored column by column instead of as one map per item: timestamps as little-endian
+    int32 milliseconds (-1 for words that could not be aligned), scores as float32 (NaN when missing), token ids
+    as one int32 array, and ``word_offsets``/``token_offsets`` (uint32, one more than there are segments) mark
+    where each segment's words and tokens start. Numeric columns are raw bytes, e.g. ``np.frombuffer(column,
+    "<i4")`` reads them without parsing. Optional columns are left out when no segment has them.
+    """
+    segments = result.get("segments") or []
+    words = [word for segment in segments for word in segment.get("words") or ()]
+
+    packed_segments = {
+        "start_ms": _milliseconds([segment.get("start") for segment in segments]),
+        "end_ms": _milliseconds([segment.get("end") for segment in segments]),
+        "text": [segment.get("text", "") for segment in segments],
+    }
+    for field in SEGMENT_FLOAT_FIELDS:
+        if any(field in segment for segment in segments):
+            packed_segments[field] = _float32([segment.get(field) for segment in segments])
+    if any(segment.get("speaker") is not None for segment in segments):
+        packed_segments["speaker"] = [segment.get("speaker") for segment in segments]
+    if any(segment.get("tokens") for segment in segments):
+        tokens = [segment.get("tokens") or [] for segment in segments]
+        packed_segments["tokens"] = np.fromiter(
+            (token for segment_tokens in tokens for token in segment_tokens), dtype="<i4"
+        ).tobytes()
+        packed_segments["token_offsets"] = _offsets(tokens)
+
+    packed = {
+        "format": TRANSCRIPT_FORMAT,
+        "version": TRANSCRIPT_VERSION,
+        "language": result.get("language"),
+        "text": result.get("text", ""),
+        "segments": packed_segments,
+    }
+    if words:
+        packed_segments["word_offsets"] = _offsets([segment.get("words") or () for segment in segments])
+        packed["words"] = {
+            "start_ms": _milliseconds([word.get("start") for word in words]),
+            "end_ms": _milliseconds([word.get("end") for word in words]),
+            # whisperx reports the alignment score instead of a probability
+            "probability": _float32([word.get("probability", word.get("score")) for word in words]),
+            "word": [word.get("word", "") for word in words],
+        }
+        if any(word.get("speaker") is not None for word in words):
+            packed["words"]["speaker"] = [word.get("speaker") for word in words]
+    return msgpack.packb(packed, use_bin_type=True)
+
+
+def unpack_transcript(data: bytes) -> dict:
+    """Read a packed transcript back into the JSON layout, with timestamps in seconds and scores as floats."""
+    packed = msgpack.unpackb(data, raw=False)
+    if packed.get("format") != TRANSCRIPT_FORMAT:
+        raise ValueError("Not a packed transcript")
+
+    columns = packed["segments"]
+    starts = _seconds(columns["start_ms"])
+    ends = _seconds(columns["end_ms"])
+    segments = [{"id": i, "start": starts[i], "end": ends[i], "text": text} for i, text in enumerate(columns["text"])]
+    for field in SEGMENT_FLOAT_FIELDS:
+        if field in columns:
+            for segment, value in zip(segments, _floats(columns[field]), strict=True):
+                segment[field] = value
+    if "speaker" in columns:
+        for segment, speaker in zip(segments, columns["speaker"], strict=True):
+            if speaker is not None:
+                segment["speaker"] = speaker
+    if "tokens" in columns:
+        tokens = np.frombuffer(columns["tokens"], dtype="<i4").tolist()
+        offsets = np.frombuffer(columns["token_offsets"], dtype="<u4").tolist()
+        for i, segment in enumerate(segments):
+            segment["tokens"] = tokens[offsets[i] : offsets[i + 1]]
+
+    if "words" in packed:
+        word_columns = packed["words"]
+        word_starts = _seconds(word_columns["start_ms"])
+        word_ends = _seconds(word_columns["end_ms"])
+        probabilities = _floats(word_columns["probability"])
+        speakers = word_columns.get("speaker")
+        words = []
+        for i, text in enumerate(word_columns["word"]):
+            word = {"word": text}
+            if word_starts[i] is not None:
+                word["start"] = word_starts[i]
+                word["end"] = word_ends[i]
+            if probabilities[i] is not None:
+                word["probability"] = probabilities[i]
+            if speakers is not None and speakers[i] is not None:
+                word["speaker"] = speakers[i]
+            words.append(word)
+        offsets = np.frombuffer(columns["word_offsets"], dtype="<u4").tolist()
+        for i, segment in enumerate(segments):
+            segment["words"] = words[offsets[i] : offsets[i + 1]]
+
+    return {"text": packed.get("text", ""), "segments": segments, "language": packed.get("language")}
+
+
+def _milliseconds(values: List[Optional[float]]) -> bytes:
+    seconds = np.array([math.nan if value is None else value for value in values], dtype=np.float64)
+    milliseconds = np.where(np.isnan(seconds), -1, np.rint(seconds * 1000.0))
+    return milliseconds.astype("<i4").tobytes()
+
+
+def _float32(values: List[Optional[float]]) -> bytes:
+    return np.array([math.nan if value is None else value for value in values], dtype="<f4").tobytes()
+
+
+def _offsets(groups: List) -> bytes:
+    offsets = np.zeros(len(groups) + 1, dtype="<u4")
+    np.cumsum([len(group) for group in groups], out=offsets[1:])
+    return offsets.tobytes()
+
+
+def _seconds(column: bytes) -> List[Optional[float]]:
+    milliseconds = np.frombuffer(column, dtype="<i4")
+    return [None if value < 0 else value / 1000.0 for value in milliseconds.tolist()]
+
+
+def _floats(column: bytes) -> List[Optional[float]]:
+    # float32 keeps about seven significant digits, drop the noise the widening to float adds
+    return [None if math.isnan(value) else round(value, 6) for value in np.frombuffer(column, dtype="<f4").tolist()]
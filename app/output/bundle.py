@@ -0,0 +1,75 @@
+import json
+import zipfile
+from io import BytesIO, StringIO
+from typing import TYPE_CHECKING, Iterable, List, Union
+
+from app.exceptions import UnsupportedOutputError
+from app.output.binary import BINARY_FORMATS, pack_transcript
+
+if TYPE_CHECKING:
+    from app.asr_models.asr_model import ASRModel
+
+OUTPUT_FORMATS = ["txt", "vtt", "srt", "tsv", "json", *BINARY_FORMATS]
+
+
+def normalize_outputs(output: Union[str, Iterable[str], None]) -> List[str]:
+    """
+    Turn the ``output`` query parameter into a list of distinct formats, in request order.
+    Accepts a single format, repeated parameters and comma separated values. Defaults to txt.
+    Raises UnsupportedOutputError for a format not in OUTPUT_FORMATS.
+    """
+    if output is None:
+        return ["txt"]
+    values = [output] if isinstance(output, str) else list(output)
+    outputs: List[str] = []
+    for value in values:
+        for name in value.split(","):
+            name = name.strip().lower()
+            if name and name not in outputs:
+                if name not in OUTPUT_FORMATS:
+                    raise UnsupportedOutputError(
+                        f"Unsupported output format: {name}. Choose from {', '.join(OUTPUT_FORMATS)}."
+                    )
+                outputs.append(name)
+    return outputs or ["txt"]
+
+
+def render_result(asr_model: "ASRModel", result: str, output: Union[str, None]) -> Union[StringIO, BytesIO]:
+    """
+    Render a JSON transcript in one format with the engine's writer. JSON is passed through unchanged,
+    binary formats are returned as bytes.
+    """
+    if output == "json":
+        return StringIO(result)
+    if output in BINARY_FORMATS:
+        return BytesIO(pack_transcript(json.loads(result)))
+    result_file = StringIO()
+    asr_model.write_result(json.loads(result), result_file, output)
+    result_file.seek(0)
+    return result_file
+
+
+def bundle_results(asr_model: "ASRModel", result: str, outputs: List[str], name: str) -> BytesIO:
+    """Render a JSON transcript in several formats and pack them into one zip archive."""
+    parsed = json.loads(result)
+    archive = BytesIO()
+    with zipfile.ZipFile(archive, "w", compression=zipfile.ZIP_DEFLATED) as bundle:
+        for output in outputs:
+            if output == "json":
+                content = result
+            elif output in BINARY_FORMATS:
+                content = pack_transcript(parsed)
+            else:
+                rendered = StringIO()
+                asr_model.write_result(parsed, rendered, output)
+                content = rendered.getvalue()
+            bundle.writestr(f"{name}.{output}", content)
+    archive.seek(0)
+    return archive
+
+
+def render_outputs(asr_model: "ASRModel", result: str, outputs: List[str], name: str) -> Union[StringIO, BytesIO]:
+    """Render a JSON transcript in a single format, or as a zip archive when several formats are requested."""
+    if len(outputs) == 1:
+        return render_result(asr_model, result, outputs[0])
+    return bundle_results(asr_model, result, outputs, name)
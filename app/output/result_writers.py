@@ -1,16 +1,71 @@
-import json
 import os
-from dataclasses import asdict
-from typing import TextIO
+import re
+from dataclasses import fields, is_dataclass
+from typing import Any, Iterator, List, Optional, TextIO, Tuple
 
-from faster_whisper.utils import format_timestamp
+import orjson
+
+from app.output.segments import Segment, Word, to_segments
+
+# Languages whose aligned words are joined without spaces
+LANGUAGES_WITHOUT_SPACES = {"ja", "zh"}
+
+# Pause between words that starts a new subtitle when lines are wrapped
+SUBTITLE_PAUSE_SECONDS = 3.0
+
+
+def format_timestamp(seconds: float, always_include_hours: bool = False, decimal_marker: str = ".") -> str:
+    milliseconds = round(seconds * 1000.0) if seconds > 0 else 0
+    hours = milliseconds // 3_600_000
+    minutes = milliseconds // 60_000 % 60
+    seconds = milliseconds // 1_000 % 60
+    milliseconds %= 1_000
+    if always_include_hours or hours:
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}{decimal_marker}{milliseconds:03d}"
+    return f"{minutes:02d}:{seconds:02d}{decimal_marker}{milliseconds:03d}"
+
+
+def _to_builtin(value: Any):
+    """Fallback for values the JSON encoder does not know: engine dataclasses and numpy scalars or arrays."""
+    if is_dataclass(value) and not isinstance(value, type):
+        # Shallow, nested dataclasses come back through this hook, unlike asdict() which deep copies
+        return {field.name: getattr(value, field.name) for field in fields(value)}
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_json(value: Any) -> str:
+    """Serialize a result to compact JSON with non-ASCII characters unescaped."""
+    return orjson.dumps(value, default=_to_builtin, option=orjson.OPT_SERIALIZE_NUMPY).decode("utf-8")
+
+
+def _speaker_prefix(speaker: Optional[str]) -> str:
+    return "" if speaker is None else f"[{speaker}]: "
 
 
 class ResultWriter:
+    """
+    Renders a transcription result. The whole output is built as a list of strings and written with a
+    single call, segments can also be rendered one at a time for streaming.
+
+    The subtitle options only affect VTT and SRT: when both ``max_line_width`` and ``max_line_count`` are set,
+    or ``highlight_words`` is, and the segments carry word timestamps, cues are laid out from the words.
+    """
+
     extension: str
 
-    def __init__(self, output_dir: str):
+    def __init__(
+        self,
+        output_dir: str = "",
+        max_line_width: Optional[int] = None,
+        max_line_count: Optional[int] = None,
+        highlight_words: bool = False,
+    ):
         self.output_dir = output_dir
+        self.max_line_width = max_line_width
+        self.max_line_count = max_line_count
+        self.highlight_words = highlight_words
 
     def __call__(self, result: dict, audio_path: str):
         audio_basename = os.path.basename(audio_path)
@@ -20,45 +75,268 @@ class ResultWriter:
             self.write_result(result, file=f)
 
     def write_result(self, result: dict, file: TextIO):
+        file.write(self.render(result))
+
+    def render(self, result: dict) -> str:
+        parts = [self.header()]
+        for index, segment in enumerate(to_segments(result["segments"]), start=1):
+            parts.append(self.format_segment(segment, index))
+        return "".join(parts)
+
+    def header(self) -> str:
+        """What precedes the first segment."""
+        return ""
+
+    def render_segment(self, segment: Any, index: int) -> str:
+        """Render a single segment of any engine, ``index`` counts from 1."""
+        return self.format_segment(Segment.from_any(segment), index)
+
+    def format_segment(self, segment: Segment, index: int) -> str:
         raise NotImplementedError
 
+    def cue_layout(self, first: Segment, language: Optional[str]) -> Optional["_WordCueLayout"]:
+        """
+        The layout that builds cues from the words of the segments starting with ``first``, or None when every
+        segment is rendered with format_segment().
+        """
+        return None
+
+    def stream(self, language: Optional[str] = None) -> "SegmentStream":
+        """Render segments one at a time while they are decoded, see SegmentStream."""
+        return SegmentStream(self, language)
+
 
 class WriteTXT(ResultWriter):
     extension: str = "txt"
 
-    def write_result(self, result: dict, file: TextIO):
-        for segment in result["segments"]:
-            print(segment.text.strip(), file=file, flush=True)
+    def format_segment(self, segment: Segment, index: int) -> str:
+        return f"{_speaker_prefix(segment.speaker)}{segment.text.strip()}\n"
+
+
+class SubtitlesWriter(ResultWriter):
+    always_include_hours: bool
+    decimal_marker: str
+
+    def render(self, result: dict) -> str:
+        parts = [self.header()]
+        for index, (start, end, text) in enumerate(self.iterate_cues(result), start=1):
+            parts.append(self.format_cue(start, end, text, index))
+        return "".join(parts)
+
+    def format_segment(self, segment: Segment, index: int) -> str:
+        return self.format_cue(
+            self.format_timestamp(segment.start),
+            self.format_timestamp(segment.end),
+            self._segment_text(segment),
+            index,
+        )
+
+    def format_cue(self, start: str, end: str, text: str, index: int) -> str:
+        raise NotImplementedError
+
+    def format_timestamp(self, seconds: float) -> str:
+        return format_timestamp(seconds, self.always_include_hours, self.decimal_marker)
+
+    def iterate_cues(self, result: dict) -> Iterator[Tuple[str, str, str]]:
+        """Yield (start, end, text) for every cue, with formatted timestamps."""
+        segments = to_segments(result["segments"])
+        layout = self.cue_layout(segments[0], result.get("language")) if segments else None
+        if layout is not None:
+            for segment in segments:
+                yield from layout.add(segment)
+            yield from layout.flush()
+            return
+        for segment in segments:
+            yield self.format_timestamp(segment.start), self.format_timestamp(segment.end), self._segment_text(segment)
+
+    def cue_layout(self, first: Segment, language: Optional[str]) -> Optional["_WordCueLayout"]:
+        if first.words and (self.highlight_words or self._wraps_lines):
+            return _WordCueLayout(self, first, language)
+        return None
+
+    @property
+    def _wraps_lines(self) -> bool:
+        return self.max_line_width is not None and self.max_line_count is not None
+
+    @staticmethod
+    def _segment_text(segment: Segment) -> str:
+        return _speaker_prefix(segment.speaker) + segment.text.strip().replace("-->", "->")
 
+    def _cue(
+        self,
+        texts: List[str],
+        starts: List[Optional[float]],
+        ends: List[Optional[float]],
+        segment: Segment,
+        separator: str,
+    ) -> Iterator[Tuple[str, str, str]]:
+        prefix = _speaker_prefix(segment.speaker)
+        text = prefix + separator.join(texts)
+        timed_starts = [start for start in starts if start is not None]
+        timed_ends = [end for end in ends if end is not None]
+        if not timed_starts or not timed_ends:
+            # Nothing in this cue could be aligned, fall back to the segment timing
+            yield self.format_timestamp(segment.start), self.format_timestamp(segment.end), text
+            return
+        cue_start = self.format_timestamp(min(timed_starts))
+        if not self.highlight_words:
+            yield cue_start, self.format_timestamp(max(timed_ends)), text
+            return
 
-class WriteVTT(ResultWriter):
+        last = cue_start
+        for i, (word_start, word_end) in enumerate(zip(starts, ends, strict=True)):
+            if word_start is None or word_end is None:
+                continue
+            start = self.format_timestamp(word_start)
+            end = self.format_timestamp(word_end)
+            if last != start:
+                yield last, start, text
+            highlighted = texts[:i] + [re.sub(r"^(\s*)(.*)$", r"\1<u>\2</u>", texts[i])] + texts[i + 1 :]
+            yield start, end, prefix + separator.join(highlighted)
+            last = end
+
+
+class _WordCueLayout:
+    """
+    Lays out subtitle cues from word timestamps: lines hold up to max_line_width characters, cues up to max_line_count
+    lines, and a long pause starts a new cue. Without line wrapping every segment stays one cue.
+
+    Segments are added one at a time and a cue is yielded as soon as a later word closes it, so the layout also
+    works on segments that are still being decoded. flush() yields the last cue.
+    """
+
+    def __init__(self, writer: SubtitlesWriter, first: Segment, language: Optional[str]):
+        self.writer = writer
+        self.max_line_width = 1000 if writer.max_line_width is None else writer.max_line_width
+        self.max_line_count = writer.max_line_count
+        self.preserve_segments = not writer._wraps_lines
+        word = Word.from_any(first.words[0])
+        # Words either carry their leading space (whisper) or are joined with one (aligned words)
+        self.separator = "" if word.word[:1].isspace() or language in LANGUAGES_WITHOUT_SPACES else " "
+
+        self.line_len = 0
+        self.line_count = 1
+        # The words of the cue being built, kept as parallel lists so they can be joined and reduced in bulk
+        self.texts: List[str] = []
+        self.starts: List[Optional[float]] = []
+        self.ends: List[Optional[float]] = []
+        self.cue_segment = first
+        self.last = first.start
+
+    def add(self, segment: Segment) -> Iterator[Tuple[str, str, str]]:
+        # The word loop works on locals, the state is stored back once the segment is laid out
+        max_line_width, max_line_count, preserve_segments = (
+            self.max_line_width,
+            self.max_line_count,
+            self.preserve_segments,
+        )
+        line_len, line_count, last, cue_segment = self.line_len, self.line_count, self.last, self.cue_segment
+        texts, starts, ends = self.texts, self.starts, self.ends
+        for i, word in enumerate(segment.words or ()):
+            if type(word) is dict:
+                # JSON-loaded results, the common case, skip the conversion call
+                text, start, end = word.get("word", ""), word.get("start"), word.get("end")
+            else:
+                text, start, end = Word.from_any(word)
+            long_pause = not preserve_segments and start is not None and start - last > SUBTITLE_PAUSE_SECONDS
+            has_room = line_len + len(text) <= max_line_width
+            seg_break = i == 0 and len(texts) > 0 and preserve_segments
+            if line_len > 0 and has_room and not long_pause and not seg_break:
+                # line continuation
+                line_len += len(text)
+            else:
+                # new line
+                text = text.strip()
+                cue_full = max_line_count is not None and (long_pause or line_count >= max_line_count)
+                if (len(texts) > 0 and cue_full) or seg_break:
+                    # cue break
+                    yield from self.writer._cue(texts, starts, ends, cue_segment, self.separator)
+                    texts, starts, ends = [], [], []
+                    line_count = 1
+                elif line_len > 0:
+                    # line break
+                    line_count += 1
+                    text = "\n" + text
+                line_len = len(text.strip())
+            if not texts:
+                cue_segment = segment
+            texts.append(text)
+            starts.append(start)
+            ends.append(end)
+            if start is not None:
+                last = start
+        self.line_len, self.line_count, self.last, self.cue_segment = line_len, line_count, last, cue_segment
+        self.texts, self.starts, self.ends = texts, starts, ends
+
+    def flush(self) -> Iterator[Tuple[str, str, str]]:
+        if self.texts:
+            yield from self.writer._cue(self.texts, self.starts, self.ends, self.cue_segment, self.separator)
+            self.texts, self.starts, self.ends = [], [], []
+
+
+class SegmentStream:
+    """
+    Renders a result one segment at a time while it is decoded. add() returns the text that is final once the
+    segment is known and finish() the rest, together they give the same text as ResultWriter.render() of a result
+    with these segments, except for JSON where every segment is rendered on its own.
+    """
+
+    def __init__(self, writer: ResultWriter, language: Optional[str] = None):
+        self.writer = writer
+        self.language = language
+        self.started = False
+        self.layout: Optional[_WordCueLayout] = None
+        self.index = 0
+
+    def add(self, segment: Any) -> str:
+        content = self._start(segment)
+        if self.layout is not None:
+            return content + self._cues(self.layout.add(Segment.from_any(segment)))
+        self.index += 1
+        return content + self.writer.render_segment(segment, self.index)
+
+    def finish(self) -> str:
+        # When nothing was decoded the header alone still makes a valid empty file
+        content = self._start(None)
+        if self.layout is not None:
+            content += self._cues(self.layout.flush())
+        return content
+
+    def _start(self, first: Any) -> str:
+        if self.started:
+            return ""
+        self.started = True
+        if first is not None:
+            self.layout = self.writer.cue_layout(Segment.from_any(first), self.language)
+        return self.writer.header()
+
+    def _cues(self, cues: Iterator[Tuple[str, str, str]]) -> str:
+        parts = []
+        for start, end, text in cues:
+            self.index += 1
+            parts.append(self.writer.format_cue(start, end, text, self.index))
+        return "".join(parts)
+
+
+class WriteVTT(SubtitlesWriter):
     extension: str = "vtt"
+    always_include_hours: bool = False
+    decimal_marker: str = "."
 
-    def write_result(self, result: dict, file: TextIO):
-        print("WEBVTT\n", file=file)
-        for segment in result["segments"]:
-            print(
-                f"{format_timestamp(segment.start)} --> {format_timestamp(segment.end)}\n"
-                f"{segment.text.strip().replace('-->', '->')}\n",
-                file=file,
-                flush=True,
-            )
+    def header(self) -> str:
+        return "WEBVTT\n\n"
+
+    def format_cue(self, start: str, end: str, text: str, index: int) -> str:
+        return f"{start} --> {end}\n{text}\n\n"
 
 
-class WriteSRT(ResultWriter):
+class WriteSRT(SubtitlesWriter):
     extension: str = "srt"
+    always_include_hours: bool = True
+    decimal_marker: str = ","
 
-    def write_result(self, result: dict, file: TextIO):
-        for i, segment in enumerate(result["segments"], start=1):
-            # write srt lines
-            print(
-                f"{i}\n"
-                f"{format_timestamp(segment.start, always_include_hours=True, decimal_marker=',')} --> "
-                f"{format_timestamp(segment.end, always_include_hours=True, decimal_marker=',')}\n"
-                f"{segment.text.strip().replace('-->', '->')}\n",
-                file=file,
-                flush=True,
-            )
+    def format_cue(self, start: str, end: str, text: str, index: int) -> str:
+        return f"{index}\n{start} --> {end}\n{text}\n\n"
 
 
 class WriteTSV(ResultWriter):
@@ -73,18 +351,31 @@ class WriteTSV(ResultWriter):
 
     extension: str = "tsv"
 
-    def write_result(self, result: dict, file: TextIO):
-        print("start", "end", "text", sep="\t", file=file)
-        for segment in result["segments"]:
-            print(round(1000 * segment.start), file=file, end="\t")
-            print(round(1000 * segment.end), file=file, end="\t")
-            print(segment.text.strip().replace("\t", " "), file=file, flush=True)
+    def header(self) -> str:
+        return "start\tend\ttext\n"
+
+    def format_segment(self, segment: Segment, index: int) -> str:
+        text = segment.text.strip().replace("\t", " ")
+        return f"{round(1000 * segment.start)}\t{round(1000 * segment.end)}\t{text}\n"
 
 
 class WriteJSON(ResultWriter):
     extension: str = "json"
 
-    def write_result(self, result: dict, file: TextIO):
-        if "segments" in result:
-            result["segments"] = [asdict(segment) for segment in result["segments"]]
-        json.dump(result, file)
+    def render(self, result: dict) -> str:
+        # Engine segment objects are serialized by the encoder directly, the result itself is not modified
+        return dumps_json(result)
+
+    def render_segment(self, segment: Any, index: int) -> str:
+        return dumps_json(segment)
+
+    def format_segment(self, segment: Segment, index: int) -> str:
+        return dumps_json(segment._asdict())
+
+
+WRITERS = {writer.extension: writer for writer in (WriteTXT, WriteVTT, WriteSRT, WriteTSV, WriteJSON)}
+
+
+def get_writer(output: Optional[str], **options) -> ResultWriter:
+    """Return the writer for an output format, plain text for unknown formats."""
+    return WRITERS.get(output, WriteTXT)("", **options)
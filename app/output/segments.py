@@ -0,0 +1,54 @@
+from typing import Any, List, NamedTuple, Optional, Sequence
+
+# Builds a named tuple from a complete tuple of fields, skipping the argument handling of its constructor
+_new = tuple.__new__
+
+
+class Word(NamedTuple):
+    word: str
+    start: Optional[float]
+    end: Optional[float]
+
+    @classmethod
+    def from_any(cls, word: Any) -> "Word":
+        """Read a word from a dict or an engine's word object. Unaligned words keep None timestamps."""
+        if isinstance(word, dict):
+            return _new(cls, (word.get("word", ""), word.get("start"), word.get("end")))
+        if isinstance(word, Word):
+            return word
+        return _new(cls, (getattr(word, "word", ""), getattr(word, "start", None), getattr(word, "end", None)))
+
+
+class Segment(NamedTuple):
+    """
+    The fields the result writers need from a segment, whatever engine produced it.
+    Built once per segment, words are only converted when subtitles are laid out from them.
+    """
+
+    start: float
+    end: float
+    text: str
+    speaker: Optional[str] = None
+    words: Optional[Sequence[Any]] = None
+
+    @classmethod
+    def from_any(cls, segment: Any) -> "Segment":
+        """Read a segment from a (JSON-loaded) dict, a faster_whisper segment object or a Segment."""
+        if isinstance(segment, dict):
+            get = segment.get
+            start, end, text, speaker, words = get("start"), get("end"), get("text"), get("speaker"), get("words")
+        elif isinstance(segment, Segment):
+            return segment
+        else:
+            start = getattr(segment, "start", None)
+            end = getattr(segment, "end", None)
+            text = getattr(segment, "text", None)
+            speaker = getattr(segment, "speaker", None)
+            words = getattr(segment, "words", None)
+        # Pipelines may leave the end of the last chunk open
+        start = start or 0.0
+        return _new(cls, (start, start if end is None else end, text or "", speaker, words))
+
+
+def to_segments(segments: Sequence[Any]) -> List[Segment]:
+    return [Segment.from_any(segment) for segment in segments]
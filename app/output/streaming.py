@@ -0,0 +1,57 @@
+from typing import Optional, Union
+
+from app.output.result_writers import dumps_json, get_writer
+
+STREAM_FORMATS = ["ndjson", "sse"]
+
+
+class SegmentEventEncoder:
+    """
+    Encodes transcript segments as NDJSON lines or server-sent events while they are decoded.
+
+    Every ``segment`` event carries the segment timing and text together with ``content``, the part of the
+    requested output format that is final once the segment is known. Subtitles laid out from word timestamps
+    can span segments, so a cue arrives with the segment that closes it. Concatenating the ``content`` of all
+    events, including the final ``done`` event, gives the same file as a regular request for that format when
+    ``writer_options`` are those of the engine, except for JSON where every event holds one segment.
+    """
+
+    def __init__(
+        self,
+        stream: str,
+        output: Union[str, None],
+        writer_options: Optional[dict] = None,
+        language: Union[str, None] = None,
+    ):
+        self.stream = stream
+        self.segments = get_writer(output, **(writer_options or {})).stream(language)
+        self.index = 0
+
+    @property
+    def media_type(self) -> str:
+        return "text/event-stream" if self.stream == "sse" else "application/x-ndjson"
+
+    def segment(self, segment: dict) -> str:
+        self.index += 1
+        content = self.segments.add(segment)
+        return self._event(
+            "segment",
+            {
+                "index": self.index,
+                "start": segment.get("start"),
+                "end": segment.get("end"),
+                "text": segment.get("text", ""),
+                "content": content,
+            },
+        )
+
+    def done(self) -> str:
+        return self._event("done", {"segments": self.index, "content": self.segments.finish()})
+
+    def error(self, message: str) -> str:
+        return self._event("error", {"message": message})
+
+    def _event(self, kind: str, payload: dict) -> str:
+        if self.stream == "sse":
+            return f"event: {kind}\ndata: {dumps_json(payload)}\n\n"
+        return dumps_json({"type": kind, **payload}) + "\n"
@@ -1,3 +1,5 @@
 from .asr_service import ASRService
+from .inference_executor import InferenceExecutor
+from .job_service import JobService
 
-__all__ = ["ASRService"]
+__all__ = ["ASRService", "InferenceExecutor", "JobService"]
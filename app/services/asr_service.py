@@ -1,20 +1,53 @@
-from typing import Union
-from urllib.parse import quote
+import asyncio
+import json
+import os
+from contextlib import AsyncExitStack, aclosing, asynccontextmanager
+from threading import Event
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar, Union
 
-from fastapi import UploadFile
+from fastapi import Request, UploadFile
 from fastapi.responses import StreamingResponse
 
 from app.asr_models.asr_model import ASRModel
+from app.audio import SpooledAudio
+from app.cache import ResultCache
 from app.config import CONFIG
-from app.exceptions import AudioLoadError, TranscriptionError
+from app.exceptions import (
+    AudioLoadError,
+    InvalidTranscriptError,
+    TranscriptionCancelledError,
+    TranscriptionError,
+    UnsupportedModelError,
+)
+from app.languages import LANGUAGES
+from app.output import BINARY_FORMATS, SegmentEventEncoder, normalize_outputs, render_outputs
+from app.services.inference_executor import LANE_BATCH, InferenceExecutor
+from app.services.responses import ReleasingStreamingResponse, accept_encoding, transcript_response
 from app.utils import load_audio
 
+# How often an in-flight request checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = 0.5
+# Length of the head of a spooled recording used for language detection
+LANGUAGE_DETECTION_SECONDS = 30
+
+T = TypeVar("T")
+
 
 class ASRService:
     """Service class for ASR operations with dependency injection."""
 
-    def __init__(self, asr_model: ASRModel):
+    def __init__(
+        self,
+        asr_model: ASRModel,
+        executor: Optional[InferenceExecutor] = None,
+        cache: Optional[ResultCache] = None,
+    ):
         self.asr_model = asr_model
+        self.executor = executor or InferenceExecutor()
+        # Without a cache every request runs the model
+        self.cache = cache if cache is not None and cache.enabled else None
+        # Cache keys being transcribed right now, identical requests wait for the first one
+        self._inflight: Dict[str, asyncio.Future] = {}
 
     async def transcribe_audio(
         self,
@@ -27,77 +60,348 @@ class ASRService:
         diarize: bool = False,
         min_speakers: Union[int, None] = None,
         max_speakers: Union[int, None] = None,
-        output: Union[str, None] = "txt",
+        output: Union[str, List[str], None] = "txt",
         encode: bool = True,
+        request: Optional[Request] = None,
+        stream: Union[str, None] = None,
+        model: Union[str, None] = None,
     ) -> StreamingResponse:
-        """Transcribe audio file and return streaming response."""
-        try:
-            # Load and process audio
-            audio_data = load_audio(audio_file.file, encode)
-
-            # Prepare options for diarization
+        """
+        Transcribe audio file and return streaming response.
+        With several output formats the model runs once and the renderings are returned as a zip archive.
+        With ``stream`` set to ndjson or sse, segments are sent as events while they are decoded.
+        ``model`` selects one of the configured models, None the default.
+        Raises ServiceOverloadedError when too many requests are already pending, UnsupportedModelError for
+        a model that is not configured, and TranscriptionCancelledError when the client of ``request``
+        disconnects before the result is ready.
+        """
+        if stream:
+            cancel_event = Event()
             options = {
                 "diarize": diarize,
                 "min_speakers": min_speakers,
                 "max_speakers": max_speakers,
+                "cancel_event": cancel_event,
             }
+            args = (task, language, initial_prompt, vad_filter, word_timestamps, options)
+            return await self._stream_transcription(audio_file, encode, args, cancel_event, stream, output, model)
 
-            # Perform transcription
-            result = self.asr_model.transcribe(
-                audio_data,
-                task,
-                language,
-                initial_prompt,
-                vad_filter,
-                word_timestamps,
-                options,
-                output,
-            )
-
-            # Ensure we have a valid result
-            if result is None:
-                raise TranscriptionError("Transcription returned no result")
-
+        async with self.executor.admit(LANE_BATCH), self._selected_model(model) as asr_model:
+            cancel_event = Event()
+            outputs = normalize_outputs(output)
             filename = audio_file.filename or "audio"
-            output_ext = output or "txt"
+            try:
+                # Prepare options for diarization, the cancel event lets the engine stop between segments
+                options = {
+                    "diarize": diarize,
+                    "min_speakers": min_speakers,
+                    "max_speakers": max_speakers,
+                    "cancel_event": cancel_event,
+                }
 
-            return StreamingResponse(
-                result,
-                media_type="text/plain",
-                headers={
-                    "Asr-Engine": CONFIG.ASR_ENGINE,
-                    "Content-Disposition": f'attachment; filename="{quote(filename)}.{output_ext}"',
-                },
-            )
+                result = await self._until_disconnected(
+                    request,
+                    cancel_event,
+                    self._decode_and_transcribe(
+                        asr_model,
+                        audio_file,
+                        encode,
+                        task,
+                        language,
+                        initial_prompt,
+                        vad_filter,
+                        word_timestamps,
+                        options,
+                        outputs,
+                        filename,
+                    ),
+                )
 
-        except Exception as e:
-            raise TranscriptionError(f"Transcription failed: {str(e)}") from e
+                # Ensure we have a valid result
+                if result is None:
+                    raise TranscriptionError("Transcription returned no result")
+
+                return transcript_response(result, filename, outputs, accept_encoding(request))
+
+            except TranscriptionCancelledError:
+                raise
+            except Exception as e:
+                raise TranscriptionError(f"Transcription failed: {str(e)}") from e
 
     async def detect_language(
         self,
         audio_file: UploadFile,
         encode: bool = True,
+        request: Optional[Request] = None,
+        model: Union[str, None] = None,
     ) -> dict:
-        """Detect language of audio file."""
+        """Detect language of audio file with the selected model."""
+        async with self.executor.admit(LANE_BATCH), self._selected_model(model) as asr_model:
+            try:
+                result = await self._until_disconnected(
+                    request, Event(), self._decode_and_run(audio_file, encode, asr_model.language_detection)
+                )
+
+                # Handle different return types from different ASR engines
+                if isinstance(result, tuple) and len(result) == 2:
+                    detected_lang_code, confidence = result
+                else:
+                    # Fallback for engines that don't return confidence
+                    detected_lang_code = str(result) if result is not None else "en"
+                    confidence = 1.0
+
+                return {
+                    "detected_language": LANGUAGES.get(detected_lang_code, "Unknown"),
+                    "language_code": detected_lang_code,
+                    "confidence": confidence,
+                }
+
+            except TranscriptionCancelledError:
+                raise
+            except Exception as e:
+                raise AudioLoadError(f"Language detection failed: {str(e)}") from e
+
+    async def convert_transcript(
+        self,
+        transcript: UploadFile,
+        output: Union[str, List[str], None] = "txt",
+        request: Optional[Request] = None,
+    ) -> StreamingResponse:
+        """
+        Render a JSON transcript from /asr or a job in other formats without running the model.
+        Raises InvalidTranscriptError when the upload is not such a transcript.
+        """
+        outputs = normalize_outputs(output)
+        content = await self.executor.run(transcript.file.read)
         try:
-            audio_data = load_audio(audio_file.file, encode)
-            result = self.asr_model.language_detection(audio_data)
-
-            # Handle different return types from different ASR engines
-            if isinstance(result, tuple) and len(result) == 2:
-                detected_lang_code, confidence = result
-            else:
-                # Fallback for engines that don't return confidence
-                detected_lang_code = str(result) if result is not None else "en"
-                confidence = 1.0
-
-            from whisper import tokenizer
-
-            return {
-                "detected_language": tokenizer.LANGUAGES.get(detected_lang_code, "Unknown"),
-                "language_code": detected_lang_code,
-                "confidence": confidence,
-            }
+            result = content.decode("utf-8")
+            parsed = json.loads(result)
+        except ValueError as e:
+            raise InvalidTranscriptError(f"Transcript is not valid JSON: {e}") from e
+        if not isinstance(parsed, dict) or not isinstance(parsed.get("segments"), list):
+            raise InvalidTranscriptError("Transcript has no segments list")
+
+        name = os.path.splitext(transcript.filename or "transcript.json")[0]
+        rendered = await self.executor.run(render_outputs, self.asr_model, result, outputs, name)
+        return transcript_response(rendered, name, outputs, accept_encoding(request))
+
+    async def _stream_transcription(
+        self,
+        audio_file: UploadFile,
+        encode: bool,
+        args: tuple,
+        cancel_event: Event,
+        stream: str,
+        output: Union[str, List[str], None],
+        model: Union[str, None],
+    ) -> StreamingResponse:
+        """
+        Decode the upload, then return a response that streams segment events from the engine.
+        The admission slot is held until the stream ends; a client that stops reading cancels the engine.
+        """
+        resources = AsyncExitStack()
+        await resources.enter_async_context(self.executor.admit(LANE_BATCH))
+        try:
+            asr_model = await resources.enter_async_context(self._selected_model(model))
+            audio_data = await self.executor.run(load_audio, audio_file.file, encode)
+        except UnsupportedModelError:
+            await resources.aclose()
+            raise
+        except Exception as e:
+            await resources.aclose()
+            raise TranscriptionError(f"Transcription failed: {str(e)}") from e
+        if isinstance(audio_data, SpooledAudio):
+            resources.callback(audio_data.close)
+
+        # Callbacks run last in, first out: stop the engine before the slot is released
+        resources.callback(cancel_event.set)
 
+        # Render with the engine's subtitle options, like render_outputs() does for a regular request
+        encoder = SegmentEventEncoder(stream, normalize_outputs(output)[0], asr_model.writer_options, args[1])
+
+        return ReleasingStreamingResponse(
+            self._segment_events(asr_model, encoder, audio_data, args, cancel_event),
+            on_close=resources.aclose,
+            media_type=encoder.media_type,
+            headers={"Asr-Engine": CONFIG.ASR_ENGINE, "Cache-Control": "no-cache"},
+        )
+
+    @asynccontextmanager
+    async def _selected_model(self, model: Union[str, None]) -> AsyncIterator[ASRModel]:
+        """
+        The model serving ``model``, loaded if it is not loaded yet. It is pinned before it is selected and
+        until the block ends, so other requests cannot unload it in between.
+        """
+        model_name = self.asr_model.pin(model)
+        try:
+            yield await self.executor.run(self.asr_model.select, model_name)
+        finally:
+            self.asr_model.unpin(model_name)
+
+    async def _segment_events(
+        self, asr_model: ASRModel, encoder: SegmentEventEncoder, audio_data, args: tuple, cancel_event: Event
+    ) -> AsyncIterator[str]:
+        """Encode the segments of a transcription as they arrive, a failure ends the stream with an error event."""
+        try:
+            # Close the segment iterator explicitly when the client stops reading, so the engine is cancelled now
+            async with aclosing(self._iter_segments(asr_model, audio_data, args, cancel_event)) as segments:
+                async for segment in segments:
+                    yield encoder.segment(segment)
         except Exception as e:
-            raise AudioLoadError(f"Language detection failed: {str(e)}") from e
+            yield encoder.error(f"Transcription failed: {str(e)}")
+            return
+        yield encoder.done()
+
+    async def _iter_segments(
+        self, asr_model: ASRModel, audio_data, args: tuple, cancel_event: Event
+    ) -> AsyncIterator[dict]:
+        """Run the engine's segment generator on one worker and hand each segment to the event loop."""
+        loop = asyncio.get_running_loop()
+        segments: asyncio.Queue = asyncio.Queue()
+        finished = object()
+
+        def produce():
+            for segment in asr_model.transcribe_stream(audio_data, *args):
+                loop.call_soon_threadsafe(segments.put_nowait, segment)
+
+        work = asyncio.ensure_future(self.executor.run(produce))
+        work.add_done_callback(lambda _: segments.put_nowait(finished))
+        try:
+            while True:
+                segment = await segments.get()
+                if segment is finished:
+                    break
+                yield segment
+            # Raises the engine error, if any
+            await work
+        finally:
+            if not work.done():
+                # The client went away, set the cancel event so the engine stops at the next segment
+                cancel_event.set()
+                work.cancel()
+
+    async def _decode_and_transcribe(
+        self,
+        asr_model: ASRModel,
+        audio_file: UploadFile,
+        encode: bool,
+        task: Union[str, None],
+        language: Union[str, None],
+        initial_prompt: Union[str, None],
+        vad_filter: bool,
+        word_timestamps: bool,
+        options: dict,
+        outputs: List[str],
+        name: str,
+    ):
+        """
+        Decode the upload on the worker pool and transcribe it. With a cache or several output formats,
+        the engine produces JSON once, which is looked up or stored under the hash of the decoded audio
+        and the parameters, then rendered in the requested formats.
+        """
+        audio_data = await self.executor.run(load_audio, audio_file.file, encode)
+        args = (asr_model, audio_data, task, language, initial_prompt, vad_filter, word_timestamps, options)
+        try:
+            if self.cache is None:
+                # Binary formats are packed from the JSON result, engines only write text
+                if len(outputs) == 1 and outputs[0] not in BINARY_FORMATS:
+                    return await self.executor.run(self._transcribe, *args, outputs[0])
+                result = (await self.executor.run(self._transcribe, *args, "json")).getvalue()
+                return await self.executor.run(render_outputs, asr_model, result, outputs, name)
+
+            params = {
+                "model": asr_model.model_name,
+                "task": task,
+                "language": language,
+                "initial_prompt": initial_prompt,
+                "vad_filter": vad_filter,
+                "word_timestamps": word_timestamps,
+                "diarize": options.get("diarize"),
+                "min_speakers": options.get("min_speakers"),
+                "max_speakers": options.get("max_speakers"),
+            }
+            key = await self.executor.run(self.cache.key, audio_data, params)
+            result = await self._single_flight(key, lambda: self.executor.run(self._transcribe_cached, key, *args))
+            return await self.executor.run(render_outputs, asr_model, result, outputs, name)
+        finally:
+            if isinstance(audio_data, SpooledAudio):
+                audio_data.close()
+
+    @staticmethod
+    def _transcribe(asr_model: ASRModel, audio_data, *args):
+        """Run the engine, window by window when the audio was spooled."""
+        if isinstance(audio_data, SpooledAudio):
+            return asr_model.transcribe_windowed(audio_data, *args)
+        return asr_model.transcribe(audio_data, *args)
+
+    def _transcribe_cached(self, key: str, asr_model: ASRModel, audio_data, *args) -> str:
+        result = self.cache.get(key)
+        if result is None:
+            result = self._transcribe(asr_model, audio_data, *args, "json").getvalue()
+            self.cache.put(key, result)
+        return result
+
+    async def _single_flight(self, key: str, produce: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run ``produce`` once per key at a time. Concurrent callers with the same key await the running
+        call; if its client disconnects, one of them takes over instead of failing.
+        """
+        while key in self._inflight:
+            try:
+                return await asyncio.shield(self._inflight[key])
+            except TranscriptionCancelledError:
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await produce()
+        except BaseException as e:
+            error = e if isinstance(e, Exception) else TranscriptionCancelledError("Transcription was cancelled")
+            future.set_exception(error)
+            # Mark the exception as retrieved, nobody may be waiting for it
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
+
+    async def _decode_and_run(self, audio_file: UploadFile, encode: bool, func, *args):
+        """Decode the upload and pass the audio to ``func`` on the worker pool, ffmpeg decoding is blocking."""
+        audio_data = await self.executor.run(load_audio, audio_file.file, encode)
+        if isinstance(audio_data, SpooledAudio):
+            # Language detection only looks at the first 30 seconds
+            with audio_data:
+                audio_data = audio_data.window(0, LANGUAGE_DETECTION_SECONDS * audio_data.sample_rate)
+        return await self.executor.run(func, audio_data, *args)
+
+    async def _until_disconnected(self, request: Optional[Request], cancel_event: Event, work: Awaitable[T]) -> T:
+        """
+        Await ``work`` while watching the client connection. On disconnect, calls still queued on the
+        executor are dropped and ``cancel_event`` tells a running engine to stop at the next segment.
+        """
+        if request is None:
+            return await work
+
+        work_task = asyncio.ensure_future(work)
+        watcher = asyncio.ensure_future(self._wait_for_disconnect(request))
+        abandoned = True
+        try:
+            await asyncio.wait({work_task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            abandoned = not work_task.done()
+        finally:
+            watcher.cancel()
+            if abandoned:
+                cancel_event.set()
+                work_task.cancel()
+
+        if abandoned:
+            raise TranscriptionCancelledError("Client disconnected before the transcription finished")
+        return work_task.result()
+
+    @staticmethod
+    async def _wait_for_disconnect(request: Request):
+        while not await request.is_disconnected():
+            await asyncio.sleep(DISCONNECT_POLL_SECONDS)
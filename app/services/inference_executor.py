@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from functools import partial
+from threading import Condition, Thread
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Tuple
+
+from app.asr_models.priority_lock import PRIORITY_BATCH, PRIORITY_LIVE, call_priority
+from app.config import CONFIG
+from app.exceptions import ServiceOverloadedError
+
+logger = logging.getLogger(__name__)
+
+LANE_LIVE = "live"
+LANE_BATCH = "batch"
+
+_LANE_PRIORITY = {LANE_LIVE: PRIORITY_LIVE, LANE_BATCH: PRIORITY_BATCH}
+
+_Task = Tuple[Future, Callable[[], Any]]
+
+
+class InferenceExecutor:
+    """
+    Runs blocking audio decoding and model inference on a bounded worker pool so the
+    event loop stays free to accept requests and serve WebSocket traffic.
+
+    Work is queued in two lanes. Live chunks are served ahead of batch uploads, but after
+    ``live_weight`` consecutive live tasks a waiting batch task gets the next worker so
+    uploads are not starved. The same order applies where a task waits for a model: the model
+    locks and replica leases hand the model to a waiting live task first, so live chunks also
+    overtake uploads that already hold a worker. Batch tasks never take the last free worker, so a live chunk
+    finds a worker even while every other one is blocked waiting for a model. Requests are admitted per lane up to
+    a fixed limit; beyond it ``admit`` raises ServiceOverloadedError with a Retry-After estimate.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = CONFIG.INFERENCE_WORKERS,
+        max_pending: int = CONFIG.MAX_PENDING_REQUESTS,
+        live_max_pending: int = CONFIG.LIVE_MAX_PENDING_CHUNKS,
+        live_weight: int = CONFIG.LIVE_LANE_WEIGHT,
+    ):
+        self.max_workers = max_workers
+        self.live_weight = max(1, live_weight)
+        self._limits = {LANE_LIVE: live_max_pending, LANE_BATCH: max_pending}
+        self._lanes: Dict[str, Deque[_Task]] = {LANE_LIVE: deque(), LANE_BATCH: deque()}
+        self._admitted = {LANE_LIVE: 0, LANE_BATCH: 0}
+        self._rejected = {LANE_LIVE: 0, LANE_BATCH: 0}
+        # Exponentially weighted task duration, used to estimate Retry-After
+        self._avg_task_seconds = 1.0
+        self._running = 0
+        self._running_batch = 0
+        # One worker is kept for the live lane, unless there is only one
+        self._batch_workers = max(1, max_workers - 1)
+        self._live_streak = 0
+        self._shutdown = False
+        self._condition = Condition()
+        self._threads: List[Thread] = []
+        for index in range(max_workers):
+            thread = Thread(target=self._work, name=f"asr-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of submitted calls that are waiting for a free worker."""
+        return sum(len(lane) for lane in self._lanes.values())
+
+    def stats(self) -> dict:
+        """Return a snapshot of the pool utilisation and admission counters."""
+        with self._condition:
+            return {
+                "workers": self.max_workers,
+                "running": self._running,
+                "queued": self.queue_depth,
+                "lanes": {
+                    lane: {
+                        "queued": len(self._lanes[lane]),
+                        "admitted": self._admitted[lane],
+                        "limit": self._limits[lane],
+                        "rejected": self._rejected[lane],
+                    }
+                    for lane in self._lanes
+                },
+            }
+
+    @asynccontextmanager
+    async def admit(self, lane: str = LANE_BATCH) -> AsyncIterator[None]:
+        """
+        Reserve a slot for one request in the given lane for the duration of the block.
+        A limit of 0 or less admits everything.
+        """
+        with self._condition:
+            limit = self._limits[lane]
+            if 0 < limit <= self._admitted[lane]:
+                self._rejected[lane] += 1
+                raise ServiceOverloadedError(
+                    f"Too many pending {lane} requests, try again later", retry_after=self._retry_after(lane)
+                )
+            self._admitted[lane] += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._admitted[lane] -= 1
+
+    async def run(self, func: Callable[..., Any], *args, lane: str = LANE_BATCH, **kwargs) -> Any:
+        """Run ``func(*args, **kwargs)`` on a worker thread and await its result."""
+        future: Future = Future()
+        task = (future, partial(func, *args, **kwargs))
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("Inference executor is shut down")
+            self._lanes[lane].append(task)
+            self._condition.notify()
+        logger.debug(f"Submitting {getattr(func, '__name__', func)} to {lane} lane, queue depth: {self.queue_depth}")
+
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Drop the call if it never reached a worker
+            with self._condition:
+                if task in self._lanes[lane]:
+                    self._lanes[lane].remove(task)
+                    future.cancel()
+            raise
+
+    def _batch_ready(self) -> bool:
+        return bool(self._lanes[LANE_BATCH]) and self._running_batch < self._batch_workers
+
+    def _next_task(self) -> Tuple[str, _Task]:
+        live = self._lanes[LANE_LIVE]
+        if live and (not self._batch_ready() or self._live_streak < self.live_weight):
+            self._live_streak += 1
+            return LANE_LIVE, live.popleft()
+        self._live_streak = 0
+        self._running_batch += 1
+        return LANE_BATCH, self._lanes[LANE_BATCH].popleft()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._lanes[LANE_LIVE] and not self._batch_ready():
+                    if self._shutdown and not self.queue_depth:
+                        return
+                    self._condition.wait()
+                lane, (future, call) = self._next_task()
+                self._running += 1
+
+            if not future.set_running_or_notify_cancel():
+                with self._condition:
+                    self._finished(lane)
+                continue
+
+            started = time.monotonic()
+            result, error = None, None
+            try:
+                with call_priority(_LANE_PRIORITY[lane]):
+                    result = call()
+            except BaseException as e:
+                error = e
+
+            # Update the counters before waking the caller so its view of stats() is consistent
+            with self._condition:
+                self._finished(lane)
+                self._avg_task_seconds = 0.8 * self._avg_task_seconds + 0.2 * (time.monotonic() - started)
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _finished(self, lane: str):
+        self._running -= 1
+        if lane == LANE_BATCH:
+            self._running_batch -= 1
+            # A queued batch task may have been waiting for this worker
+            self._condition.notify()
+
+    def _retry_after(self, lane: str) -> int:
+        """Estimate how many seconds the admitted backlog of a lane needs to drain."""
+        backlog = self._admitted[lane] + (len(self._lanes[LANE_LIVE]) if lane == LANE_BATCH else 0)
+        return max(1, math.ceil(backlog * self._avg_task_seconds / max(1, self.max_workers)))
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting work, cancel queued calls and release the worker threads."""
+        with self._condition:
+            self._shutdown = True
+            for lane in self._lanes.values():
+                while lane:
+                    future, _ = lane.popleft()
+                    future.cancel()
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
@@ -0,0 +1,93 @@
+import shutil
+from typing import BinaryIO, List, Optional, Union
+
+from fastapi import Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from app.asr_models.asr_model import ASRModel
+from app.exceptions import JobNotFoundError, JobNotReadyError
+from app.jobs import Job, JobStore, JobWorker
+from app.jobs.job_store import JOB_COMPLETED
+from app.output import normalize_outputs, render_outputs
+from app.services.responses import accept_encoding, transcript_response
+
+
+class JobService:
+    """
+    Service class for asynchronous transcription jobs.
+
+    Spooling, job store access and rendering run on the regular thread pool rather than the inference
+    executor, so submitting and polling jobs never waits behind transcriptions.
+    """
+
+    def __init__(self, store: JobStore, worker: JobWorker, asr_model: ASRModel):
+        self.store = store
+        self.worker = worker
+        self.asr_model = asr_model
+
+    async def submit(
+        self,
+        audio_file: UploadFile,
+        task: Union[str, None] = "transcribe",
+        language: Union[str, None] = None,
+        initial_prompt: Union[str, None] = None,
+        vad_filter: bool = False,
+        word_timestamps: bool = False,
+        diarize: bool = False,
+        min_speakers: Union[int, None] = None,
+        max_speakers: Union[int, None] = None,
+        encode: bool = True,
+        model: Union[str, None] = None,
+    ) -> dict:
+        """
+        Spool the upload to disk and queue a transcription job for it.
+        ``model`` is checked now and loaded when the job runs; UnsupportedModelError if it is not configured.
+        """
+        model = self.asr_model.resolve_model_name(model)
+        job_id = self.store.new_job_id()
+        await run_in_threadpool(self._spool, audio_file.file, self.store.audio_path(job_id))
+
+        params = {
+            "model": model,
+            "task": task,
+            "language": language,
+            "initial_prompt": initial_prompt,
+            "vad_filter": vad_filter,
+            "word_timestamps": word_timestamps,
+            "diarize": diarize,
+            "min_speakers": min_speakers,
+            "max_speakers": max_speakers,
+            "encode": encode,
+        }
+        job = await run_in_threadpool(self.store.create, job_id, audio_file.filename, params)
+        self.worker.notify()
+        return job.to_status()
+
+    async def get_status(self, job_id: str) -> dict:
+        """Return the status and progress of a job."""
+        return (await self._get_job(job_id)).to_status()
+
+    async def get_result(
+        self, job_id: str, output: Union[str, List[str], None] = "txt", request: Optional[Request] = None
+    ) -> StreamingResponse:
+        """Return the result of a completed job in the requested output format, or a zip of several formats."""
+        job = await self._get_job(job_id)
+        if job.status != JOB_COMPLETED:
+            raise JobNotReadyError(f"Job {job_id} is {job.status}")
+
+        outputs = normalize_outputs(output)
+        filename = job.filename or "audio"
+        result_file = await run_in_threadpool(render_outputs, self.asr_model, job.result, outputs, filename)
+        return transcript_response(result_file, filename, outputs, accept_encoding(request))
+
+    async def _get_job(self, job_id: str) -> Job:
+        job = await run_in_threadpool(self.store.get, job_id)
+        if job is None:
+            raise JobNotFoundError(f"Job {job_id} not found")
+        return job
+
+    @staticmethod
+    def _spool(source: BinaryIO, path: str):
+        with open(path, "wb") as target:
+            shutil.copyfileobj(source, target, length=1024 * 1024)
@@ -0,0 +1,97 @@
+import gzip
+from io import BytesIO, StringIO
+from typing import Awaitable, Callable, List, Optional, Union
+from urllib.parse import quote
+
+import brotli
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+from app.config import CONFIG
+from app.output import BINARY_FORMATS
+
+# Brotli quality and gzip level, chosen for speed since every transcript is compressed on the fly
+BROTLI_QUALITY = 5
+GZIP_LEVEL = 6
+
+
+def transcript_response(
+    content: Union[StringIO, BytesIO],
+    filename: str,
+    outputs: List[str],
+    accept_encoding: Optional[str] = None,
+) -> Response:
+    """
+    Wrap a rendered transcript, or a zip bundle when several formats were requested, in a download response.
+    Transcripts of at least RESPONSE_COMPRESSION_MIN_BYTES are compressed with brotli or gzip when the client
+    accepts it.
+    """
+    if len(outputs) > 1:
+        media_type, extension = "application/zip", "zip"
+    else:
+        media_type, extension = BINARY_FORMATS.get(outputs[0], "text/plain"), outputs[0]
+
+    headers = {
+        "Asr-Engine": CONFIG.ASR_ENGINE,
+        "Content-Disposition": f'attachment; filename="{quote(filename)}.{extension}"',
+    }
+    # Zip archives are already deflated
+    if accept_encoding is None or media_type == "application/zip":
+        return StreamingResponse(content, media_type=media_type, headers=headers)
+
+    body = content.getvalue()
+    body = body.encode("utf-8") if isinstance(body, str) else body
+    headers["Vary"] = "Accept-Encoding"
+    encoding = negotiate_encoding(accept_encoding) if len(body) >= CONFIG.RESPONSE_COMPRESSION_MIN_BYTES else None
+    if encoding == "br":
+        body = brotli.compress(body, quality=BROTLI_QUALITY)
+    elif encoding == "gzip":
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type=media_type, headers=headers)
+
+
+def accept_encoding(request: Optional[Request]) -> Optional[str]:
+    """The Accept-Encoding header of a request, None without a request."""
+    return request.headers.get("accept-encoding") if request is not None else None
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick brotli or gzip from an Accept-Encoding header, brotli when both are accepted."""
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+
+    def allowed(coding: str) -> bool:
+        return accepted.get(coding, accepted.get("*", 0.0)) > 0
+
+    if allowed("br"):
+        return "br"
+    if allowed("gzip"):
+        return "gzip"
+    return None
+
+
+class ReleasingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that runs ``on_close`` once the response has been sent or abandoned, even if the
+    body was never iterated. Used to hold resources, like an admission slot, for the length of a stream.
+    """
+
+    def __init__(self, content, on_close: Callable[[], Awaitable[None]], **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.on_close()
@@ -1,10 +1,29 @@
+import struct
+from threading import Thread
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Union
+
 import ffmpeg
 import numpy as np
 
+from app.audio import SpooledAudio
 from app.config import CONFIG
 
+try:
+    import soundfile
+except ImportError:  # FLAC uploads are decoded through ffmpeg instead
+    soundfile = None
+
+# Size of the blocks copied from the upload into ffmpeg and read back as PCM
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
 
-def load_audio(file, encode=True, sr: int = CONFIG.SAMPLE_RATE):
+def load_audio(
+    file, encode=True, sr: int = CONFIG.SAMPLE_RATE, spool_threshold: int = CONFIG.AUDIO_SPOOL_THRESHOLD_SECONDS
+) -> Union[np.ndarray, SpooledAudio]:
     """
     Open an audio file object and read as mono waveform, resampling as necessary.
     Modified from https://github.com/openai/whisper/blob/main/whisper/audio.py to accept a file object
@@ -16,22 +35,287 @@ def load_audio(file, encode=True, sr: int = CONFIG.SAMPLE_RATE):
         If true, encode audio stream to WAV before sending to whisper
     sr: int
         The sample rate to resample the audio if necessary
+    spool_threshold: int
+        Duration in seconds beyond which the decoded audio is spooled to disk, 0 never spools
     Returns
     -------
-    A NumPy array containing the audio waveform, in float32 dtype.
+    A NumPy array containing the audio waveform, in float32 dtype, or a SpooledAudio when the
+    decoded audio is longer than spool_threshold. Callers own a SpooledAudio and should close it.
+
+    PCM/float WAV and (with the soundfile package) FLAC uploads are recognised from their header and
+    decoded in-process without starting ffmpeg, whatever the value of encode. Other formats go through
+    ffmpeg, or are read as raw 16-bit little-endian PCM at the target rate when encode is false.
     """
+    spool_samples = max(0, spool_threshold) * sr
+    header = _peek_header(file)
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        audio = _decode_wav(file, sr, spool_samples)
+        if audio is not None:
+            return audio
+        # Compressed WAV payloads (ADPCM, mu-law, ...) and recordings to spool still need ffmpeg
+        return _collect_pcm16(_decode_with_ffmpeg(file, sr), spool_samples, sr)
+    if header[:4] == b"fLaC" and soundfile is not None and _fits_in_memory(file, sr, spool_samples):
+        return _decode_flac(file, sr)
+
     if encode:
-        try:
-            # This launches a subprocess to decode audio while down-mixing and resampling as necessary.
-            # Requires the ffmpeg CLI and `ffmpeg-python` package to be installed.
-            out, _ = (
-                ffmpeg.input("pipe:", threads=0)
-                .output("-", format="s16le", acodec="pcm_s16le", ac=1, ar=sr)
-                .run(cmd="ffmpeg", capture_stdout=True, capture_stderr=True, input=file.read())
-            )
-        except ffmpeg.Error as e:
-            raise RuntimeError(f"Failed to load audio: {e.stderr.decode()}") from e
+        chunks = _decode_with_ffmpeg(file, sr)
     else:
-        out = file.read()
+        chunks = _read_pcm16(file)
+
+    return _collect_pcm16(chunks, spool_samples, sr)
+
+
+def _peek_header(file: BinaryIO) -> bytes:
+    """
+    Return the first bytes of a seekable file without moving its position, b"" for pipes and other streams.
+    Only tell(), read() and seek() are used: upload spools are SpooledTemporaryFiles, which lack seekable()
+    and readinto() before Python 3.11.
+    """
+    try:
+        position = file.tell()
+        header = file.read(12)
+        file.seek(position)
+    except (AttributeError, OSError, ValueError):
+        return b""
+    return header if isinstance(header, bytes) else b""
+
+
+def _decode_wav(file: BinaryIO, sr: int, spool_samples: int = 0) -> Optional[np.ndarray]:
+    """
+    Decode a RIFF/WAVE file holding integer PCM or IEEE float samples.
+    Returns None, with the file rewound, for encodings that need ffmpeg and for recordings
+    longer than spool_samples, which are streamed into a spool file instead.
+    """
+    start = file.tell()
+    file.read(12)
+    fmt = None
+    while True:
+        chunk_header = file.read(8)
+        if len(chunk_header) < 8:
+            break
+        chunk_id, size = struct.unpack("<4sI", chunk_header)
+        if chunk_id == b"fmt ":
+            fmt_data = file.read(size + (size & 1))
+            if size < 16 or len(fmt_data) < 16:
+                # Truncated or malformed header, ffmpeg reports it properly
+                break
+            format_tag, channels, rate, _, block_align, bits = struct.unpack("<HHIIHH", fmt_data[:16])
+            if rate <= 0:
+                break
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and size >= 26:
+                # The real format is the first two bytes of the sub-format GUID
+                format_tag = struct.unpack("<H", fmt_data[24:26])[0]
+            fmt = (format_tag, channels, rate, block_align, bits)
+        elif chunk_id == b"data" and fmt is not None:
+            # Streamed WAV writers leave the size at 0 or 0xFFFFFFFF, read to the end in that case
+            size = size if 0 < size < 0xFFFFFFFF else None
+            if spool_samples and fmt[3] and (size is None or size // fmt[3] * sr > spool_samples * fmt[2]):
+                break
+            data = _read_bytes(file, size)
+            audio = _pcm_to_float32(data, *fmt)
+            if audio is not None:
+                return _resample(audio, fmt[2], sr)
+            break
+        else:
+            file.seek(size + (size & 1), 1)
+
+    file.seek(start)
+    return None
+
+
+def _read_bytes(file: BinaryIO, size: Optional[int]) -> bytearray:
+    """Read into a writable buffer, so the samples can be viewed and scaled in place."""
+    if size is None:
+        return bytearray(file.read())
+    data = bytearray()
+    while len(data) < size:
+        block = file.read(min(STREAM_CHUNK_SIZE, size - len(data)))
+        if not block:
+            break
+        data += block
+    return data
+
+
+def _pcm_to_float32(
+    data: bytearray, format_tag: int, channels: int, rate: int, block_align: int, bits: int
+) -> Optional[np.ndarray]:
+    """View WAV sample data without copying and mix it down to a mono float32 waveform."""
+    width = bits // 8
+    if channels < 1 or rate < 1 or block_align != channels * width:
+        return None
+    data = memoryview(data)[: len(data) - len(data) % block_align]
+
+    offset = 0.0
+    if format_tag == WAVE_FORMAT_IEEE_FLOAT and width in (4, 8):
+        samples = np.frombuffer(data, "<f4" if width == 4 else "<f8")
+        scale = 1.0
+    elif format_tag == WAVE_FORMAT_PCM and width == 1:
+        # 8-bit WAV is unsigned with silence at 128
+        samples = np.frombuffer(data, np.uint8)
+        scale, offset = 1.0 / 128.0, -1.0
+    elif format_tag == WAVE_FORMAT_PCM and width == 3:
+        packed = np.frombuffer(data, np.uint8).reshape(-1, 3)
+        samples = packed[:, 0].astype(np.int32) | (packed[:, 1].astype(np.int32) << 8)
+        samples |= packed[:, 2].astype(np.int8).astype(np.int32) << 16
+        scale = 1.0 / 8388608.0
+    elif format_tag == WAVE_FORMAT_PCM and width in (2, 4):
+        samples = np.frombuffer(data, "<i2" if width == 2 else "<i4")
+        scale = 1.0 / (1 << (bits - 1))
+    else:
+        return None
+
+    if channels > 1:
+        audio = samples.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+    else:
+        audio = samples.astype(np.float32, copy=False)
+    if scale != 1.0:
+        audio *= scale
+    if offset:
+        audio += offset
+    return audio
+
+
+def _fits_in_memory(file: BinaryIO, sr: int, spool_samples: int) -> bool:
+    """Whether a FLAC file decodes to at most spool_samples at rate sr, read from its stream info."""
+    if not spool_samples:
+        return True
+    position = file.tell()
+    info = soundfile.info(file)
+    file.seek(position)
+    return info.frames * sr <= spool_samples * info.samplerate
 
-    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+def _decode_flac(file: BinaryIO, sr: int) -> np.ndarray:
+    data, rate = soundfile.read(file, dtype="float32", always_2d=True)
+    audio = data.mean(axis=1, dtype=np.float32) if data.shape[1] > 1 else np.ascontiguousarray(data[:, 0])
+    return _resample(audio, rate, sr)
+
+
+def _resample(audio: np.ndarray, orig_sr: int, target_sr: int) -> np.ndarray:
+    """Resample with a band-limited polyphase filter, a no-op when the rates already match."""
+    if orig_sr == target_sr:
+        return audio
+
+    import torch
+    import torchaudio.functional
+
+    resampled = torchaudio.functional.resample(torch.from_numpy(audio), orig_sr, target_sr)
+    return resampled.numpy()
+
+
+def _decode_with_ffmpeg(file: BinaryIO, sr: int) -> Iterator[np.ndarray]:
+    """
+    Decode with an ffmpeg subprocess while down-mixing and resampling as necessary.
+    The upload is streamed into ffmpeg's stdin from a helper thread while int16 PCM blocks are yielded
+    from stdout, so neither the whole upload nor the whole ffmpeg output is held in memory as one bytes object.
+    Requires the ffmpeg CLI and `ffmpeg-python` package to be installed.
+    """
+    process = (
+        ffmpeg.input("pipe:", threads=0)
+        .output("-", format="s16le", acodec="pcm_s16le", ac=1, ar=sr)
+        .run_async(cmd="ffmpeg", pipe_stdin=True, pipe_stdout=True, pipe_stderr=True)
+    )
+
+    feed_errors: List[Exception] = []
+    stderr_chunks: List[bytes] = []
+    feeder = Thread(target=_feed_stdin, args=(file, process.stdin, feed_errors), daemon=True)
+    # stderr has to be drained as well, or ffmpeg blocks once the pipe buffer is full
+    stderr_reader = Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+    feeder.start()
+    stderr_reader.start()
+
+    try:
+        yield from _read_pcm16(process.stdout)
+        process.wait()
+    finally:
+        # The consumer may stop early, e.g. when the spool disk is full
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        feeder.join()
+        stderr_reader.join()
+
+    if feed_errors:
+        raise feed_errors[0]
+    if process.returncode != 0:
+        raise RuntimeError(f"Failed to load audio: {b''.join(stderr_chunks).decode(errors='replace')}")
+
+
+def _read_pcm16(stream: BinaryIO) -> Iterator[np.ndarray]:
+    """Yield int16 blocks from a byte stream, carrying an odd trailing byte over to the next read."""
+    pending = b""
+    while True:
+        data = stream.read(STREAM_CHUNK_SIZE)
+        if not data:
+            break
+        if pending:
+            data = pending + data
+        usable = len(data) - len(data) % 2
+        pending = data[usable:]
+        if usable:
+            yield np.frombuffer(data, np.int16, count=usable // 2)
+
+
+def _feed_stdin(file: BinaryIO, stdin, errors: List[Exception]):
+    try:
+        while True:
+            chunk = file.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            stdin.write(chunk)
+    except BrokenPipeError:
+        # ffmpeg stopped reading, its exit code and stderr report why
+        pass
+    except Exception as e:
+        errors.append(e)
+    finally:
+        try:
+            stdin.close()
+        except BrokenPipeError:
+            pass
+
+
+def _collect_pcm16(chunks: Iterable[np.ndarray], spool_samples: int, sr: int) -> Union[np.ndarray, SpooledAudio]:
+    """
+    Gather int16 PCM blocks into a float32 waveform, or into a SpooledAudio once more than
+    spool_samples have been read, so memory stays bounded for very long recordings.
+    """
+    buffered: List[np.ndarray] = []
+    buffered_samples = 0
+    spool = None
+    try:
+        for chunk in chunks:
+            if spool is not None:
+                spool.write(chunk)
+                continue
+            buffered.append(chunk)
+            buffered_samples += len(chunk)
+            if 0 < spool_samples < buffered_samples:
+                spool = SpooledAudio(sample_rate=sr)
+                for block in buffered:
+                    spool.write(block)
+                buffered = []
+    except BaseException:
+        if spool is not None:
+            spool.close()
+        raise
+
+    if spool is not None:
+        return spool.finish()
+    return _pcm16_to_float32(buffered)
+
+
+def _pcm16_to_float32(chunks: List[np.ndarray]) -> np.ndarray:
+    """
+    Convert int16 PCM blocks into one float32 waveform in [-1, 1).
+    The output is allocated once and each block is released as soon as it is copied,
+    so peak memory stays close to the size of the float32 array.
+    """
+    audio = np.empty(sum(len(chunk) for chunk in chunks), dtype=np.float32)
+    position = 0
+    while chunks:
+        chunk = chunks.pop(0)
+        audio[position : position + len(chunk)] = chunk
+        position += len(chunk)
+    audio *= 1.0 / 32768.0
+    return audio
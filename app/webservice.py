@@ -1,31 +1,85 @@
 import importlib.metadata
 import os
+from contextlib import asynccontextmanager
 from os import path
-from typing import Annotated, Optional, Union
+from typing import Annotated, List, Optional, Union
 
 import click
 import uvicorn
-from fastapi import FastAPI, File, Query, UploadFile, WebSocket
+from fastapi import FastAPI, File, HTTPException, Query, Request, UploadFile, WebSocket
 from fastapi.openapi.docs import get_swagger_ui_html
 from fastapi.responses import RedirectResponse
 from fastapi.staticfiles import StaticFiles
-from whisper import tokenizer
 
+from app.asr_models.idle_supervisor import IdleSupervisor
+from app.asr_models.model_registry import ModelRegistry
+from app.asr_models.replica_pool import ModelReplicaPool
+from app.cache import ResultCache
 from app.config import CONFIG
+from app.exceptions import (
+    InvalidTranscriptError,
+    JobNotFoundError,
+    JobNotReadyError,
+    ServiceOverloadedError,
+    TranscriptionCancelledError,
+    UnsupportedModelError,
+    UnsupportedOutputError,
+)
 from app.factory.asr_model_factory import ASRModelFactory
+from app.jobs import JobStore, JobWorker
+from app.languages import LANGUAGE_CODES
+from app.middleware import cancelled_exception_handler, overload_exception_handler
+from app.output import BINARY_FORMATS, OUTPUT_FORMATS, STREAM_FORMATS, normalize_outputs
 from app.services.asr_service import ASRService
+from app.services.inference_executor import InferenceExecutor
+from app.services.job_service import JobService
 from app.websockets.live_transcribe_handler import LiveTranscribeHandler
 
 # Initialize ASR model and service
 asr_model = ASRModelFactory.create_asr_model()
-asr_model.load_model()
-asr_service = ASRService(asr_model)
-live_transcribe_handler = LiveTranscribeHandler(asr_model)
+idle_supervisor = IdleSupervisor()
+if isinstance(asr_model, ModelRegistry):
+    # Models are created on first use, each is watched from then on
+    asr_model.on_create(idle_supervisor.watch)
+else:
+    idle_supervisor.watch(asr_model)
+inference_executor = InferenceExecutor()
+result_cache = ResultCache()
+asr_service = ASRService(asr_model, inference_executor, result_cache)
+live_transcribe_handler = LiveTranscribeHandler(asr_model, inference_executor)
+job_store = JobStore()
+job_worker = JobWorker(job_store, asr_model, cache=result_cache)
+job_service = JobService(job_store, job_worker, asr_model)
+
+# Repeat the parameter (output=srt&output=vtt) to receive several formats in one zip archive
+OUTPUT_QUERY = Query(
+    default=["txt"],
+    description="Output format. Repeat the parameter to get several formats from one pass as a zip archive",
+    json_schema_extra={"items": {"type": "string", "enum": OUTPUT_FORMATS}},
+)
+# Only shown when ASR_MODELS configures models besides ASR_MODEL
+MODEL_QUERY = Query(
+    default=None,
+    enum=list(dict.fromkeys([CONFIG.MODEL_NAME, *CONFIG.ASR_MODELS])),
+    description="Model to use, the default is ASR_MODEL. Models are loaded on first use",
+    include_in_schema=bool(CONFIG.ASR_MODELS),
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Loaded here rather than at import, so `--version` and tooling that imports the app stay fast
+    asr_model.load_model()
+    idle_supervisor.start()
+    job_worker.start()
+    yield
+    job_worker.stop()
+    idle_supervisor.stop()
 
-LANGUAGE_CODES = sorted(tokenizer.LANGUAGES.keys())
 
 projectMetadata = importlib.metadata.metadata("whisper-asr-webservice")
 app = FastAPI(
+    lifespan=lifespan,
     title=projectMetadata["Name"].title().replace("-", " "),
     description=projectMetadata["Summary"],
     version=projectMetadata["Version"],
@@ -33,6 +87,8 @@ app = FastAPI(
     swagger_ui_parameters={"defaultModelsExpandDepth": -1},
     license_info={"name": "MIT License", "url": projectMetadata["License"]},
 )
+app.add_exception_handler(ServiceOverloadedError, overload_exception_handler)
+app.add_exception_handler(TranscriptionCancelledError, cancelled_exception_handler)
 
 # Serve static files for Swagger UI
 assets_path = os.getcwd() + "/swagger-ui-assets"
@@ -66,6 +122,7 @@ async def index():
 
 @app.post("/asr", tags=["Endpoints"])
 async def asr(
+    request: Request,
     audio_file: UploadFile = File(...),  # noqa: B008
     encode: bool = Query(default=True, description="Encode audio first through ffmpeg"),
     task: Union[str, None] = Query(default="transcribe", enum=["transcribe", "translate"]),
@@ -98,37 +155,180 @@ async def asr(
         description="Max speakers in this file",
         include_in_schema=(True if CONFIG.ASR_ENGINE == "whisperx" else False),
     ),
-    output: Union[str, None] = Query(default="txt", enum=["txt", "vtt", "srt", "tsv", "json"]),
+    output: List[str] = OUTPUT_QUERY,
+    stream: Union[str, None] = Query(
+        default=None,
+        enum=STREAM_FORMATS,
+        description="Send each segment as an NDJSON line or server-sent event as soon as it is decoded",
+    ),
+    model: Union[str, None] = MODEL_QUERY,
 ):
     """Transcribe audio file using the configured ASR engine."""
-    return await asr_service.transcribe_audio(
-        audio_file=audio_file,
-        task=task,
-        language=language,
-        initial_prompt=initial_prompt,
-        vad_filter=vad_filter,
-        word_timestamps=word_timestamps,
-        diarize=diarize,
-        min_speakers=min_speakers,
-        max_speakers=max_speakers,
-        output=output,
-        encode=encode,
-    )
+    try:
+        outputs = normalize_outputs(output)
+    except UnsupportedOutputError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    if stream:
+        if len(outputs) > 1:
+            raise HTTPException(status_code=400, detail="Streaming supports a single output format")
+        if outputs[0] in BINARY_FORMATS:
+            raise HTTPException(status_code=400, detail="Streaming supports text output formats only")
+    try:
+        return await asr_service.transcribe_audio(
+            audio_file=audio_file,
+            task=task,
+            language=language,
+            initial_prompt=initial_prompt,
+            vad_filter=vad_filter,
+            word_timestamps=word_timestamps,
+            diarize=diarize,
+            min_speakers=min_speakers,
+            max_speakers=max_speakers,
+            output=output,
+            encode=encode,
+            request=request,
+            stream=stream,
+            model=model,
+        )
+    except UnsupportedModelError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
 
 
 @app.post("/detect-language", tags=["Endpoints"])
 async def detect_language(
+    request: Request,
     audio_file: UploadFile = File(...),  # noqa: B008
     encode: bool = Query(default=True, description="Encode audio first through FFmpeg"),
+    model: Union[str, None] = MODEL_QUERY,
 ):
     """Detect the language of the audio file."""
-    return await asr_service.detect_language(audio_file=audio_file, encode=encode)
+    try:
+        return await asr_service.detect_language(audio_file=audio_file, encode=encode, request=request, model=model)
+    except UnsupportedModelError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+@app.post("/convert", tags=["Endpoints"])
+async def convert(
+    request: Request,
+    transcript: UploadFile = File(..., description="JSON transcript returned by /asr or a job"),  # noqa: B008
+    output: List[str] = OUTPUT_QUERY,
+):
+    """Convert a stored JSON transcript to other formats without running the model again."""
+    try:
+        return await asr_service.convert_transcript(transcript, output, request)
+    except (InvalidTranscriptError, UnsupportedOutputError) as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+@app.post("/jobs", tags=["Jobs"], status_code=202)
+async def create_job(
+    audio_file: UploadFile = File(...),  # noqa: B008
+    encode: bool = Query(default=True, description="Encode audio first through ffmpeg"),
+    task: Union[str, None] = Query(default="transcribe", enum=["transcribe", "translate"]),
+    language: Union[str, None] = Query(default=None, enum=LANGUAGE_CODES),
+    initial_prompt: Union[str, None] = Query(default=None),
+    vad_filter: Annotated[
+        bool,
+        Query(
+            description="Enable the voice activity detection (VAD) to filter out parts of the audio without speech",
+            include_in_schema=(True if CONFIG.ASR_ENGINE == "faster_whisper" else False),
+        ),
+    ] = False,
+    word_timestamps: bool = Query(
+        default=False,
+        description="Word level timestamps",
+        include_in_schema=(True if CONFIG.ASR_ENGINE == "faster_whisper" else False),
+    ),
+    diarize: bool = Query(
+        default=False,
+        description="Diarize the input",
+        include_in_schema=(True if CONFIG.ASR_ENGINE == "whisperx" and CONFIG.HF_TOKEN != "" else False),
+    ),
+    min_speakers: Union[int, None] = Query(
+        default=None,
+        description="Min speakers in this file",
+        include_in_schema=(True if CONFIG.ASR_ENGINE == "whisperx" else False),
+    ),
+    max_speakers: Union[int, None] = Query(
+        default=None,
+        description="Max speakers in this file",
+        include_in_schema=(True if CONFIG.ASR_ENGINE == "whisperx" else False),
+    ),
+    model: Union[str, None] = MODEL_QUERY,
+):
+    """Queue a transcription job and return its id without waiting for the result."""
+    try:
+        return await job_service.submit(
+            audio_file=audio_file,
+            task=task,
+            language=language,
+            initial_prompt=initial_prompt,
+            vad_filter=vad_filter,
+            word_timestamps=word_timestamps,
+            diarize=diarize,
+            min_speakers=min_speakers,
+            max_speakers=max_speakers,
+            encode=encode,
+            model=model,
+        )
+    except UnsupportedModelError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+@app.get("/jobs/{job_id}", tags=["Jobs"])
+async def get_job(job_id: str):
+    """Return the status and progress of a transcription job."""
+    try:
+        return await job_service.get_status(job_id)
+    except JobNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+
+
+@app.get("/jobs/{job_id}/result", tags=["Jobs"])
+async def get_job_result(
+    request: Request,
+    job_id: str,
+    output: List[str] = OUTPUT_QUERY,
+):
+    """Return the result of a completed transcription job in the requested format."""
+    try:
+        return await job_service.get_result(job_id, output, request)
+    except JobNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+    except JobNotReadyError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+    except UnsupportedOutputError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+@app.get("/status", tags=["Monitoring"])
+async def status():
+    """
+    Report the configured engine, the inference queue, replica usage, idle tiers and reload times,
+    the loaded models, result cache and live session stats.
+    """
+    report = {
+        "engine": CONFIG.ASR_ENGINE,
+        "model": CONFIG.MODEL_NAME,
+        "executor": inference_executor.stats(),
+        "cache": result_cache.stats(),
+        "live": live_transcribe_handler.scheduler.stats(),
+        "idle": idle_supervisor.stats(),
+    }
+    if isinstance(asr_model, ModelReplicaPool):
+        report["replicas"] = asr_model.stats()
+    if isinstance(asr_model, ModelRegistry):
+        report["models"] = asr_model.stats()
+    return report
 
 
 @app.websocket("/ws/live-transcribe")
-async def websocket_live_transcribe(websocket: WebSocket, language: Optional[str] = None):
-    """WebSocket endpoint for live transcription."""
-    await live_transcribe_handler.handle_connection(websocket, language)
+async def websocket_live_transcribe(
+    websocket: WebSocket, language: Optional[str] = None, audio_format: str = "pcm", model: Optional[str] = None
+):
+    """WebSocket endpoint for live transcription of raw 16-bit PCM or a compressed stream (webm, ogg, flac)."""
+    await live_transcribe_handler.handle_connection(websocket, language, audio_format, model)
 
 
 @click.command()
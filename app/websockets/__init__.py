@@ -1,3 +1,5 @@
+from .live_scheduler import LiveScheduler
+from .live_session import LatencyStats, LiveChunk, LiveSession
 from .live_transcribe_handler import LiveTranscribeHandler
 
-__all__ = ["LiveTranscribeHandler"]
+__all__ = ["LiveTranscribeHandler", "LiveScheduler", "LiveSession", "LiveChunk", "LatencyStats"]
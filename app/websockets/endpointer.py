@@ -0,0 +1,109 @@
+import math
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+import numpy as np
+
+from app.audio.ring_buffer import AudioRingBuffer
+from app.config import CONFIG
+
+FRAME_MS = 30
+# Consecutive speech frames that start an utterance, shorter bursts are clicks and pops
+ONSET_FRAMES = 3
+# Audio kept before the onset and after the last speech frame, so word edges are not clipped
+PADDING_MS = 200
+# Frames quieter than this (dBFS) are never speech, whatever the noise floor
+MIN_SPEECH_DB = -55.0
+# The noise floor is the quietest frame of the last HISTORY_BLOCKS blocks of BLOCK_FRAMES frames (about 3 s),
+# so steady background noise becomes the floor while the pauses between words keep it below speech
+BLOCK_FRAMES = 20
+HISTORY_BLOCKS = 5
+
+
+class Endpointer:
+    """
+    Energy based voice activity detection and endpointing for a live stream.
+
+    New audio is cut into 30 ms frames and their energy is computed for all frames at once. A frame
+    is speech when it is ``threshold_db`` louder than the noise floor of the last seconds. A few speech frames in
+    a row start an utterance; ``silence_ms`` of non-speech ends it, and an utterance is cut after
+    ``max_segment_seconds`` while the speaker goes on. Utterances are reported as sample positions of
+    the ring buffer, padded a little on both sides.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = CONFIG.SAMPLE_RATE,
+        silence_ms: int = CONFIG.LIVE_ENDPOINT_SILENCE_MS,
+        max_segment_seconds: float = CONFIG.LIVE_MAX_SEGMENT_SECONDS,
+        threshold_db: float = CONFIG.LIVE_VAD_THRESHOLD_DB,
+    ):
+        self.frame = sample_rate * FRAME_MS // 1000
+        self.padding = sample_rate * PADDING_MS // 1000
+        self.silence_frames = max(1, silence_ms // FRAME_MS)
+        self.max_samples = int(max_segment_seconds * sample_rate)
+        self.threshold_db = threshold_db
+        self._block_minima: Deque[float] = deque(maxlen=HISTORY_BLOCKS)
+        self._block_min = math.inf
+        self._block_frames = 0
+        # Next sample to analyse
+        self.position = 0
+        # Start of the current utterance, None outside speech
+        self.speech_start: Optional[int] = None
+        self._speech_run = 0
+        self._silence_run = 0
+        self._last_speech_end = 0
+
+    def frame_energy(self, audio: np.ndarray) -> np.ndarray:
+        """Energy in dBFS of each complete frame of ``audio``."""
+        frames = audio[: len(audio) - len(audio) % self.frame].reshape(-1, self.frame)
+        power = np.einsum("ij,ij->i", frames, frames) / self.frame
+        return 10.0 * np.log10(power + 1e-10)
+
+    def process(self, buffer: AudioRingBuffer) -> List[Tuple[int, int]]:
+        """Analyse the audio written since the last call and return the utterances it completed."""
+        self.position = max(self.position, buffer.oldest)
+        count = (buffer.written - self.position) // self.frame
+        if not count:
+            return []
+        energies = self.frame_energy(buffer.window(self.position, self.position + count * self.frame))
+
+        utterances = []
+        for energy in energies.tolist():
+            frame_end = self.position + self.frame
+            self._track_floor(energy)
+            speech = energy > max(self.noise_floor_db + self.threshold_db, MIN_SPEECH_DB)
+            if speech:
+                self._speech_run += 1
+                self._silence_run = 0
+                self._last_speech_end = frame_end
+                if self.speech_start is None and self._speech_run >= ONSET_FRAMES:
+                    onset = frame_end - ONSET_FRAMES * self.frame
+                    self.speech_start = max(buffer.oldest, onset - self.padding)
+            else:
+                self._speech_run = 0
+                self._silence_run += 1
+            self.position = frame_end
+
+            if self.speech_start is None:
+                continue
+            if self._silence_run >= self.silence_frames:
+                utterances.append((self.speech_start, min(frame_end, self._last_speech_end + self.padding)))
+                self.speech_start = None
+            elif frame_end - self.speech_start >= self.max_samples:
+                # The speaker goes on, cut here and continue with a new utterance
+                utterances.append((self.speech_start, frame_end))
+                self.speech_start = frame_end
+        return utterances
+
+    @property
+    def noise_floor_db(self) -> float:
+        return min(self._block_min, *self._block_minima) if self._block_minima else self._block_min
+
+    def _track_floor(self, energy: float):
+        self._block_min = min(self._block_min, energy)
+        self._block_frames += 1
+        if self._block_frames == BLOCK_FRAMES:
+            self._block_minima.append(self._block_min)
+            self._block_min = math.inf
+            self._block_frames = 0
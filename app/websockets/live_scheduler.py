@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from app.config import CONFIG
+from app.websockets.live_session import LiveChunk, LiveSession
+
+logger = logging.getLogger(__name__)
+
+ChunkProcessor = Callable[[LiveSession, LiveChunk], Awaitable[None]]
+BatchProcessor = Callable[[List[Tuple[LiveSession, LiveChunk]]], Awaitable[None]]
+
+# Whisper decodes 30 second windows, longer chunks run on their own
+MAX_BATCHED_SAMPLES = 30 * CONFIG.SAMPLE_RATE
+
+
+class LiveScheduler:
+    """
+    Feeds chunks from all live sessions to the model in round-robin order.
+
+    Each session has its own queue of chunks and at most one chunk in flight, so its results
+    arrive in order. Sessions with waiting chunks take turns for one of ``concurrency`` slots:
+    a client that sends audio faster than it can be transcribed only delays itself, and every
+    other stream still gets a chunk through per round. A session queue holds at most
+    ``max_pending`` chunks; beyond that the oldest chunk is dropped and the client gets ``[BUSY]``.
+
+    With ``process_batch``, a slot takes the next chunk of up to ``batch_size`` waiting sessions of the
+    same language and model and transcribes them in one forward pass. Sessions only wait while every slot is
+    busy, so batches grow with the load and an idle model still starts each chunk at once.
+    """
+
+    def __init__(
+        self,
+        process: ChunkProcessor,
+        concurrency: int = CONFIG.LIVE_SCHEDULER_CONCURRENCY,
+        max_pending: int = CONFIG.LIVE_SESSION_MAX_PENDING,
+        process_batch: Optional[BatchProcessor] = None,
+        batch_size: int = CONFIG.LIVE_BATCH_SIZE,
+    ):
+        self.process = process
+        self.process_batch = process_batch
+        self.concurrency = max(1, concurrency)
+        self.max_pending = max(1, max_pending)
+        self.batch_size = max(1, batch_size) if process_batch is not None else 1
+        self.batches = 0
+        self.batched_chunks = 0
+        self.sessions: Dict[str, LiveSession] = {}
+        self._ready: Deque[LiveSession] = deque()
+        self._running = 0
+        self._tasks: Set[asyncio.Task] = set()
+
+    def open(self, session: LiveSession):
+        self.sessions[session.id] = session
+
+    def close(self, session: LiveSession):
+        """Forget a session. Its waiting chunks are dropped, a chunk in flight finishes without sending."""
+        session.closed = True
+        session.pending.clear()
+        self.sessions.pop(session.id, None)
+        if session in self._ready:
+            self._ready.remove(session)
+        logger.info(f"Live session {session.id} closed: {session.snapshot()}")
+
+    async def submit(self, session: LiveSession, chunk: LiveChunk, replace: bool = False):
+        """
+        Queue a chunk for the session and start work on free slots. With ``replace`` the chunk supersedes
+        the chunks still waiting, e.g. because it spans their audio as well.
+        """
+        if session.closed:
+            return
+        if replace:
+            session.pending.clear()
+        elif len(session.pending) >= self.max_pending:
+            session.pending.popleft()
+            session.stats.dropped += 1
+            await session.send_text("[BUSY]")
+        session.pending.append(chunk)
+        if not session.busy and session not in self._ready:
+            self._ready.append(session)
+        self._pump()
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.sessions),
+            "running": self._running,
+            "queued": sum(len(session.pending) for session in self.sessions.values()),
+            "concurrency": self.concurrency,
+            "batch_size": self.batch_size,
+            "batches": self.batches,
+            "batched_chunks": self.batched_chunks,
+            "streams": [session.snapshot() for session in self.sessions.values()],
+        }
+
+    def _pump(self):
+        while self._ready and self._running < self.concurrency:
+            session = self._ready.popleft()
+            if session.closed or not session.pending:
+                continue
+            batch = [self._start(session)]
+            if self.batch_size > 1 and _batchable(batch[0][1]):
+                for other in list(self._ready):
+                    if len(batch) >= self.batch_size:
+                        break
+                    if other.closed or not other.pending or not _same_model(other, session):
+                        continue
+                    if _batchable(other.pending[0]):
+                        self._ready.remove(other)
+                        batch.append(self._start(other))
+            self._running += 1
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    @staticmethod
+    def _start(session: LiveSession) -> Tuple[LiveSession, LiveChunk]:
+        session.busy = True
+        session.inflight = session.pending.popleft()
+        return session, session.inflight
+
+    async def _run(self, batch: List[Tuple[LiveSession, LiveChunk]]):
+        started = time.monotonic()
+        try:
+            if len(batch) == 1:
+                await self.process(*batch[0])
+            else:
+                self.batches += 1
+                self.batched_chunks += len(batch)
+                await self.process_batch(batch)
+            for session, chunk in batch:
+                session.finish_chunk(chunk, started)
+        except Exception as e:
+            for session, _ in batch:
+                logger.error(f"Live session {session.id} chunk failed: {e}")
+                await session.send_text(f"[ERROR] {str(e)}")
+        finally:
+            self._running -= 1
+            for session, _ in batch:
+                session.busy = False
+                session.inflight = None
+                # Back of the line, sessions that waited go first
+                if session.pending and not session.closed:
+                    self._ready.append(session)
+            self._pump()
+
+
+def _same_model(session: LiveSession, other: LiveSession) -> bool:
+    return session.language == other.language and session.model_name == other.model_name
+
+
+def _batchable(chunk: LiveChunk) -> bool:
+    return len(chunk.audio) <= MAX_BATCHED_SAMPLES
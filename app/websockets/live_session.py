@@ -0,0 +1,270 @@
+import math
+import time
+import uuid
+from collections import deque
+from typing import Deque, NamedTuple, Optional
+
+import numpy as np
+from fastapi import WebSocket
+
+from app.audio.ring_buffer import AudioRingBuffer
+from app.config import CONFIG
+from app.websockets.endpointer import Endpointer
+from app.websockets.local_agreement import LocalAgreement
+
+
+class LiveChunk(NamedTuple):
+    """Audio cut from a session buffer, waiting to be transcribed."""
+
+    # View into the session ring buffer, valid while the buffer still holds ``start``
+    audio: np.ndarray
+    start: int
+    # Seconds the chunk starts after the previously processed position, added to its timestamps
+    offset: float
+    buffer_size: int
+    submitted_at: float
+    # Ends an utterance, local agreement commits everything it heard
+    final: bool = False
+
+
+class LatencyStats:
+    """Counters and a sliding window of chunk latencies for one live session."""
+
+    def __init__(self, window: int = 100):
+        self.chunks = 0
+        self.dropped = 0
+        self.merged = 0
+        # Exponentially weighted inference seconds per second of audio
+        self.rtf: Optional[float] = None
+        self._queued: Deque[float] = deque(maxlen=window)
+        self._latencies: Deque[float] = deque(maxlen=window)
+
+    def record(self, queued_seconds: float, latency_seconds: float, processing_seconds: float, audio_seconds: float):
+        """Record a processed chunk: the time it waited for the model, the time until its result was ready and
+        the time the model took for its audio."""
+        self.chunks += 1
+        self._queued.append(queued_seconds)
+        self._latencies.append(latency_seconds)
+        if audio_seconds > 0:
+            rtf = processing_seconds / audio_seconds
+            self.rtf = rtf if self.rtf is None else 0.7 * self.rtf + 0.3 * rtf
+
+    def snapshot(self) -> dict:
+        latencies = sorted(self._latencies)
+        return {
+            "chunks": self.chunks,
+            "dropped": self.dropped,
+            "merged": self.merged,
+            "rtf": None if self.rtf is None else round(self.rtf, 3),
+            "queue_ms": _milliseconds(sum(self._queued) / len(self._queued)) if self._queued else None,
+            "latency_ms": {
+                "mean": _milliseconds(sum(latencies) / len(latencies)) if latencies else None,
+                "p50": _milliseconds(_percentile(latencies, 0.5)),
+                "p95": _milliseconds(_percentile(latencies, 0.95)),
+                "max": _milliseconds(latencies[-1]) if latencies else None,
+            },
+        }
+
+
+class LiveSession:
+    """
+    State of one live transcription connection: its audio buffer, the chunks waiting for the
+    scheduler and its latency stats. Every WebSocket gets its own session, so concurrent
+    streams never share a buffer.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        language: Optional[str] = None,
+        sample_rate: int = 16000,
+        model_name: Optional[str] = None,
+    ):
+        self.id = uuid.uuid4().hex[:12]
+        self.websocket = websocket
+        self.language = language
+        # Model the session is transcribed with, None for the default model
+        self.model_name = model_name
+        self.sample_rate = sample_rate
+        self.buffer = AudioRingBuffer(self.buffer_capacity())
+        # Position in the ring buffer where the next chunk starts, the overlap is kept before it
+        self.buffer_start = 0
+        self.last_processed_position = 0
+        # With local agreement every chunk spans the audio since the last commit up to the newest sample
+        self.agreement = LocalAgreement() if CONFIG.LIVE_DECODING == "local_agreement" else None
+        self.taken = 0
+        # Decides when to transcribe from speech onsets and pauses instead of every LIVE_CHUNK_SIZE bytes
+        self.endpointer = Endpointer(sample_rate) if CONFIG.LIVE_ENDPOINTING else None
+        self.pending: Deque[LiveChunk] = deque()
+        self.inflight: Optional[LiveChunk] = None
+        self.busy = False
+        # Bytes of new audio that trigger a pass, adapted to the real-time factor
+        self.chunk_size = CONFIG.LIVE_CHUNK_SIZE
+        self.closed = False
+        self.started_at = time.monotonic()
+        self.stats = LatencyStats()
+
+    @staticmethod
+    def buffer_capacity() -> int:
+        """Samples the ring buffer keeps: enough for every chunk a session can have queued or in flight."""
+        chunk_samples = max(CONFIG.LIVE_CHUNK_SIZE, CONFIG.LIVE_MAX_CHUNK_SIZE) // 2 + CONFIG.LIVE_OVERLAP_SIZE // 2
+        capacity = (max(1, CONFIG.LIVE_SESSION_MAX_PENDING) + 2) * chunk_samples
+        if CONFIG.LIVE_DECODING == "local_agreement":
+            capacity += int(CONFIG.LIVE_AGREEMENT_MAX_WINDOW_SECONDS * CONFIG.SAMPLE_RATE)
+        if CONFIG.LIVE_ENDPOINTING:
+            # The utterance being spoken and the one being transcribed
+            capacity += 2 * int(CONFIG.LIVE_MAX_SEGMENT_SECONDS * CONFIG.SAMPLE_RATE)
+        return capacity
+
+    @property
+    def buffer_size(self) -> int:
+        """Bytes of 16-bit audio buffered for the next chunk, including the kept overlap."""
+        return 2 * (self.buffer.written - max(self.buffer_start, self.buffer.oldest))
+
+    @property
+    def new_data_size(self) -> int:
+        if self.agreement is not None or self.endpointer is not None:
+            return 2 * (self.buffer.written - self.taken)
+        return self.buffer_size - self.last_processed_position
+
+    def write(self, pcm: bytes):
+        self.buffer.write(pcm)
+
+    def take_chunk(self) -> LiveChunk:
+        """Cut the buffered audio into a chunk and keep the configured overlap for the next one."""
+        start = max(self.buffer_start, self.buffer.oldest)
+        chunk = LiveChunk(
+            audio=self.buffer.window(start, self.buffer.written),
+            start=start,
+            offset=self.last_processed_position / (self.sample_rate * 2),  # 2 bytes per sample
+            buffer_size=self.buffer_size,
+            submitted_at=time.monotonic(),
+        )
+
+        self.taken = self.buffer.written
+
+        if self.agreement is not None:
+            # The window only moves once words are committed
+            return chunk
+        # Keep overlap for context, but advance the processing position
+        if CONFIG.LIVE_OVERLAP_CHUNKS:
+            keep_size = CONFIG.LIVE_OVERLAP_SIZE
+            if chunk.buffer_size > keep_size:
+                self.buffer_start = self.buffer.written - keep_size // 2
+                self.last_processed_position = 0
+            else:
+                self.last_processed_position = chunk.buffer_size
+        else:
+            # Start the next chunk after this one
+            self.buffer_start = self.buffer.written
+            self.last_processed_position = 0
+        return chunk
+
+    def take_segment(self, start: int, end: int) -> LiveChunk:
+        """
+        Cut an utterance found by the endpointer. With local agreement the chunk spans the window
+        since the last commit, so the final pass can confirm the words still tentative.
+        """
+        if self.agreement is not None:
+            start = self.buffer_start
+        start = min(max(start, self.buffer.oldest), end)
+        self.taken = self.buffer.written
+        if self.agreement is None:
+            self.buffer_start = end
+        return LiveChunk(
+            audio=self.buffer.window(start, end),
+            start=start,
+            offset=start / self.sample_rate,
+            buffer_size=2 * (end - start),
+            submitted_at=time.monotonic(),
+            final=True,
+        )
+
+    def skip_silence(self):
+        """Mark the audio so far as handled and, outside an utterance, drop it from the local agreement window."""
+        self.taken = self.buffer.written
+        if self.agreement is None:
+            self.buffer_start = max(self.buffer_start, self.buffer.written - CONFIG.LIVE_OVERLAP_SIZE // 2)
+        elif not self.busy and not self.agreement.tentative:
+            self.commit_until(self.buffer.written - CONFIG.LIVE_OVERLAP_SIZE // 2)
+
+    def lag(self) -> float:
+        """Seconds the oldest chunk without a result has been waiting, i.e. how far the captions are behind."""
+        waiting = [chunk.submitted_at for chunk in self.pending]
+        if self.inflight is not None:
+            waiting.append(self.inflight.submitted_at)
+        return max(0.0, time.monotonic() - min(waiting)) if waiting else 0.0
+
+    def merge_pending(self, chunk: LiveChunk) -> LiveChunk:
+        """Join the waiting chunks and ``chunk`` into one pass over the audio they span."""
+        first = self.pending[0]
+        start = max(first.start, self.buffer.oldest)
+        end = chunk.start + len(chunk.audio)
+        self.stats.merged += len(self.pending)
+        return LiveChunk(
+            audio=self.buffer.window(start, end),
+            start=start,
+            offset=first.offset + (start - first.start) / self.sample_rate,
+            buffer_size=2 * (end - start),
+            submitted_at=first.submitted_at,
+            final=chunk.final or any(pending.final for pending in self.pending),
+        )
+
+    def finish_chunk(self, chunk: LiveChunk, started: float):
+        """Record a transcribed chunk and adapt the chunk size to how fast the model keeps up."""
+        finished = time.monotonic()
+        audio_seconds = len(chunk.audio) / self.sample_rate
+        self.stats.record(
+            started - chunk.submitted_at, finished - chunk.submitted_at, finished - started, audio_seconds
+        )
+        if self.stats.rtf is None:
+            # No audio has been timed yet
+            return
+
+        target = CONFIG.LIVE_TARGET_RTF
+        if self.stats.rtf > target:
+            # Longer chunks spread the fixed cost of a model call over more audio
+            self.chunk_size = min(CONFIG.LIVE_MAX_CHUNK_SIZE, _even(self.chunk_size * 1.5))
+        elif self.stats.rtf < target / 2:
+            self.chunk_size = max(CONFIG.LIVE_CHUNK_SIZE, _even(self.chunk_size / 1.5))
+
+    def commit_until(self, position: int):
+        """Drop the audio before ``position`` from the window of later chunks."""
+        self.buffer_start = min(max(self.buffer_start, position), self.buffer.written)
+
+    async def send_text(self, text: str):
+        """Send a message unless the client has gone away in the meantime."""
+        if self.closed:
+            return
+        try:
+            await self.websocket.send_text(text)
+        except Exception:
+            # Connection closed while a chunk was in flight, the receive loop cleans up
+            self.closed = True
+
+    def snapshot(self) -> dict:
+        return {
+            "id": self.id,
+            "language": self.language,
+            "model": self.model_name,
+            "seconds": round(time.monotonic() - self.started_at, 1),
+            "pending": len(self.pending),
+            "chunk_size": self.chunk_size,
+            "lag": round(self.lag(), 2),
+            **self.stats.snapshot(),
+        }
+
+
+def _percentile(values: list, fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    return values[min(len(values) - 1, math.ceil(fraction * len(values)) - 1)]
+
+
+def _milliseconds(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def _even(size: float) -> int:
+    """Round a byte count to whole 16-bit samples."""
+    return int(size) // 2 * 2
@@ -1,155 +1,357 @@
+import asyncio
 import logging
 import time
-from typing import Optional
+from io import StringIO
+from typing import List, Optional, Tuple
 
 import numpy as np
 from fastapi import WebSocket, WebSocketDisconnect
 
 from app.asr_models.asr_model import ASRModel
+from app.audio.stream_decoder import StreamDecoder
 from app.config import CONFIG
-from app.exceptions import TranscriptionError
+from app.exceptions import ServiceOverloadedError, TranscriptionError, UnsupportedModelError
+from app.output.result_writers import dumps_json
+from app.output.segments import Word
+from app.services.inference_executor import LANE_LIVE, InferenceExecutor
+from app.websockets.live_scheduler import LiveScheduler
+from app.websockets.live_session import LiveChunk, LiveSession
+from app.websockets.local_agreement import result_words
 
 logger = logging.getLogger(__name__)
 
 
 class LiveTranscribeHandler:
-    """Handles live transcription via WebSocket connections."""
+    """Handles live transcription via WebSocket connections, one LiveSession per connection."""
 
-    def __init__(self, asr_model: ASRModel):
+    def __init__(
+        self,
+        asr_model: ASRModel,
+        executor: Optional[InferenceExecutor] = None,
+        scheduler: Optional[LiveScheduler] = None,
+    ):
         self.asr_model = asr_model
+        self.executor = executor or InferenceExecutor()
+        self.scheduler = scheduler or LiveScheduler(
+            self._process_audio_chunk,
+            # Engines that batch transcribe the chunks of several sessions in one forward pass
+            process_batch=self._process_batch if asr_model.supports_batching else None,
+        )
         self.SAMPLE_RATE = 16000
         self.CHUNK_SIZE = CONFIG.LIVE_CHUNK_SIZE  # Use configurable chunk size
         self.OVERLAP_SIZE = CONFIG.LIVE_OVERLAP_SIZE  # Overlap for better context
-        self.audio_buffer = bytearray()
-        self.last_processed_position = 0
 
-    async def handle_connection(self, websocket: WebSocket, language: Optional[str] = None):
-        """Handle a WebSocket connection for live transcription."""
+    async def handle_connection(
+        self,
+        websocket: WebSocket,
+        language: Optional[str] = None,
+        audio_format: str = "pcm",
+        model: Optional[str] = None,
+    ):
+        """
+        Handle a WebSocket connection for live transcription. Clients send raw 16-bit PCM frames, or with
+        ``audio_format`` a compressed stream that a decoder process of the session turns into PCM.
+        ``model`` selects one of the configured models, None the default.
+        """
         await websocket.accept()
-        self.audio_buffer = bytearray()
-        self.last_processed_position = 0
+        session = LiveSession(websocket, language, self.SAMPLE_RATE)
+        decoder = None
+        try:
+            session.model_name = self.asr_model.resolve_model_name(model)
+            if audio_format != "pcm":
+                decoder = StreamDecoder(audio_format, self.SAMPLE_RATE)
+        except (UnsupportedModelError, ValueError) as e:
+            await session.send_text(f"[ERROR] {str(e)}")
+            await websocket.close(code=1003)
+            return
+        self.scheduler.open(session)
 
-        logger.info(f"Live transcription started - Language: {language or 'auto-detect'}")
+        logger.info(
+            f"Live transcription {session.id} started - Language: {language or 'auto-detect'}, format: {audio_format}, "
+            f"model: {session.model_name}"
+        )
 
+        decoding = None
         try:
+            # Load the model now rather than with the first chunk
+            await self.executor.run(self.asr_model.select, session.model_name)
+            if decoder is not None:
+                await decoder.start()
+                decoding = asyncio.ensure_future(self._decode(session, decoder))
             chunk_count = 0
             while True:
                 chunk = await websocket.receive_bytes()
                 chunk_count += 1
-                self.audio_buffer.extend(chunk)
+                if decoding is not None:
+                    if decoding.done():
+                        # The decoder failed and the client has been told why
+                        break
+                    await decoder.write(chunk)
+                    continue
+                session.write(chunk)
 
                 logger.debug(
-                    f"Received chunk {chunk_count}, size: {len(chunk)} bytes, total buffer: {len(self.audio_buffer)} bytes"
+                    f"Session {session.id} received chunk {chunk_count}, size: {len(chunk)} bytes, "
+                    f"total buffer: {session.buffer_size} bytes"
                 )
 
-                # Process when we have enough new data (considering overlap)
-                new_data_size = len(self.audio_buffer) - self.last_processed_position
-                if new_data_size >= self.CHUNK_SIZE:
-                    await self._process_audio_chunk(websocket, language)
-
-                    # Keep overlap for context, but advance the processing position
-                    if CONFIG.LIVE_OVERLAP_CHUNKS:
-                        # Keep last 0.5 seconds for overlap
-                        keep_size = self.OVERLAP_SIZE
-                        if len(self.audio_buffer) > keep_size:
-                            self.audio_buffer = self.audio_buffer[-keep_size:]
-                            self.last_processed_position = 0
-                        else:
-                            self.last_processed_position = len(self.audio_buffer)
-                    else:
-                        # Clear buffer completely
-                        self.audio_buffer = bytearray()
-                        self.last_processed_position = 0
-                else:
-                    # Send confirmation that we received data
-                    await websocket.send_text("[BUFFERING]")
+                await self._on_audio(session)
 
         except WebSocketDisconnect:
-            logger.info("WebSocket connection closed by client")
+            logger.info(f"WebSocket connection {session.id} closed by client")
         except Exception as e:
             logger.error(f"Error in WebSocket handler: {e}")
-            try:
-                await websocket.send_text(f"[ERROR] {str(e)}")
-            except Exception:
-                pass  # Connection might already be closed
-
-    async def _process_audio_chunk(self, websocket: WebSocket, language: Optional[str]):
-        """Process an audio chunk and send transcription result."""
-        logger.debug(f"Processing audio buffer of size: {len(self.audio_buffer)} bytes")
-
-        # Convert to numpy array
-        audio_np = np.frombuffer(self.audio_buffer, np.int16).astype(np.float32) / 32768.0
-        logger.debug(f"Audio array shape: {audio_np.shape}, min: {audio_np.min()}, max: {audio_np.max()}")
-
-        # Check if there's audio in the data
-        if np.abs(audio_np).max() < 0.01:
-            logger.debug("Audio seems to be silence, skipping transcription")
-            await websocket.send_text("[SILENCE]")
-            return
+            await session.send_text(f"[ERROR] {str(e)}")
+        finally:
+            self.scheduler.close(session)
+            if decoder is not None:
+                await decoder.close()
+            if decoding is not None:
+                await asyncio.gather(decoding, return_exceptions=True)
 
+    async def _decode(self, session: LiveSession, decoder: StreamDecoder):
+        """Feed the PCM a session's decoder produces into its buffer, like frames received from the client."""
         try:
-            # For NbAiLab models, don't use initial_prompt as it's not supported by HuggingFace pipeline
-            # The language parameter is sufficient for good quality
-            initial_prompt = None
-
-            # Call existing transcribe function with improved parameters for better synchronization
-            result_file = self.asr_model.transcribe(
-                audio_np,
-                task="transcribe",
-                language=language,
-                initial_prompt=initial_prompt,
-                vad_filter=CONFIG.LIVE_VAD_FILTER,  # Use configurable VAD setting
-                word_timestamps=CONFIG.LIVE_WORD_TIMESTAMPS,  # Use configurable word timestamps
-                options=None,
-                output=CONFIG.LIVE_OUTPUT_FORMAT,  # Use configurable output format
-            )
-
-            if result_file is not None and hasattr(result_file, "getvalue"):
-                transcription_data = result_file.getvalue().strip()
-                logger.debug(f"Transcription result: '{transcription_data}'")
-
-                if transcription_data:
-                    # Add timing information to the response
-                    if CONFIG.LIVE_OUTPUT_FORMAT == "json":
-                        try:
-                            import json
-
-                            result_json = json.loads(transcription_data)
-
-                            # Add processing timestamp and chunk information
-                            result_json["processing_timestamp"] = time.time()
-                            result_json["chunk_duration"] = len(audio_np) / self.SAMPLE_RATE
-                            result_json["buffer_size"] = len(self.audio_buffer)
-
-                            # Adjust timestamps if we have overlap
-                            if CONFIG.LIVE_OVERLAP_CHUNKS and self.last_processed_position > 0:
-                                overlap_duration = self.last_processed_position / (
-                                    self.SAMPLE_RATE * 2
-                                )  # 2 bytes per sample
-                                if "segments" in result_json:
-                                    for segment in result_json["segments"]:
-                                        if "start" in segment:
-                                            segment["start"] += overlap_duration
-                                        if "end" in segment:
-                                            segment["end"] += overlap_duration
-
-                            transcription_data = json.dumps(result_json, ensure_ascii=False)
-                        except json.JSONDecodeError:
-                            # If JSON parsing fails, send as is
-                            pass
-
-                    # Send transcription data with timing information
-                    await websocket.send_text(transcription_data)
-                else:
-                    await websocket.send_text("[NO_SPEECH]")
+            async for pcm in decoder.pcm():
+                session.write(pcm)
+                logger.debug(
+                    f"Session {session.id} decoded {len(pcm)} bytes, total buffer: {session.buffer_size} bytes"
+                )
+                await self._on_audio(session)
+        except Exception as e:
+            if not session.closed:
+                logger.error(f"Live session {session.id} audio decoding failed: {e}")
+                await session.send_text(f"[ERROR] {str(e)}")
+                # Invalid frame payload data, the receive loop ends with the disconnect
+                await session.websocket.close(code=1007)
+
+    async def _on_audio(self, session: LiveSession):
+        """Decide whether the audio received so far is transcribed now."""
+        if session.endpointer is not None:
+            await self._on_endpointed_audio(session)
+            return
+
+        # Process when we have enough new data (considering overlap)
+        if session.new_data_size >= session.chunk_size:
+            audio_chunk = session.take_chunk()
+            # Check if there's audio in the data
+            if not len(audio_chunk.audio) or _peak(audio_chunk.audio) < 0.01:
+                logger.debug("Audio seems to be silence, skipping transcription")
+                session.skip_silence()
+                await session.send_text("[SILENCE]")
+            else:
+                await self._submit(session, audio_chunk)
+        else:
+            # Send confirmation that we received data
+            await session.send_text("[BUFFERING]")
+
+    async def _on_endpointed_audio(self, session: LiveSession):
+        """Transcribe utterances once a pause or the segment limit ends them, non-speech never reaches the model."""
+        utterances = session.endpointer.process(session.buffer)
+        for start, end in utterances:
+            await self._submit(session, session.take_segment(start, end))
+        if utterances:
+            return
+
+        if session.endpointer.speech_start is None:
+            if session.new_data_size >= session.chunk_size:
+                logger.debug("No speech in the last chunk, skipping transcription")
+                session.skip_silence()
+                await session.send_text("[SILENCE]")
+                return
+        elif session.agreement is not None and session.new_data_size >= session.chunk_size:
+            # Interim pass while the speaker goes on
+            await self._submit(session, session.take_chunk())
+            return
+        # Send confirmation that we received data
+        await session.send_text("[BUFFERING]")
+
+    async def _submit(self, session: LiveSession, chunk: LiveChunk):
+        if not len(chunk.audio):
+            # E.g. an utterance the ring buffer has already overwritten, there is nothing to transcribe
+            return
+        # A local agreement pass spans the audio of the passes still waiting, unless one of them ends an utterance
+        replace = session.agreement is not None and not any(pending.final for pending in session.pending)
+        lag = session.lag()
+        if session.pending and not replace and lag > CONFIG.LIVE_MAX_LAG_SECONDS:
+            if CONFIG.LIVE_LAG_POLICY == "merge":
+                # One pass over all waiting audio costs about as much as one of the chunks
+                chunk = session.merge_pending(chunk)
             else:
-                logger.error("Transcription failed - no result file")
-                await websocket.send_text("[ERROR] Transcription failed.")
+                session.stats.dropped += len(session.pending)
+                await session.send_text("[BUSY]")
+            replace = True
+            logger.info(f"Live session {session.id} is {lag:.1f}s behind, {CONFIG.LIVE_LAG_POLICY} waiting chunks")
+            await session.send_text(f"[LAG] {lag:.1f}")
+        await self.scheduler.submit(session, chunk, replace=replace)
+
+    async def _process_audio_chunk(self, session: LiveSession, chunk: LiveChunk):
+        """Transcribe one chunk of a session and send the result to its client."""
+        await self._process_batch([(session, chunk)])
+
+    async def _process_batch(self, batch: List[Tuple[LiveSession, LiveChunk]]):
+        """Transcribe chunks of several sessions in one forward pass and send every result to its own client."""
+        ready = []
+        for session, chunk in batch:
+            logger.debug(f"Processing {len(chunk.audio)} samples for session {session.id}")
+            if session.buffer.holds(chunk.start):
+                ready.append((session, chunk))
+                continue
+            logger.warning(f"Live chunk of session {session.id} was overwritten while it waited")
+            session.stats.dropped += 1
+            await session.send_text("[BUSY]")
+        if not ready:
+            return
+
+        try:
+            # Transcribe to structured results, they are serialized once below in the configured output format.
+            # Live chunks use the priority lane of the executor, ahead of /asr uploads.
+            async with self.executor.admit(LANE_LIVE):
+                results = await self.executor.run(
+                    self._transcribe,
+                    [chunk.audio for _, chunk in ready],
+                    lane=LANE_LIVE,
+                    language=ready[0][0].language,
+                    model_name=ready[0][0].model_name,
+                    # Use configurable word timestamps, local agreement compares words
+                    word_timestamps=CONFIG.LIVE_WORD_TIMESTAMPS or ready[0][0].agreement is not None,
+                )
 
+            for (session, chunk), result in zip(ready, results, strict=True):
+                await self._send_result(session, result, chunk)
+
+        except ServiceOverloadedError as e:
+            # Drop the chunks instead of letting the backlog grow, the clients keep streaming
+            logger.warning(f"Live chunk dropped: {e}")
+            for session, _ in ready:
+                session.stats.dropped += 1
+                await session.send_text("[BUSY]")
         except Exception as e:
             logger.error(f"Error during transcription: {e}")
             raise TranscriptionError(f"Transcription failed: {str(e)}") from e
 
+    def _transcribe(
+        self, audios: List[np.ndarray], language: Optional[str], model_name: Optional[str], word_timestamps: bool
+    ) -> List[dict]:
+        # For NbAiLab models, don't use initial_prompt as it's not supported by HuggingFace pipeline
+        # The language parameter is sufficient for good quality
+        arguments = {
+            "task": "transcribe",
+            "language": language,
+            "initial_prompt": None,
+            "vad_filter": CONFIG.LIVE_VAD_FILTER,  # Use configurable VAD setting
+            "word_timestamps": word_timestamps,
+            "options": None,
+        }
+        with self.asr_model.use(model_name) as asr_model:
+            if len(audios) == 1:
+                return [asr_model.transcribe_result(audios[0], **arguments)]
+            return asr_model.transcribe_batch(audios, **arguments)
+
+    async def _send_result(self, session: LiveSession, result: Optional[dict], chunk: LiveChunk):
+        if result is None:
+            logger.error("Transcription failed - no result")
+            await session.send_text("[ERROR] Transcription failed.")
+            return
+        if not session.buffer.holds(chunk.start):
+            # The stream ran so far ahead that newer audio overwrote this chunk while it was transcribed
+            logger.warning(f"Live chunk of session {session.id} was overwritten before it finished")
+            session.stats.dropped += 1
+            await session.send_text("[BUSY]")
+            return
+
+        if session.agreement is not None:
+            for message in self._agree(session, result, chunk):
+                await session.send_text(message)
+        else:
+            transcription_data = self._serialize_result(session, result, chunk)
+            logger.debug(f"Transcription result: '{transcription_data}'")
+
+            # Send transcription data with timing information
+            await session.send_text(transcription_data or "[NO_SPEECH]")
+
+        # JSON results carry the lag, text clients are told when the captions fall behind
+        lag = session.lag()
+        if CONFIG.LIVE_OUTPUT_FORMAT != "json" and lag >= 1.0:
+            await session.send_text(f"[LAG] {lag:.1f}")
+
+    def _agree(self, session: LiveSession, result: dict, chunk: LiveChunk) -> List[str]:
+        """
+        Commit the words this pass agrees on with the previous one, move the session window past them
+        and return the messages for the client: the committed text and the tentative rest.
+        """
+        chunk_end = chunk.start + len(chunk.audio)
+        committed, tentative = session.agreement.insert(result_words(result, chunk.start / self.SAMPLE_RATE))
+        if (
+            chunk.final
+            or (chunk_end - session.buffer_start) / self.SAMPLE_RATE > CONFIG.LIVE_AGREEMENT_MAX_WINDOW_SECONDS
+        ):
+            # The utterance ended or there was no agreement within the longest window, commit what the pass heard
+            committed += session.agreement.flush()
+            tentative = []
+        if chunk.final:
+            session.commit_until(chunk_end)
+        elif committed:
+            session.commit_until(int(committed[-1].end * self.SAMPLE_RATE))
+        elif not tentative:
+            # Nothing was said in the window, keep only a little context before the next chunk
+            session.commit_until(chunk_end - self.OVERLAP_SIZE // 2)
+
+        text = "".join(word.word for word in committed)
+        tentative_text = "".join(word.word for word in tentative)
+        if CONFIG.LIVE_OUTPUT_FORMAT == "json":
+            return [
+                dumps_json(
+                    {
+                        "text": text,
+                        "start": committed[0].start if committed else None,
+                        "end": committed[-1].end if committed else None,
+                        "words": [_word_dict(word) for word in committed],
+                        "tentative": tentative_text,
+                        "tentative_words": [_word_dict(word) for word in tentative],
+                        "language": result.get("language"),
+                        **self._timing(session, chunk),
+                    }
+                )
+            ]
+
+        messages = []
+        if committed:
+            output_file = StringIO()
+            segment = {"start": committed[0].start, "end": committed[-1].end, "text": text}
+            self.asr_model.write_result({"text": text, "segments": [segment]}, output_file, CONFIG.LIVE_OUTPUT_FORMAT)
+            messages.append(output_file.getvalue().strip())
+        if tentative_text.strip():
+            messages.append(f"[TENTATIVE] {tentative_text.strip()}")
+        return messages or ["[NO_SPEECH]"]
+
+    def _serialize_result(self, session: LiveSession, result: dict, chunk: LiveChunk) -> str:
+        """Write a chunk result in the configured live output format, adding timing information to JSON."""
+        if CONFIG.LIVE_OUTPUT_FORMAT != "json":
+            output_file = StringIO()
+            self.asr_model.write_result(result, output_file, CONFIG.LIVE_OUTPUT_FORMAT)
+            return output_file.getvalue().strip()
+
+        # Adjust timestamps if we have overlap, endpointed utterances are shifted to their start in the stream
+        if chunk.offset > 0:
+            result["segments"] = [
+                ASRModel._shift_timestamps(segment, chunk.offset) for segment in result.get("segments", [])
+            ]
+
+        # Add processing timestamp and chunk information
+        result.update(self._timing(session, chunk))
+        return dumps_json(result)
+
+    def _timing(self, session: LiveSession, chunk: LiveChunk) -> dict:
+        return {
+            "processing_timestamp": time.time(),
+            "chunk_duration": len(chunk.audio) / self.SAMPLE_RATE,
+            "buffer_size": chunk.buffer_size,
+            # Seconds the captions are behind the audio and inference seconds per second of audio
+            "lag": round(session.lag(), 2),
+            "rtf": None if session.stats.rtf is None else round(session.stats.rtf, 3),
+        }
+
     def _get_initial_prompt(self, language: Optional[str]) -> str:
         """Get language-specific initial prompt."""
         prompts = {
@@ -161,3 +363,12 @@ class LiveTranscribeHandler:
 
         # Return language-specific prompt or neutral prompt for auto-detect
         return prompts.get(language or "", "Transcribe accurately what is said.")
+
+
+def _peak(audio: np.ndarray) -> float:
+    """Largest absolute sample value, without allocating an abs() copy of the chunk."""
+    return max(float(audio.max()), -float(audio.min()))
+
+
+def _word_dict(word: Word) -> dict:
+    return {"word": word.word, "start": round(word.start, 3), "end": round(word.end, 3)}
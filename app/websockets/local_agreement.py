@@ -0,0 +1,92 @@
+import re
+from typing import List, Sequence, Tuple
+
+from app.output.segments import Segment, Word
+
+# Longest run of already committed words looked for at the start of a new pass
+MAX_REPEATED_WORDS = 5
+# Words starting this long before the last commit are leftovers of audio that was already committed
+COMMIT_TOLERANCE_SECONDS = 0.1
+
+_PUNCTUATION = re.compile(r"[^\w']+")
+
+
+def result_words(result: dict, offset: float) -> List[Word]:
+    """
+    The words of a transcription result as Word tuples shifted by ``offset`` seconds. Segments without
+    word timestamps are split on whitespace and their duration is spread evenly over their words.
+    """
+    words = []
+    for raw in result.get("segments") or ():
+        segment = Segment.from_any(raw)
+        if segment.words:
+            segment_words = [Word.from_any(word) for word in segment.words]
+            # whisperx words carry no leading space, put it back unless the language is written without spaces
+            spaced = any(word.word[:1].isspace() for word in segment_words) or " " not in segment.text
+            separator = "" if spaced else " "
+            for word in segment_words:
+                if word.start is None or not word.word.strip():
+                    continue
+                words.append(Word(separator + word.word, word.start + offset, (word.end or word.start) + offset))
+            continue
+        parts = segment.text.split()
+        step = (segment.end - segment.start) / len(parts) if parts else 0.0
+        for index, part in enumerate(parts):
+            start = segment.start + offset + index * step
+            words.append(Word(" " + part, start, start + step))
+    return words
+
+
+def _key(word: Word) -> str:
+    return _PUNCTUATION.sub("", word.word).lower()
+
+
+class LocalAgreement:
+    """
+    Commits the words that two consecutive passes over a growing audio window agree on.
+
+    Each pass transcribes the audio from the last commit to the newest sample. The longest prefix
+    its words share with the previous pass is committed and sent once; the rest stays tentative
+    until the next pass confirms or revises it. Committed audio can then be dropped from the window.
+    """
+
+    def __init__(self):
+        # Tail of the committed words
+        self.committed: List[Word] = []
+        self.committed_end = 0.0
+        self.tentative: List[Word] = []
+
+    def insert(self, words: Sequence[Word]) -> Tuple[List[Word], List[Word]]:
+        """Add the words of a new pass, return the newly committed and the still tentative words."""
+        words = [word for word in words if word.start > self.committed_end - COMMIT_TOLERANCE_SECONDS]
+        words = self._drop_repeated(words)
+
+        agreed = 0
+        for previous, current in zip(self.tentative, words, strict=False):
+            if _key(previous) != _key(current):
+                break
+            agreed += 1
+        self.tentative = words[agreed:]
+        return self._commit(words[:agreed]), list(self.tentative)
+
+    def flush(self) -> List[Word]:
+        """Commit everything still tentative, e.g. when the window has to be cut without agreement."""
+        words, self.tentative = self.tentative, []
+        return self._commit(words)
+
+    def _commit(self, words: List[Word]) -> List[Word]:
+        if words:
+            # Only the tail is needed to recognise words a later pass repeats
+            self.committed = (self.committed + words)[-MAX_REPEATED_WORDS:]
+            self.committed_end = words[-1].end
+        return words
+
+    def _drop_repeated(self, words: List[Word]) -> List[Word]:
+        """Skip words at the start of a pass that repeat the tail of the committed text."""
+        if not self.committed or not words:
+            return words
+        for size in range(min(MAX_REPEATED_WORDS, len(self.committed), len(words)), 0, -1):
+            tail = [_key(word) for word in self.committed[-size:]]
+            if tail == [_key(word) for word in words[:size]]:
+                return words[size:]
+        return words
@@ -0,0 +1,82 @@
+"""
+Import-time report for the startup path of the webservice, built on ``python -X importtime``.
+
+Every module is imported in a fresh interpreter. The report lists the time until it was imported and the
+packages that took longest, counting each package's own import time, so a framework that is imported
+where it is not needed shows up as a startup regression.
+
+    python -m benchmarks.import_time app.config app.webservice --engine faster_whisper --top 10
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+DEFAULT_MODULES = ["app.config", "app.factory.asr_model_factory", "app.webservice"]
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def import_times(module: str, env: Dict[str, str]) -> List[Tuple[int, int, int, str]]:
+    """Import ``module`` in a new interpreter and return (self us, cumulative us, depth, name) per import."""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{process.stderr[-2000:]}")
+    entries = []
+    for line in process.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((int(self_us), int(cumulative_us), len(indent) // 2, name))
+    return entries
+
+
+def summarize(entries: List[Tuple[int, int, int, str]], top: int) -> dict:
+    """Total import time and the packages with the largest own import time, summed over their submodules."""
+    packages: Dict[str, int] = defaultdict(int)
+    for self_us, _, _, name in entries:
+        packages[name.split(".")[0]] += self_us
+    slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "total_ms": round(sum(cumulative for _, cumulative, depth, _ in entries if depth == 0) / 1000, 1),
+        "modules": len(entries),
+        "packages": {name: round(us / 1000, 1) for name, us in slowest},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--engine", help="ASR_ENGINE to import the modules with (default: the environment)")
+    parser.add_argument("--top", type=int, default=10, help="Number of packages to list per module")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON, e.g. to track it in CI")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.engine:
+        env["ASR_ENGINE"] = args.engine
+
+    report = {module: summarize(import_times(module, env), args.top) for module in args.modules}
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    for module, summary in report.items():
+        print(f"{module}: {summary['total_ms']:.1f} ms, {summary['modules']} modules")
+        for package, milliseconds in summary["packages"].items():
+            print(f"  {package:<32}{milliseconds:>10.1f} ms")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Micro-benchmark for the result writers on long transcripts with word timestamps.
+
+Compares app.output.result_writers with the print-per-line writers of openai-whisper, which the
+engines used before, on the same synthetic transcript.
+
+    python -m benchmarks.result_writers --segments 5000 --repeat 5
+"""
+
+import argparse
+import json
+import random
+import timeit
+from dataclasses import asdict
+from io import StringIO
+
+from app.output.result_writers import WRITERS
+
+try:
+    from whisper import utils as whisper_utils
+except ImportError:
+    whisper_utils = None
+
+VOCABULARY = ["the", "meeting", "starts", "at", "nine", "transcription", "of", "audio", "and", "speech", "recognition"]
+
+
+def make_transcript(segments: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    position = 0.0
+    result_segments = []
+    for index in range(segments):
+        start = position
+        words = []
+        for _ in range(rng.randint(6, 18)):
+            word_start = position
+            position += rng.uniform(0.15, 0.6)
+            words.append(
+                {
+                    "word": " " + rng.choice(VOCABULARY),
+                    "start": round(word_start, 3),
+                    "end": round(position, 3),
+                    "probability": round(rng.random(), 4),
+                }
+            )
+        result_segments.append(
+            {
+                "id": index,
+                "seek": 0,
+                "start": round(start, 3),
+                "end": round(position, 3),
+                "text": "".join(word["word"] for word in words),
+                "tokens": [rng.randint(0, 50000) for _ in words],
+                "temperature": 0.0,
+                "avg_logprob": -0.25,
+                "compression_ratio": 1.4,
+                "no_speech_prob": 0.01,
+                "words": words,
+            }
+        )
+        position += rng.uniform(0.0, 1.5)
+    return {
+        "text": "".join(segment["text"] for segment in result_segments),
+        "segments": result_segments,
+        "language": "en",
+    }
+
+
+def faster_whisper_segments(result: dict) -> list:
+    """The same transcript as faster_whisper segment objects, or None when faster_whisper is not installed."""
+    try:
+        from faster_whisper.transcribe import Segment, Word
+    except ImportError:
+        return None
+    return [
+        Segment(
+            id=segment["id"],
+            seek=segment["seek"],
+            start=segment["start"],
+            end=segment["end"],
+            text=segment["text"],
+            tokens=segment["tokens"],
+            avg_logprob=segment["avg_logprob"],
+            compression_ratio=segment["compression_ratio"],
+            no_speech_prob=segment["no_speech_prob"],
+            words=[Word(**word) for word in segment["words"]],
+            temperature=segment["temperature"],
+        )
+        for segment in result["segments"]
+    ]
+
+
+def best_of(function, repeat: int) -> float:
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segments", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    result = make_transcript(args.segments)
+    words = sum(len(segment["words"]) for segment in result["segments"])
+    print(f"{args.segments} segments, {words} words\n")
+    print(f"{'case':<34}{'writer (ms)':>12}{'baseline (ms)':>15}{'speedup':>9}")
+
+    # openai_whisper passes these options, so subtitles are laid out from the word timestamps
+    subtitle_options = {"max_line_width": 1000, "max_line_count": 10, "highlight_words": False}
+    for output, writer in WRITERS.items():
+        for label, options in (("segments", {}), ("words", subtitle_options)):
+            if label == "words" and output not in ("srt", "vtt"):
+                continue
+            instance = writer(**options)
+            current = best_of(lambda w=instance: w.write_result(result, StringIO()), args.repeat)
+            baseline = None
+            if whisper_utils is not None:
+                reference = whisper_utils.get_writer(output, "")
+                baseline = best_of(lambda r=reference, o=options: r.write_result(result, StringIO(), o), args.repeat)
+            _report(f"{output} ({label})", current, baseline)
+
+    segments = faster_whisper_segments(result)
+    if segments is not None:
+        objects = {**result, "segments": segments}
+        current = best_of(lambda: WRITERS["json"]().write_result(objects, StringIO()), args.repeat)
+        baseline = best_of(
+            lambda: json.dump({**objects, "segments": [asdict(segment) for segment in segments]}, StringIO()),
+            args.repeat,
+        )
+        _report("json (faster_whisper objects)", current, baseline)
+
+
+def _report(case: str, current: float, baseline):
+    if baseline is None:
+        print(f"{case:<34}{current * 1000:>12.1f}{'-':>15}{'-':>9}")
+    else:
+        print(f"{case:<34}{current * 1000:>12.1f}{baseline * 1000:>15.1f}{baseline / current:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
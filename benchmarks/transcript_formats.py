@@ -0,0 +1,67 @@
+"""
+Compare the size and client parse time of the json and msgpack transcript outputs.
+
+Parsing msgpack means unpacking the document and viewing the numeric columns with numpy,
+which is what a columnar consumer does; unpack_transcript() rebuilding dicts is timed separately.
+
+    python -m benchmarks.transcript_formats --segments 5000 --repeat 5
+"""
+
+import argparse
+import gzip
+import json
+
+import msgpack
+import numpy as np
+
+from app.output.binary import pack_transcript, unpack_transcript
+from app.output.result_writers import dumps_json
+from benchmarks.result_writers import best_of, make_transcript
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def parse_columns(data: bytes) -> dict:
+    packed = msgpack.unpackb(data, raw=False)
+    words = packed["words"]
+    return {
+        "start": np.frombuffer(words["start_ms"], dtype="<i4"),
+        "end": np.frombuffer(words["end_ms"], dtype="<i4"),
+        "probability": np.frombuffer(words["probability"], dtype="<f4"),
+        "word": words["word"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segments", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    result = make_transcript(args.segments)
+    encoded = {"json": dumps_json(result).encode("utf-8"), "msgpack": pack_transcript(result)}
+
+    print(f"{'format':<10}{'bytes':>12}{'gzip':>12}{'brotli':>12}")
+    for name, body in encoded.items():
+        compressed = len(brotli.compress(body, quality=5)) if brotli is not None else "-"
+        print(f"{name:<10}{len(body):>12}{len(gzip.compress(body, compresslevel=6)):>12}{compressed:>12}")
+
+    print(f"\n{'encode':<34}{'ms':>10}")
+    print(f"{'json (dumps_json)':<34}{best_of(lambda: dumps_json(result), args.repeat) * 1000:>10.1f}")
+    print(f"{'msgpack (pack_transcript)':<34}{best_of(lambda: pack_transcript(result), args.repeat) * 1000:>10.1f}")
+
+    print(f"\n{'parse':<34}{'ms':>10}")
+    timings = {
+        "json.loads": lambda: json.loads(encoded["json"]),
+        "msgpack columns": lambda: parse_columns(encoded["msgpack"]),
+        "msgpack unpack_transcript": lambda: unpack_transcript(encoded["msgpack"]),
+    }
+    for name, parse in timings.items():
+        print(f"{name:<34}{best_of(parse, args.repeat) * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
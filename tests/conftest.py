@@ -15,6 +15,11 @@ pytest_plugins = "pytest_asyncio"
 def mock_asr_model():
     """Create a mock ASR model for testing."""
     model = Mock(spec=ASRModel)
+    model.model_name = "base"
+    model.writer_options = {}
+    model.select.return_value = model
+    model.pin.return_value = "base"
+    model.resolve_model_name.return_value = "base"
     model.transcribe.return_value = Mock()
     model.language_detection.return_value = ("en", 0.95)
     return model
@@ -19,3 +19,10 @@ def test_asr_endpoint_returns_422_on_no_file():
 def test_detect_language_returns_422_on_no_file():
     response = client.post("/detect-language")
     assert response.status_code == 422
+
+
+def test_convert_returns_400_on_unknown_output():
+    transcript = ("transcript.json", b'{"text": "", "segments": []}', "application/json")
+    response = client.post("/convert?output=docx", files={"transcript": transcript})
+    assert response.status_code == 400
+    assert "docx" in response.text
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from faster_whisper.transcribe import Segment
+
+from app.asr_models import faster_whisper_engine
+from app.asr_models.faster_whisper_engine import FasterWhisperASR
+
+
+class ClipEchoPipeline:
+    """Returns one segment per clip, in the timeline of the joined audio."""
+
+    calls = []
+
+    def __init__(self, model):
+        self.model = model
+
+    def transcribe(self, audio, clip_timestamps, batch_size, **kwargs):
+        self.calls.append((len(audio), clip_timestamps, batch_size, kwargs))
+        segments = [
+            Segment(index, 0, clip["start"] + 0.1, clip["end"], f" clip {index}", [], 0.0, 1.0, 0.0, None, 0.0)
+            for index, clip in enumerate(clip_timestamps)
+        ]
+        return iter(segments), None
+
+
+def test_batched_clips_are_split_back_into_their_inputs(monkeypatch):
+    monkeypatch.setattr(faster_whisper_engine, "BatchedInferencePipeline", ClipEchoPipeline)
+    engine = FasterWhisperASR()
+    engine.model = object()
+    audios = [np.zeros(16000, dtype=np.float32), np.zeros(8000, dtype=np.float32)]
+
+    results = engine.transcribe_batch(audios, "transcribe", "no", None, True, False, None)
+
+    length, clips, batch_size, kwargs = ClipEchoPipeline.calls[-1]
+    assert (length, batch_size) == (24000, 2)
+    assert clips == [{"start": 0.0, "end": 1.0}, {"start": 1.0, "end": 1.5}]
+    assert "vad_filter" not in kwargs
+    assert [result["text"] for result in results] == [" clip 0", " clip 1"]
+    assert results[1]["segments"][0].start == pytest.approx(0.1)
+    assert results[1]["segments"][0].end == pytest.approx(0.5)
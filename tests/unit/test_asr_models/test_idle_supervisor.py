@@ -0,0 +1,94 @@
+from app.asr_models.asr_model import MODEL_CACHES_RELEASED, MODEL_LOADED, MODEL_OFFLOADED, MODEL_UNLOADED, ASRModel
+from app.asr_models.idle_supervisor import IdleSupervisor
+
+
+class FakeASR(ASRModel):
+    def __init__(self, offload_to=MODEL_OFFLOADED):
+        super().__init__()
+        self.offload_to = offload_to
+        self.calls = []
+
+    def load_model(self):
+        self.calls.append("load")
+        self.model = object()
+
+    def release_caches(self):
+        self.calls.append("release_caches")
+
+    def offload_model(self):
+        self.calls.append("offload")
+        if self.offload_to == MODEL_UNLOADED:
+            return super().offload_model()
+        return MODEL_OFFLOADED
+
+    def restore_model(self):
+        self.calls.append("restore")
+
+    def transcribe_result(self, audio, task, language, initial_prompt, vad_filter, word_timestamps, options):
+        with self.active():
+            return {"text": "", "segments": [], "language": language}
+
+    def language_detection(self, audio):
+        return "no", 1.0
+
+
+def make_model(**kwargs):
+    model = FakeASR(**kwargs)
+    model.load_model()
+    model.calls.clear()
+    return model
+
+
+def test_idle_model_moves_down_the_tiers_and_is_restored_on_use():
+    model = make_model()
+    supervisor = IdleSupervisor(cache_timeout=10, offload_timeout=60)
+    supervisor.watch(model)
+    idle_since = model.last_activity_time
+
+    supervisor.check(idle_since + 5)
+    assert model.idle_state == MODEL_LOADED
+    supervisor.check(idle_since + 11)
+    assert model.idle_state == MODEL_CACHES_RELEASED
+    supervisor.check(idle_since + 61)
+    supervisor.check(idle_since + 120)
+    assert model.idle_state == MODEL_OFFLOADED
+    assert model.calls == ["release_caches", "offload"]
+
+    model.transcribe_result(None, None, "no", None, None, None, None)
+    assert model.idle_state == MODEL_LOADED
+    assert model.calls[-1] == "restore"
+    assert model.idle_snapshot()["restores"]["count"] == 1
+    assert model.idle_snapshot()["loads"]["count"] == 0
+
+
+def test_unloaded_model_is_loaded_again_and_timed():
+    model = make_model(offload_to=MODEL_UNLOADED)
+    supervisor = IdleSupervisor(cache_timeout=0, offload_timeout=60)
+    supervisor.watch(model)
+
+    supervisor.check(model.last_activity_time + 61)
+    assert model.model is None
+    assert model.idle_state == MODEL_UNLOADED
+
+    model.transcribe_result(None, None, "no", None, None, None, None)
+    assert model.calls == ["offload", "load"]
+    assert model.idle_snapshot()["loads"]["count"] == 1
+    assert model.idle_snapshot()["loads"]["last_ms"] is not None
+
+
+def test_models_in_use_are_left_alone():
+    model = make_model()
+    supervisor = IdleSupervisor(cache_timeout=10, offload_timeout=60)
+    supervisor.watch(model)
+
+    with model.active():
+        supervisor.check(model.last_activity_time + 120)
+        assert model.idle_snapshot()["active"] == 1
+    assert model.calls == []
+    assert model.idle_state == MODEL_LOADED
+
+
+def test_disabled_supervisor_starts_no_thread():
+    supervisor = IdleSupervisor(cache_timeout=0, offload_timeout=0)
+    supervisor.start()
+    assert supervisor._thread is None
@@ -0,0 +1,86 @@
+import pytest
+
+from app.asr_models.asr_model import MODEL_LOADED, MODEL_UNLOADED, ASRModel
+from app.asr_models.model_registry import ModelRegistry
+from app.exceptions import UnsupportedModelError
+
+MB = 1024 * 1024
+
+
+class FakeASR(ASRModel):
+    loads = []
+
+    def load_model(self):
+        self.loads.append(self.model_name)
+        self.model = object()
+
+    def weight_bytes(self) -> int:
+        return 400 * MB
+
+    def transcribe_result(self, audio, task, language, initial_prompt, vad_filter, word_timestamps, options):
+        with self.active():
+            return {"text": self.model_name, "segments": [], "language": language}
+
+    def language_detection(self, audio):
+        return "no", 1.0
+
+
+@pytest.fixture
+def registry():
+    FakeASR.loads = []
+    return ModelRegistry(lambda name: FakeASR(model_name=name), "large", ["small", "medium"], memory_budget_mb=1000)
+
+
+def test_models_are_created_and_loaded_on_first_use(registry):
+    small = registry.select("small")
+    assert registry.select("small") is small
+    assert FakeASR.loads == ["small"]
+    assert small.idle_state == MODEL_LOADED
+    assert registry.select() is not small
+    assert registry.select().model_lock is not small.model_lock
+    assert registry.transcribe_result(None, None, "no", None, None, None, None)["text"] == "large"
+
+
+def test_unknown_models_are_rejected(registry):
+    with pytest.raises(UnsupportedModelError):
+        registry.select("tiny")
+    assert registry.resolve_model_name(None) == "large"
+
+
+def test_least_recently_used_model_is_unloaded_beyond_the_budget(registry):
+    large, small = registry.select("large"), registry.select("small")
+    registry.select("large")
+    medium = registry.select("medium")
+
+    assert small.idle_state == MODEL_UNLOADED
+    assert large.idle_state == medium.idle_state == MODEL_LOADED
+    assert registry.stats()["evictions"] == 1
+    assert registry.stats()["loaded_mb"] == 800
+
+    # An unloaded model loads again on its next use
+    registry.select("small")
+    assert FakeASR.loads == ["large", "small", "medium", "small"]
+    assert large.idle_state == MODEL_UNLOADED
+
+
+def test_models_in_use_are_not_unloaded(registry):
+    large = registry.select("large")
+    with large.active():
+        registry.select("small")
+        registry.select("medium")
+        assert large.idle_state == MODEL_LOADED
+    assert registry.stats()["models"]["small"] == [MODEL_UNLOADED]
+
+
+def test_pinned_models_are_not_unloaded_before_their_call(registry):
+    model_name = registry.pin("large")
+    large = registry.select(model_name)
+    registry.select("small")
+    registry.select("medium")
+    assert large.idle_state == MODEL_LOADED
+
+    registry.unpin(model_name)
+    with registry.use("small") as small:
+        registry.select("large")
+        assert small.idle_state == MODEL_LOADED
+    assert registry.stats()["models"]["medium"] == [MODEL_UNLOADED]
@@ -0,0 +1,77 @@
+import threading
+import time
+from unittest.mock import Mock
+
+from app.asr_models.asr_model import ASRModel
+from app.asr_models.priority_lock import PRIORITY_LIVE, call_priority
+from app.asr_models.replica_pool import ModelReplicaPool
+
+
+def make_replica(cpu_threads):
+    replica = Mock(spec=ASRModel)
+    replica.cpu_threads = cpu_threads
+    replica.language_detection.return_value = ("no", 0.9)
+    replica.transcribe_result.return_value = {"text": " hei", "segments": [], "language": "no"}
+    return replica
+
+
+def test_pool_creates_replicas_with_thread_share():
+    pool = ModelReplicaPool(make_replica, replicas=3, threads_per_replica=0)
+    assert len(pool.replicas) == 3
+    assert pool.stats() == {"replicas": 3, "idle": 3, "threads": 0}
+
+
+def test_lease_hands_out_distinct_replicas_and_returns_them():
+    pool = ModelReplicaPool(make_replica, replicas=2)
+    with pool.lease() as first, pool.lease() as second:
+        assert first is not second
+        assert pool.stats()["idle"] == 0
+    assert pool.stats()["idle"] == 2
+
+
+def test_lease_blocks_until_a_replica_is_returned():
+    pool = ModelReplicaPool(make_replica, replicas=1)
+    leased = threading.Event()
+
+    def worker():
+        with pool.lease():
+            leased.set()
+
+    with pool.lease():
+        thread = threading.Thread(target=worker)
+        thread.start()
+        assert not leased.wait(0.05)
+    thread.join(timeout=1)
+    assert leased.is_set()
+
+
+def test_calls_are_delegated_to_a_replica():
+    pool = ModelReplicaPool(make_replica, replicas=2)
+    assert pool.language_detection([0.0]) == ("no", 0.9)
+    pool.transcribe([0.0], "transcribe", None, None, False, False, None, "txt")
+    assert sum(replica.transcribe_result.call_count for replica in pool.replicas) == 1
+    assert sum(replica.write_result.call_count for replica in pool.replicas) == 1
+
+
+def test_waiting_live_lease_gets_the_next_free_replica():
+    pool = ModelReplicaPool(make_replica, replicas=1)
+    order = []
+
+    def worker(name, live):
+        if live:
+            with call_priority(PRIORITY_LIVE), pool.lease():
+                order.append(name)
+        else:
+            with pool.lease():
+                order.append(name)
+
+    with pool.lease():
+        threads = []
+        for name, live, waiting in (("batch", False, 1), ("live", True, 2)):
+            threads.append(threading.Thread(target=worker, args=(name, live)))
+            threads[-1].start()
+            while pool._available.waiting < waiting:
+                time.sleep(0.01)
+    for thread in threads:
+        thread.join(timeout=5)
+    assert order == ["live", "batch"]
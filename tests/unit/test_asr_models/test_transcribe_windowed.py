@@ -0,0 +1,106 @@
+import json
+from dataclasses import dataclass
+
+import numpy as np
+import pytest
+
+from app.asr_models.asr_model import ASRModel
+from app.audio import SpooledAudio
+from app.exceptions import TranscriptionCancelledError
+
+
+class WindowEchoASR(ASRModel):
+    """Reports one segment per window spanning the window length, with a word at its start."""
+
+    def __init__(self):
+        super().__init__()
+        self.languages = []
+
+    def load_model(self):
+        pass
+
+    def transcribe_result(self, audio, task, language, initial_prompt, vad_filter, word_timestamps, options):
+        self.languages.append(language)
+        duration = len(audio) / 16000
+        segment = {"id": 0, "start": 0.0, "end": duration, "text": " window", "words": [{"start": 0.0, "end": 0.5}]}
+        return {"text": " window", "segments": [segment], "language": "no"}
+
+    def language_detection(self, audio):
+        return "no", 1.0
+
+    def write_result(self, result, file, output):
+        json.dump(result, file)
+
+
+def spool(samples: np.ndarray) -> SpooledAudio:
+    audio = SpooledAudio()
+    audio.write(samples)
+    return audio.finish()
+
+
+def test_spooled_windows_cover_the_recording_at_quiet_points():
+    rng = np.random.default_rng(0)
+    samples = (rng.standard_normal(16000 * 25) * 8000).astype(np.int16)
+    samples[16000 * 8 : 16000 * 8 + 1600] = 0
+
+    with spool(samples) as audio:
+        windows = list(audio.windows(window_seconds=10, search_seconds=4))
+
+    offsets = [offset for offset, _ in windows]
+    assert 16000 * 8 < offsets[1] < 16000 * 8 + 1600
+    np.testing.assert_array_equal(np.concatenate([window for _, window in windows]), samples / np.float32(32768))
+
+
+def test_transcribe_windowed_shifts_segments_and_reuses_language(monkeypatch):
+    model = WindowEchoASR()
+    progress = []
+
+    with spool(np.zeros(16000 * 25, dtype=np.int16)) as audio:
+        monkeypatch.setattr(audio, "windows", lambda: SpooledAudio.windows(audio, window_seconds=10))
+        output = model.transcribe_windowed(
+            audio, "transcribe", None, None, False, True, {"progress_callback": progress.append}, "json"
+        )
+
+    result = json.loads(output.getvalue())
+    assert [segment["start"] for segment in result["segments"]] == [0.0, 9.99, 19.98]
+    assert [segment["id"] for segment in result["segments"]] == [0, 1, 2]
+    assert result["segments"][2]["words"][0]["start"] == 19.98
+    assert result["text"] == "window window window"
+    assert model.languages == [None, "no", "no"]
+    assert progress[-1] == 1.0
+
+
+def test_shift_timestamps_copies_engine_segment_objects():
+    @dataclass
+    class Word:
+        start: float
+        end: float
+        word: str
+
+    @dataclass
+    class Segment:
+        id: int
+        start: float
+        end: float
+        text: str
+        words: list
+
+    segment = Segment(id=0, start=1.0, end=2.0, text=" hei", words=[Word(1.0, 1.5, " hei")])
+
+    shifted = ASRModel._shift_timestamps(segment, 10.0)
+
+    assert (shifted.start, shifted.end, shifted.words[0].start) == (11.0, 12.0, 11.0)
+    assert segment.start == 1.0 and segment.words[0].start == 1.0
+    assert ASRModel._renumber(shifted, 4).id == 4
+
+
+def test_closing_the_spool_mid_transcription_cancels_the_remaining_windows():
+    audio = spool(np.ones(16000 * 3, dtype=np.int16))
+    windows = audio.windows(window_seconds=1, search_seconds=0)
+
+    offset, first = next(windows)
+    audio.close()
+
+    assert offset == 0 and len(first) == 16000
+    with pytest.raises(TranscriptionCancelledError):
+        next(windows)
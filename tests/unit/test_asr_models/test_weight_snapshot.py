@@ -0,0 +1,40 @@
+import torch
+
+from app.asr_models.weight_snapshot import WeightSnapshot
+
+
+class TiedModel(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.embed = torch.nn.Embedding(10, 4)
+        self.proj = torch.nn.Linear(4, 10, bias=False)
+        self.proj.weight = self.embed.weight
+        self.norm = torch.nn.LayerNorm(4)
+        self.register_buffer("scale", torch.tensor(2.0), persistent=False)
+
+    def forward(self, tokens):
+        return self.proj(self.norm(self.embed(tokens)) * self.scale)
+
+
+def test_offload_frees_parameters_and_restore_brings_them_back(tmp_path):
+    torch.manual_seed(0)
+    model = TiedModel().eval()
+    tokens = torch.tensor([1, 2, 3])
+    with torch.no_grad():
+        expected = model(tokens)
+
+    snapshot = WeightSnapshot(model, str(tmp_path / "model.pt"))
+    snapshot.offload()
+    assert all(parameter.is_meta for parameter in model.parameters())
+    assert model.scale.item() == 2.0
+
+    snapshot.restore()
+    assert model.proj.weight is model.embed.weight
+    with torch.no_grad():
+        assert torch.equal(model(tokens), expected)
+
+    # Later offloads reuse the file
+    modified = (tmp_path / "model.pt").stat().st_mtime_ns
+    snapshot.offload()
+    snapshot.restore()
+    assert (tmp_path / "model.pt").stat().st_mtime_ns == modified
@@ -1,3 +1,4 @@
+import threading
 from unittest.mock import patch
 
 import pytest
@@ -20,3 +21,201 @@ async def test_detect_language_returns_expected_dict(mock_load_audio, asr_servic
     assert isinstance(result, dict)
     assert result["language_code"] == "en"
     assert result["confidence"] == 0.95
+
+
+@pytest.mark.asyncio
+@patch('app.services.asr_service.load_audio', return_value=[0.0, 0.1, 0.2])
+async def test_transcribe_audio_cancels_engine_when_client_disconnects(mock_load_audio, asr_service, mock_upload_file):
+    from unittest.mock import AsyncMock, Mock
+
+    from app.asr_models.asr_model import ASRModel
+    from app.exceptions import TranscriptionCancelledError
+
+    engine_started = threading.Event()
+    engine_stopped = threading.Event()
+
+    def slow_transcribe(audio, task, language, initial_prompt, vad_filter, word_timestamps, options, output):
+        # Simulate an engine that checks for cancellation between segments
+        engine_started.set()
+        options["cancel_event"].wait(timeout=2)
+        try:
+            ASRModel.raise_if_cancelled(options)
+        finally:
+            engine_stopped.set()
+
+    asr_service.asr_model.transcribe.side_effect = slow_transcribe
+    request = Mock()
+    # The client goes away once the engine is busy with its request
+    request.is_disconnected = AsyncMock(side_effect=lambda: engine_started.is_set())
+
+    with pytest.raises(TranscriptionCancelledError):
+        await asr_service.transcribe_audio(audio_file=mock_upload_file, request=request)
+
+    assert engine_stopped.wait(timeout=2)
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_share_one_transcription(mock_asr_model, mock_upload_file, tmp_path):
+    import asyncio
+    import json
+    from io import StringIO
+
+    import numpy as np
+
+    from app.cache import ResultCache
+    from app.services.asr_service import ASRService
+
+    engine_calls = []
+
+    def transcribe(audio, task, language, initial_prompt, vad_filter, word_timestamps, options, output):
+        engine_calls.append(output)
+        threading.Event().wait(0.2)
+        return StringIO(json.dumps({"text": "hei", "segments": []}))
+
+    mock_asr_model.transcribe.side_effect = transcribe
+    service = ASRService(mock_asr_model, cache=ResultCache(memory_bytes=1024, directory=str(tmp_path), disk_bytes=0))
+
+    with patch('app.services.asr_service.load_audio', return_value=np.zeros(16000, dtype=np.float32)):
+        await asyncio.gather(
+            service.transcribe_audio(audio_file=mock_upload_file, output="json"),
+            service.transcribe_audio(audio_file=mock_upload_file, output="json"),
+        )
+        await service.transcribe_audio(audio_file=mock_upload_file, output="json")
+
+    assert engine_calls == ["json"]
+    assert service.cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+@patch('app.services.asr_service.load_audio', return_value=[0.0, 0.1, 0.2])
+async def test_several_outputs_run_the_model_once(mock_load_audio, asr_service, mock_upload_file):
+    import json
+    from io import StringIO
+
+    asr_service.asr_model.transcribe.return_value = StringIO(json.dumps({"text": "hei", "segments": []}))
+
+    response = await asr_service.transcribe_audio(audio_file=mock_upload_file, output=["srt", "json"])
+
+    assert response.media_type == "application/zip"
+    assert response.headers["Content-Disposition"] == 'attachment; filename="test_audio.wav.zip"'
+    assert asr_service.asr_model.transcribe.call_count == 1
+    assert asr_service.asr_model.transcribe.call_args.args[-1] == "json"
+
+
+@pytest.mark.asyncio
+@patch('app.services.asr_service.load_audio', return_value=[0.0, 0.1, 0.2])
+async def test_stream_sends_segments_as_they_are_decoded(mock_load_audio, asr_service, mock_upload_file):
+    import json
+
+    second_segment_allowed = threading.Event()
+
+    def transcribe_stream(audio, task, language, initial_prompt, vad_filter, word_timestamps, options):
+        yield {"start": 0.0, "end": 1.0, "text": " hei"}
+        second_segment_allowed.wait(timeout=2)
+        yield {"start": 1.0, "end": 2.5, "text": " på deg"}
+
+    asr_service.asr_model.transcribe_stream.side_effect = transcribe_stream
+
+    response = await asr_service.transcribe_audio(audio_file=mock_upload_file, output="srt", stream="ndjson")
+    events = []
+    async for line in response.body_iterator:
+        events.append(json.loads(line))
+        # The first segment arrives while the engine is still decoding the second one
+        second_segment_allowed.set()
+
+    assert response.media_type == "application/x-ndjson"
+    assert [event["type"] for event in events] == ["segment", "segment", "done"]
+    assert events[1]["text"] == " på deg"
+    assert "".join(event["content"] for event in events) == (
+        "1\n00:00:00,000 --> 00:00:01,000\nhei\n\n2\n00:00:01,000 --> 00:00:02,500\npå deg\n\n"
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("output", ["srt", "vtt"])
+@pytest.mark.parametrize(
+    "writer_options",
+    [
+        {"max_line_width": 1000, "max_line_count": 10, "highlight_words": False},
+        {"max_line_width": 12, "max_line_count": 2, "highlight_words": True},
+    ],
+)
+@patch('app.services.asr_service.load_audio', return_value=[0.0, 0.1, 0.2])
+async def test_streamed_subtitles_match_the_regular_output(
+    mock_load_audio, asr_service, mock_upload_file, output, writer_options
+):
+    import json
+
+    from app.output.result_writers import get_writer
+
+    def words(*timings):
+        return [{"word": f" {word}", "start": start, "end": start + 0.4} for word, start in timings]
+
+    segments = [
+        {"start": 0.0, "end": 1.0, "text": " God morgen", "words": words(("God", 0.0), ("morgen", 0.5))},
+        {"start": 1.0, "end": 2.0, "text": " alle sammen.", "words": words(("alle", 1.0), ("sammen.", 1.5))},
+        # A long pause starts a new cue when lines are wrapped
+        {"start": 6.0, "end": 7.0, "text": " Velkommen hit.", "words": words(("Velkommen", 6.0), ("hit.", 6.5))},
+    ]
+    asr_service.asr_model.writer_options = writer_options
+    asr_service.asr_model.transcribe_stream.side_effect = lambda *args: iter(segments)
+
+    response = await asr_service.transcribe_audio(
+        audio_file=mock_upload_file, output=output, word_timestamps=True, stream="ndjson"
+    )
+    events = [json.loads(line) async for line in response.body_iterator]
+
+    expected = get_writer(output, **writer_options).render({"language": "no", "segments": segments})
+    assert "".join(event["content"] for event in events) == expected
+
+
+@pytest.mark.asyncio
+@patch('app.services.asr_service.load_audio', return_value=[0.0, 0.1, 0.2])
+async def test_closing_a_stream_cancels_the_engine(mock_load_audio, asr_service, mock_upload_file):
+    from app.asr_models.asr_model import ASRModel
+
+    engine_stopped = threading.Event()
+
+    def transcribe_stream(audio, task, language, initial_prompt, vad_filter, word_timestamps, options):
+        try:
+            while True:
+                yield {"start": 0.0, "end": 1.0, "text": " hei"}
+                options["cancel_event"].wait(timeout=0.05)
+                ASRModel.raise_if_cancelled(options)
+        finally:
+            engine_stopped.set()
+
+    asr_service.asr_model.transcribe_stream.side_effect = transcribe_stream
+
+    response = await asr_service.transcribe_audio(audio_file=mock_upload_file, stream="sse")
+    body = response.body_iterator
+    assert (await body.__anext__()).startswith("event: segment\n")
+    await body.aclose()
+
+    assert engine_stopped.wait(timeout=2)
+
+
+@pytest.mark.asyncio
+@patch('app.services.asr_service.load_audio', return_value=[0.0, 0.1, 0.2])
+async def test_requests_run_on_the_selected_model(mock_load_audio, mock_upload_file):
+    from unittest.mock import Mock
+
+    from app.asr_models.asr_model import ASRModel
+    from app.exceptions import UnsupportedModelError
+    from app.services.asr_service import ASRService
+
+    small = Mock(spec=ASRModel)
+    small.language_detection.return_value = ("no", 0.9)
+    registry = Mock(spec=ASRModel)
+    registry.pin.side_effect = lambda name=None: name
+    registry.select.side_effect = lambda name=None: small if name == "small" else registry
+    service = ASRService(registry)
+
+    result = await service.detect_language(audio_file=mock_upload_file, model="small")
+    assert result["language_code"] == "no"
+    registry.language_detection.assert_not_called()
+    registry.unpin.assert_called_once_with("small")
+
+    registry.pin.side_effect = UnsupportedModelError("Unsupported model: tiny")
+    with pytest.raises(UnsupportedModelError):
+        await service.transcribe_audio(audio_file=mock_upload_file, model="tiny")
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from app.audio.ring_buffer import AudioRingBuffer
+
+
+def pcm(*samples) -> bytes:
+    return np.array(samples, dtype=np.int16).tobytes()
+
+
+def test_windows_are_contiguous_views_across_the_wrap():
+    buffer = AudioRingBuffer(capacity=4)
+    buffer.write(pcm(1, 2, 3))
+    buffer.write(pcm(4, 5))
+
+    window = buffer.window(2, 5)
+
+    assert (window * 32768).tolist() == [3, 4, 5]
+    assert np.shares_memory(window, buffer._data)
+    assert buffer.oldest == 1 and buffer.holds(1) and not buffer.holds(0)
+
+
+def test_odd_frames_are_joined_and_large_frames_keep_the_tail():
+    buffer = AudioRingBuffer(capacity=3)
+    data = pcm(-32768, 16384, 7, 8, 9)
+    buffer.write(data[:3])
+    buffer.write(data[3:])
+
+    assert buffer.written == 5
+    assert (buffer.window(2, 5) * 32768).tolist() == [7, 8, 9]
+    with pytest.raises(ValueError):
+        buffer.window(1, 5)
@@ -0,0 +1,56 @@
+import asyncio
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+from app.audio.stream_decoder import StreamDecoder
+
+requires_ffmpeg = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg CLI not installed")
+
+
+def encode_flac(seconds: float) -> bytes:
+    command = ["ffmpeg", "-loglevel", "error", "-t", str(seconds), "-i", "audio/king_16k.wav", "-f", "flac", "-"]
+    return subprocess.run(command, capture_output=True, check=True).stdout
+
+
+async def decode(decoder: StreamDecoder, data: bytes, frame_size: int) -> bytes:
+    await decoder.start()
+    decoded = []
+
+    async def read():
+        async for pcm in decoder.pcm():
+            decoded.append(pcm)
+
+    reader = asyncio.ensure_future(read())
+    try:
+        for start in range(0, len(data), frame_size):
+            await decoder.write(data[start : start + frame_size])
+        decoder.finish()
+        await reader
+    finally:
+        await decoder.close()
+    return b"".join(decoded)
+
+
+@requires_ffmpeg
+@pytest.mark.asyncio
+async def test_one_decoder_process_serves_the_whole_stream():
+    pcm = await decode(StreamDecoder("flac"), encode_flac(2), frame_size=1000)
+
+    audio = np.frombuffer(pcm, dtype=np.int16)
+    assert len(audio) == 2 * 16000
+    assert np.abs(audio).max() > 1000
+
+
+@requires_ffmpeg
+@pytest.mark.asyncio
+async def test_invalid_streams_report_the_ffmpeg_error():
+    with pytest.raises(RuntimeError, match="Failed to decode audio"):
+        await decode(StreamDecoder("ogg"), b"not audio" * 100, frame_size=100)
+
+
+def test_unknown_formats_are_rejected():
+    with pytest.raises(ValueError, match="Invalid audio format 'mp3'"):
+        StreamDecoder("mp3")
@@ -1,11 +1,18 @@
+import subprocess
+import sys
+
 import pytest
 
 from app.asr_models.faster_whisper_engine import FasterWhisperASR
 from app.asr_models.mbain_whisperx_engine import WhisperXASR
+from app.asr_models.model_registry import ModelRegistry
+from app.asr_models.nbailab_whisper_engine import NbAiLabWhisperASR
 from app.asr_models.openai_whisper_engine import OpenAIWhisperASR
+from app.asr_models.replica_pool import ModelReplicaPool
 from app.config import CONFIG
 from app.exceptions import UnsupportedEngineError
-from app.factory.asr_model_factory import ASRModelFactory, NbAiLabWhisperASR
+from app.factory.asr_model_factory import ASRModelFactory
+from app.languages import LANGUAGES
 
 
 def test_factory_returns_openai_whisper(monkeypatch):
@@ -36,3 +43,40 @@ def test_factory_raises_on_invalid_engine(monkeypatch):
     monkeypatch.setattr(CONFIG, "ASR_ENGINE", "invalid_engine")
     with pytest.raises(UnsupportedEngineError):
         ASRModelFactory.create_asr_model()
+
+
+def test_factory_returns_replica_pool(monkeypatch):
+    monkeypatch.setattr(CONFIG, "ASR_ENGINE", "faster_whisper")
+    monkeypatch.setattr(CONFIG, "MODEL_REPLICAS", 2)
+    monkeypatch.setattr(CONFIG, "MODEL_REPLICA_THREADS", 3)
+    model = ASRModelFactory.create_asr_model()
+    assert isinstance(model, ModelReplicaPool)
+    assert all(isinstance(replica, FasterWhisperASR) for replica in model.replicas)
+    assert all(replica.cpu_threads == 3 for replica in model.replicas)
+    assert model.replicas[0].model_lock is not model.replicas[1].model_lock
+
+
+def test_factory_returns_model_registry(monkeypatch):
+    monkeypatch.setattr(CONFIG, "ASR_ENGINE", "faster_whisper")
+    monkeypatch.setattr(CONFIG, "ASR_MODELS", ["small", "base"])
+    model = ASRModelFactory.create_asr_model()
+    assert isinstance(model, ModelRegistry)
+    assert model.model_names == [CONFIG.MODEL_NAME, "small", "base"]
+    # Created on first use, each with its own model name
+    engine = model.model_factory("small")
+    assert isinstance(engine, FasterWhisperASR)
+    assert engine.model_name == "small"
+
+
+def test_config_and_factory_import_no_engine_framework():
+    code = (
+        "import sys, app.config, app.factory.asr_model_factory, app.languages; "
+        "print(sorted({'torch', 'transformers', 'whisper', 'whisperx', 'faster_whisper'} & set(sys.modules)))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
+
+
+def test_vendored_language_codes_match_whisper():
+    tokenizer = pytest.importorskip("whisper.tokenizer")
+    assert LANGUAGES == tokenizer.LANGUAGES
@@ -0,0 +1,131 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.asr_models.priority_lock import PriorityLock
+from app.exceptions import ServiceOverloadedError
+from app.services.inference_executor import LANE_BATCH, LANE_LIVE, InferenceExecutor
+
+
+@pytest.mark.asyncio
+async def test_run_returns_result_from_worker_thread():
+    executor = InferenceExecutor(max_workers=1)
+    thread_name = await executor.run(lambda: threading.current_thread().name)
+    assert thread_name.startswith("asr-worker")
+    stats = executor.stats()
+    assert (stats["workers"], stats["running"], stats["queued"]) == (1, 0, 0)
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_queue_depth_counts_waiting_calls():
+    executor = InferenceExecutor(max_workers=1)
+    release = threading.Event()
+
+    busy = asyncio.ensure_future(executor.run(release.wait))
+    waiting = asyncio.ensure_future(executor.run(lambda: "done"))
+    await asyncio.sleep(0.05)
+
+    assert executor.stats()["running"] == 1
+    assert executor.queue_depth == 1
+
+    release.set()
+    assert await waiting == "done"
+    await busy
+    assert executor.queue_depth == 0
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_live_lane_is_served_first_with_weighting():
+    executor = InferenceExecutor(max_workers=1, live_weight=2)
+    release = threading.Event()
+    order = []
+
+    busy = asyncio.ensure_future(executor.run(release.wait))
+    await asyncio.sleep(0.05)
+    tasks = [asyncio.ensure_future(executor.run(order.append, "batch-1", lane=LANE_BATCH))]
+    tasks += [asyncio.ensure_future(executor.run(order.append, f"live-{i}", lane=LANE_LIVE)) for i in range(3)]
+    await asyncio.sleep(0.05)
+
+    release.set()
+    await asyncio.gather(busy, *tasks)
+    assert order == ["live-0", "live-1", "batch-1", "live-2"]
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_live_call_overtakes_batch_calls_waiting_for_the_model():
+    executor = InferenceExecutor(max_workers=4)
+    model_lock = PriorityLock(weight=4)
+    order = []
+
+    def transcribe(name):
+        with model_lock:
+            order.append(name)
+
+    async def wait_for_waiters(count):
+        while model_lock.waiting < count:
+            await asyncio.sleep(0.01)
+
+    model_lock.acquire()
+    tasks = [asyncio.ensure_future(executor.run(transcribe, f"batch-{i}", lane=LANE_BATCH)) for i in range(2)]
+    await wait_for_waiters(2)
+    tasks.append(asyncio.ensure_future(executor.run(transcribe, "live", lane=LANE_LIVE)))
+    await wait_for_waiters(3)
+
+    model_lock.release()
+    await asyncio.gather(*tasks)
+    assert order == ["live", "batch-0", "batch-1"]
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_live_call_gets_a_worker_while_batch_calls_wait_for_the_model():
+    executor = InferenceExecutor(max_workers=4)
+    model_lock = PriorityLock(weight=4)
+    order = []
+
+    def transcribe(name):
+        with model_lock:
+            order.append(name)
+
+    async def wait_for_waiters(count):
+        while model_lock.waiting < count:
+            await asyncio.sleep(0.01)
+
+    # One replica, and more uploads than workers, all blocked on the model
+    model_lock.acquire()
+    tasks = [asyncio.ensure_future(executor.run(transcribe, f"batch-{i}", lane=LANE_BATCH)) for i in range(4)]
+    await wait_for_waiters(3)
+    await asyncio.sleep(0.05)
+    assert model_lock.waiting == 3
+    assert executor.stats()["queued"] == 1
+
+    tasks.append(asyncio.ensure_future(executor.run(transcribe, "live", lane=LANE_LIVE)))
+    await asyncio.wait_for(wait_for_waiters(4), timeout=1)
+
+    model_lock.release()
+    await asyncio.gather(*tasks)
+    assert order == ["live", "batch-0", "batch-1", "batch-2", "batch-3"]
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_admission_rejects_requests_over_the_limit():
+    executor = InferenceExecutor(max_workers=1, max_pending=1)
+
+    async with executor.admit(LANE_BATCH):
+        with pytest.raises(ServiceOverloadedError) as excinfo:
+            async with executor.admit(LANE_BATCH):
+                pass
+        # The live lane has its own limit
+        async with executor.admit(LANE_LIVE):
+            pass
+
+    assert excinfo.value.retry_after >= 1
+    assert executor.stats()["lanes"][LANE_BATCH]["rejected"] == 1
+    async with executor.admit(LANE_BATCH):
+        pass
+    executor.shutdown()
@@ -0,0 +1,103 @@
+import os
+import time
+from io import BytesIO, StringIO
+from unittest.mock import Mock, patch
+
+import pytest
+from fastapi import UploadFile
+
+from app.jobs import JobStore, JobWorker
+from app.jobs.job_store import JOB_COMPLETED, JOB_FAILED, JOB_QUEUED, JOB_RUNNING
+from app.services.job_service import JobService
+
+
+@pytest.fixture
+def job_store(tmp_path):
+    store = JobStore(str(tmp_path))
+    yield store
+    store.close()
+
+
+def queue_job(store, params=None):
+    job_id = store.new_job_id()
+    with open(store.audio_path(job_id), "wb") as f:
+        f.write(b"\x00\x00" * 16)
+    return store.create(job_id, "podcast.mp3", params or {"task": "transcribe"})
+
+
+def test_claim_next_returns_oldest_queued_job(job_store):
+    first = queue_job(job_store)
+    queue_job(job_store)
+
+    claimed = job_store.claim_next()
+
+    assert claimed.id == first.id
+    assert claimed.status == JOB_RUNNING
+    assert job_store.get(first.id).status == JOB_RUNNING
+
+
+def test_interrupted_jobs_are_requeued(tmp_path):
+    store = JobStore(str(tmp_path))
+    job = queue_job(store)
+    store.claim_next()
+    store.close()
+
+    reopened = JobStore(str(tmp_path))
+    assert reopened.requeue_interrupted() == 1
+    assert reopened.get(job.id).status == JOB_QUEUED
+    reopened.close()
+
+
+def wait_for_status(store, job_id, status, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = store.get(job_id)
+        if job.status == status:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job did not reach {status}")
+
+
+@patch("app.jobs.job_worker.load_audio", return_value=[0.0, 0.1])
+def test_worker_stores_json_result_and_removes_audio(mock_load_audio, job_store, mock_asr_model):
+    mock_asr_model.transcribe.return_value = StringIO('{"text": "hei", "segments": []}')
+    job = queue_job(job_store, {"task": "transcribe", "language": "no"})
+    worker = JobWorker(job_store, mock_asr_model, workers=1)
+    worker.start()
+
+    done = wait_for_status(job_store, job.id, JOB_COMPLETED)
+    worker.stop()
+
+    assert done.result == '{"text": "hei", "segments": []}'
+    assert done.progress == 1.0
+    args = mock_asr_model.transcribe.call_args.args
+    assert args[2] == "no"
+    assert args[-1] == "json"
+    assert not os.path.exists(job.audio_path)
+
+
+@patch("app.jobs.job_worker.load_audio", side_effect=RuntimeError("bad audio"))
+def test_worker_records_failures(mock_load_audio, job_store, mock_asr_model):
+    job = queue_job(job_store)
+    worker = JobWorker(job_store, mock_asr_model, workers=1)
+    worker.start()
+
+    failed = wait_for_status(job_store, job.id, JOB_FAILED)
+    worker.stop()
+
+    assert failed.error == "bad audio"
+
+
+@pytest.mark.asyncio
+async def test_submit_and_poll_run_outside_the_inference_executor(job_store, mock_asr_model):
+    service = JobService(job_store, Mock(spec=JobWorker), mock_asr_model)
+
+    # Polling must not queue behind transcriptions that occupy every inference worker
+    with patch("app.services.inference_executor.InferenceExecutor.run", side_effect=AssertionError("executor used")):
+        status = await service.submit(UploadFile(BytesIO(b"\x00\x00" * 16), filename="podcast.mp3"))
+        polled = await service.get_status(status["id"])
+
+    assert polled["status"] == JOB_QUEUED
+    with open(job_store.audio_path(status["id"]), "rb") as f:
+        assert f.read() == b"\x00\x00" * 16
+    service.worker.notify.assert_called_once()
@@ -0,0 +1,195 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.asr_models.priority_lock import PRIORITY_LIVE, call_priority
+from app.nbailab_whisper.batching import MAX_BATCHED_SAMPLES, BatchScheduler
+
+
+class FakePipeline:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, audio, **kwargs):
+        self.calls.append((audio, kwargs))
+        if isinstance(audio, list):
+            return [{"text": f"len={len(item)}"} for item in audio]
+        return {"text": f"len={len(audio)}"}
+
+
+def run_concurrently(scheduler, inputs, **kwargs):
+    results = [None] * len(inputs)
+
+    def worker(index):
+        results[index] = scheduler(inputs[index], **kwargs)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(inputs))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    return results
+
+
+def test_concurrent_calls_share_one_forward_pass():
+    pipe = FakePipeline()
+    scheduler = BatchScheduler(pipe, max_batch_size=8, window_ms=200)
+    inputs = [np.zeros(n, dtype=np.float32) for n in (100, 200, 300)]
+
+    results = run_concurrently(scheduler, inputs, return_timestamps=True)
+
+    assert [r["text"] for r in results] == ["len=100", "len=200", "len=300"]
+    assert len(pipe.calls) == 1
+    assert pipe.calls[0][1] == {"batch_size": 3, "return_timestamps": True}
+    scheduler.close()
+
+
+def test_batch_size_is_capped():
+    pipe = FakePipeline()
+    scheduler = BatchScheduler(pipe, max_batch_size=2, window_ms=200)
+    inputs = [np.zeros(10, dtype=np.float32) for _ in range(4)]
+
+    run_concurrently(scheduler, inputs)
+
+    assert all(isinstance(audio, list) and len(audio) <= 2 for audio, _ in pipe.calls)
+    scheduler.close()
+
+
+def test_long_inputs_run_on_their_own():
+    pipe = FakePipeline()
+    scheduler = BatchScheduler(pipe, max_batch_size=8, window_ms=200)
+    inputs = [np.zeros(MAX_BATCHED_SAMPLES + 1, dtype=np.float32), np.zeros(10, dtype=np.float32)]
+
+    results = run_concurrently(scheduler, inputs)
+
+    assert results[0]["text"] == f"len={MAX_BATCHED_SAMPLES + 1}"
+    assert len(pipe.calls) == 2
+    scheduler.close()
+
+
+def test_pipeline_errors_reach_every_caller():
+    def failing_pipeline(audio, **kwargs):
+        raise RuntimeError("boom")
+
+    scheduler = BatchScheduler(failing_pipeline, max_batch_size=4, window_ms=0)
+    with pytest.raises(RuntimeError, match="boom"):
+        scheduler(np.zeros(10, dtype=np.float32))
+    scheduler.close()
+
+
+def test_prebatched_inputs_share_one_forward_pass():
+    pipe = FakePipeline()
+    scheduler = BatchScheduler(pipe, max_batch_size=8, window_ms=0)
+
+    results = scheduler.batch([np.zeros(n, dtype=np.float32) for n in (10, 20)], return_timestamps="word")
+
+    assert [r["text"] for r in results] == ["len=10", "len=20"]
+    assert pipe.calls[0][1] == {"batch_size": 2, "return_timestamps": "word"}
+    scheduler.close()
+
+
+def test_unhashable_options_are_batched_together():
+    pipe = FakePipeline()
+    scheduler = BatchScheduler(pipe, max_batch_size=8, window_ms=200)
+    inputs = [np.zeros(n, dtype=np.float32) for n in (10, 20)]
+
+    results = run_concurrently(scheduler, inputs, generate_kwargs={"language": "no", "suppress_tokens": [1, 2]})
+
+    assert [r["text"] for r in results] == ["len=10", "len=20"]
+    assert len(pipe.calls) == 1
+    scheduler.close()
+
+
+def test_bad_call_fails_only_its_own_caller():
+    pipe = FakePipeline()
+    scheduler = BatchScheduler(pipe, max_batch_size=8, window_ms=200)
+    outcomes = {}
+
+    def worker(name, audio):
+        try:
+            outcomes[name] = scheduler(audio)
+        except Exception as e:
+            outcomes[name] = e
+
+    threads = [
+        threading.Thread(target=worker, args=("bad", object())),
+        threading.Thread(target=worker, args=("good", np.zeros(10, dtype=np.float32))),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert isinstance(outcomes["bad"], TypeError)
+    assert outcomes["good"] == {"text": "len=10"}
+    assert scheduler(np.zeros(20, dtype=np.float32)) == {"text": "len=20"}
+    scheduler.close()
+
+
+def test_mismatched_results_fail_the_batch_and_keep_the_thread_alive():
+    pipe = FakePipeline()
+    scheduler = BatchScheduler(lambda audio, **kwargs: [] if isinstance(audio, list) else pipe(audio), window_ms=0)
+
+    with pytest.raises(RuntimeError, match="0 results for a batch of 2"):
+        scheduler.batch([np.zeros(10, dtype=np.float32), np.zeros(20, dtype=np.float32)])
+    assert scheduler(np.zeros(30, dtype=np.float32)) == {"text": "len=30"}
+    scheduler.close()
+
+
+def test_live_calls_run_before_queued_uploads():
+    release = threading.Event()
+    order = []
+
+    def pipeline(audio, **kwargs):
+        order.append(len(audio))
+        if len(audio) == 1:
+            release.wait(timeout=5)
+        return {"text": f"len={len(audio)}"}
+
+    scheduler = BatchScheduler(pipeline, window_ms=0, live_weight=2)
+
+    def call(size, priority=None):
+        if priority is None:
+            scheduler(np.zeros(size, dtype=np.float32))
+        else:
+            with call_priority(priority):
+                scheduler(np.zeros(size, dtype=np.float32))
+
+    # The first upload holds the scheduler thread while the others queue up behind it
+    threads = [threading.Thread(target=call, args=(1,))]
+    threads[0].start()
+    while not order:
+        time.sleep(0.01)
+    threads += [threading.Thread(target=call, args=(size,)) for size in (2, 3)]
+    threads += [threading.Thread(target=call, args=(size, PRIORITY_LIVE)) for size in (10, 20, 30)]
+    for thread in threads[1:]:
+        thread.start()
+        time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    # Live chunks go first, but the oldest upload gets its turn after live_weight of them
+    assert order == [1, 10, 20, 2, 30, 3]
+    scheduler.close()
+
+
+def test_live_calls_run_first_within_a_collected_batch():
+    pipe = FakePipeline()
+    scheduler = BatchScheduler(pipe, window_ms=200)
+
+    def worker(size, priority):
+        with call_priority(priority):
+            scheduler(np.zeros(size, dtype=np.float32), language=str(size))
+
+    threads = [threading.Thread(target=worker, args=(10, 1)), threading.Thread(target=worker, args=(20, PRIORITY_LIVE))]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert [kwargs["language"] for _, kwargs in pipe.calls] == ["20", "10"]
+    scheduler.close()
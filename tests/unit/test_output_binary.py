@@ -0,0 +1,104 @@
+import gzip
+import io
+import json
+
+import msgpack
+import numpy as np
+import pytest
+
+from app.config import CONFIG
+from app.output import pack_transcript, render_result, unpack_transcript
+from app.services.responses import negotiate_encoding, transcript_response
+
+RESULT = {
+    "language": "en",
+    "text": " Hello there. General Kenobi",
+    "segments": [
+        {
+            "id": 0,
+            "start": 0.0,
+            "end": 1.2,
+            "text": " Hello there.",
+            "tokens": [50364, 2425, 456],
+            "avg_logprob": -0.25,
+            "words": [
+                {"word": " Hello", "start": 0.0, "end": 0.5, "probability": 0.875},
+                {"word": " there.", "start": 0.6, "end": 1.2, "probability": 0.5},
+            ],
+        },
+        {
+            "id": 1,
+            "start": 5.0,
+            "end": 7.5,
+            "text": " General Kenobi",
+            "tokens": [3910, 591],
+            "avg_logprob": -0.5,
+            "speaker": "SPEAKER_01",
+            # whisperx leaves words it could not align without timestamps
+            "words": [{"word": "General", "start": 5.0, "end": 5.6, "score": 0.25}, {"word": "Kenobi"}],
+        },
+    ],
+}
+
+
+def test_pack_transcript_stores_columns():
+    packed = msgpack.unpackb(pack_transcript(RESULT), raw=False)
+
+    assert np.frombuffer(packed["segments"]["start_ms"], dtype="<i4").tolist() == [0, 5000]
+    assert np.frombuffer(packed["segments"]["word_offsets"], dtype="<u4").tolist() == [0, 2, 4]
+    assert np.frombuffer(packed["segments"]["token_offsets"], dtype="<u4").tolist() == [0, 3, 5]
+    assert packed["segments"]["speaker"] == [None, "SPEAKER_01"]
+    assert np.frombuffer(packed["words"]["end_ms"], dtype="<i4").tolist() == [500, 1200, 5600, -1]
+    assert packed["words"]["word"] == [" Hello", " there.", "General", "Kenobi"]
+    assert "no_speech_prob" not in packed["segments"]
+
+
+def test_unpack_transcript_restores_the_json_layout():
+    restored = unpack_transcript(pack_transcript(RESULT))
+
+    assert restored["language"] == "en"
+    assert restored["segments"][0]["words"] == RESULT["segments"][0]["words"]
+    assert restored["segments"][0]["tokens"] == [50364, 2425, 456]
+    assert restored["segments"][1]["speaker"] == "SPEAKER_01"
+    assert restored["segments"][1]["words"] == [
+        {"word": "General", "start": 5.0, "end": 5.6, "probability": 0.25},
+        {"word": "Kenobi"},
+    ]
+
+
+def test_render_result_packs_binary_formats():
+    rendered = render_result(None, json.dumps(RESULT), "msgpack")
+
+    assert isinstance(rendered, io.BytesIO)
+    assert unpack_transcript(rendered.getvalue())["text"] == RESULT["text"]
+
+
+@pytest.mark.parametrize("header, expected", [("gzip, deflate", "gzip"), ("identity", None), ("br;q=0, gzip", "gzip")])
+def test_negotiate_encoding(header, expected):
+    assert negotiate_encoding(header) == expected
+
+
+def test_negotiate_encoding_prefers_brotli():
+    assert negotiate_encoding("gzip, br") == "br"
+    assert negotiate_encoding("gzip;q=0, *") == "br"
+
+
+def test_transcript_response_compresses_large_transcripts(monkeypatch):
+    monkeypatch.setattr(CONFIG, "RESPONSE_COMPRESSION_MIN_BYTES", 100)
+    content = "Hello there.\n" * 100
+
+    response = transcript_response(io.StringIO(content), "meeting", ["txt"], "gzip")
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(response.body).decode() == content
+
+    small = transcript_response(io.StringIO("Hello"), "meeting", ["txt"], "gzip")
+    assert "content-encoding" not in small.headers
+    assert small.body == b"Hello"
+
+
+def test_transcript_response_sets_binary_media_type():
+    response = transcript_response(io.BytesIO(pack_transcript(RESULT)), "meeting", ["msgpack"])
+
+    assert response.media_type == "application/vnd.msgpack"
+    assert response.headers["content-disposition"] == 'attachment; filename="meeting.msgpack"'
@@ -0,0 +1,52 @@
+import io
+import json
+import zipfile
+from unittest.mock import Mock
+
+import pytest
+
+from app.asr_models.asr_model import ASRModel
+from app.exceptions import InvalidTranscriptError, UnsupportedOutputError
+from app.output import bundle_results, normalize_outputs, render_result
+
+TRANSCRIPT = json.dumps({"text": " hei", "segments": [{"start": 0.0, "end": 1.5, "text": " hei"}]})
+
+
+@pytest.fixture
+def writer_model():
+    model = Mock(spec=ASRModel)
+    model.write_result.side_effect = lambda result, file, output: file.write(f"{output}:{result['text']}")
+    return model
+
+
+def test_normalize_outputs_accepts_repeated_and_comma_separated_values():
+    assert normalize_outputs(None) == ["txt"]
+    assert normalize_outputs("srt") == ["srt"]
+    assert normalize_outputs(["srt", "vtt,JSON", "srt"]) == ["srt", "vtt", "json"]
+
+
+def test_normalize_outputs_rejects_unknown_formats():
+    with pytest.raises(UnsupportedOutputError, match="docx"):
+        normalize_outputs(["srt", "docx"])
+
+
+def test_render_result_passes_json_through(writer_model):
+    assert render_result(writer_model, TRANSCRIPT, "json").getvalue() == TRANSCRIPT
+    assert render_result(writer_model, TRANSCRIPT, "srt").getvalue() == "srt: hei"
+    writer_model.write_result.assert_called_once()
+
+
+def test_bundle_results_zips_one_file_per_format(writer_model):
+    archive = zipfile.ZipFile(bundle_results(writer_model, TRANSCRIPT, ["srt", "vtt", "json"], "meeting"))
+
+    assert archive.namelist() == ["meeting.srt", "meeting.vtt", "meeting.json"]
+    assert archive.read("meeting.vtt").decode() == "vtt: hei"
+    assert archive.read("meeting.json").decode() == TRANSCRIPT
+
+
+@pytest.mark.asyncio
+async def test_convert_transcript_rejects_invalid_json(asr_service, mock_upload_file):
+    mock_upload_file.file = io.BytesIO(b"not json")
+
+    with pytest.raises(InvalidTranscriptError):
+        await asr_service.convert_transcript(mock_upload_file, ["srt"])
@@ -0,0 +1,53 @@
+import os
+
+import numpy as np
+
+from app.cache import ResultCache
+
+
+def test_key_depends_on_audio_and_parameters():
+    audio = np.zeros(16000, dtype=np.float32)
+    key = ResultCache.key(audio, {"task": "transcribe", "language": None})
+
+    assert key == ResultCache.key(audio.copy(), {"language": None, "task": "transcribe"})
+    assert key != ResultCache.key(audio, {"task": "translate", "language": None})
+    assert key != ResultCache.key(audio + 0.5, {"task": "transcribe", "language": None})
+
+
+def test_memory_tier_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(memory_bytes=10, directory=str(tmp_path), disk_bytes=0)
+    cache.put("a", "aaaa")
+    cache.put("b", "bbbb")
+    assert cache.get("a") == "aaaa"
+
+    cache.put("c", "cccc")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa"
+    assert cache.get("c") == "cccc"
+    assert cache.stats()["memory_bytes"] == 8
+
+
+def test_disk_tier_survives_restart_and_is_bounded(tmp_path):
+    cache = ResultCache(memory_bytes=0, directory=str(tmp_path), disk_bytes=25)
+    cache.put("aa01", "x" * 10)
+    cache.put("aa02", "y" * 10)
+    os.utime(tmp_path / "aa" / "aa01.json", (0, 0))
+
+    cache.put("aa03", "z" * 10)
+
+    restarted = ResultCache(memory_bytes=100, directory=str(tmp_path), disk_bytes=25)
+    assert restarted.get("aa01") is None
+    assert restarted.get("aa02") == "y" * 10
+    assert restarted.get("aa03") == "z" * 10
+    assert restarted.stats()["hits"] == 2
+
+
+def test_storing_a_result_again_does_not_count_it_twice(tmp_path):
+    cache = ResultCache(memory_bytes=0, directory=str(tmp_path), disk_bytes=100)
+    cache.put("aa01", "x" * 10)
+    for _ in range(5):
+        cache.put("aa02", "y" * 10)
+
+    assert cache._disk_used == 20
+    assert cache.get("aa02") == "y" * 10
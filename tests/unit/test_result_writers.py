@@ -0,0 +1,124 @@
+import io
+import json
+from dataclasses import asdict
+
+import pytest
+
+from app.output.result_writers import WRITERS, get_writer
+
+
+def _words(*timings, lead_space=True):
+    return [
+        {"word": (" " if lead_space else "") + word, "start": start, "end": end, "probability": 0.9}
+        for word, start, end in timings
+    ]
+
+
+RESULT = {
+    "language": "en",
+    "text": " Hello there. General Kenobi --> you are",
+    "segments": [
+        {
+            "id": 0,
+            "start": 0.0,
+            "end": 1.2,
+            "text": " Hello there.",
+            "words": _words(("Hello", 0.0, 0.5), ("there.", 0.6, 1.2)),
+        },
+        {
+            "id": 1,
+            "start": 5.0,
+            "end": 7.5,
+            "text": " General Kenobi --> you are",
+            "words": _words(("General", 5.0, 5.6), ("Kenobi", 5.7, 6.4), ("you", 6.5, 7.0), ("are", 7.1, 7.5)),
+        },
+    ],
+}
+
+
+def _render(writer, result, **kwargs):
+    file = io.StringIO()
+    writer.write_result(result, file=file, **kwargs)
+    return file.getvalue()
+
+
+@pytest.mark.parametrize("output", ["txt", "vtt", "srt", "tsv"])
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"max_line_width": 1000, "max_line_count": 10, "highlight_words": False},
+        {"max_line_width": 12, "max_line_count": 1, "highlight_words": True},
+    ],
+)
+def test_writers_match_whisper_output(output, options):
+    whisper_utils = pytest.importorskip("whisper.utils")
+
+    expected = _render(whisper_utils.get_writer(output, ""), RESULT, options=options)
+
+    assert get_writer(output, **options).render(RESULT) == expected
+
+
+@pytest.mark.parametrize("output", ["txt", "vtt", "srt"])
+def test_writers_match_whisperx_output_with_speakers(output):
+    whisperx_utils = pytest.importorskip("whisperx.utils")
+    options = {"max_line_width": 1000, "max_line_count": 2, "highlight_words": False}
+    segments = [
+        {
+            **segment,
+            "words": _words(*[(w["word"].strip(), w["start"], w["end"]) for w in segment["words"]], lead_space=False),
+        }
+        for segment in RESULT["segments"]
+    ]
+    result = {**RESULT, "segments": [{**segment, "speaker": f"SPEAKER_0{i}"} for i, segment in enumerate(segments)]}
+
+    expected = _render(whisperx_utils.get_writer(output, ""), result, options=options)
+
+    assert get_writer(output, **options).render(result) == expected
+
+
+def test_segments_are_rendered_without_word_layout_by_default():
+    assert WRITERS["srt"]().render(RESULT) == (
+        "1\n00:00:00,000 --> 00:00:01,200\nHello there.\n\n"
+        "2\n00:00:05,000 --> 00:00:07,500\nGeneral Kenobi -> you are\n\n"
+    )
+    assert (
+        WRITERS["tsv"]().render(RESULT)
+        == "start\tend\ttext\n0\t1200\tHello there.\n5000\t7500\tGeneral Kenobi --> you are\n"
+    )
+
+
+def test_single_segments_concatenate_to_the_whole_file():
+    writer = WRITERS["vtt"]()
+    parts = [writer.header()] + [writer.render_segment(segment, i) for i, segment in enumerate(RESULT["segments"], 1)]
+
+    assert "".join(parts) == writer.render(RESULT)
+
+
+def test_json_writer_serializes_engine_segment_objects():
+    faster_whisper = pytest.importorskip("faster_whisper.transcribe")
+    segment = faster_whisper.Segment(
+        id=0,
+        seek=0,
+        start=0.0,
+        end=1.0,
+        text=" hei på deg",
+        tokens=[1, 2],
+        avg_logprob=-0.1,
+        compression_ratio=1.0,
+        no_speech_prob=0.0,
+        words=[faster_whisper.Word(start=0.0, end=0.4, word=" hei", probability=0.9)],
+        temperature=0.0,
+    )
+    result = {"language": "no", "text": " hei på deg", "segments": [segment]}
+
+    rendered = WRITERS["json"]().render(result)
+
+    assert json.loads(rendered) == {**result, "segments": [asdict(segment)]}
+    assert "hei på deg" in rendered
+    assert result["segments"] == [segment]
+
+
+def test_open_ended_segments_end_at_their_start():
+    result = {"segments": [{"text": " tail", "start": 3.0, "end": None}]}
+
+    assert WRITERS["tsv"]().render(result) == "start\tend\ttext\n3000\t3000\ttail\n"
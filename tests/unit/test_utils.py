@@ -0,0 +1,157 @@
+import io
+import shutil
+import tempfile
+import wave
+
+import numpy as np
+import pytest
+from fastapi import UploadFile
+
+from app import utils
+from app.utils import load_audio
+
+requires_ffmpeg = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg CLI not installed")
+
+
+def test_load_audio_without_encode_converts_raw_pcm(sample_audio_data):
+    pcm = (sample_audio_data * 32767).astype(np.int16)
+
+    audio = load_audio(io.BytesIO(pcm.tobytes()), encode=False)
+
+    assert audio.dtype == np.float32
+    np.testing.assert_allclose(audio, pcm.astype(np.float32) / 32768.0)
+
+
+@requires_ffmpeg
+def test_load_audio_streams_file_through_ffmpeg():
+    with open("audio/king_16k.wav", "rb") as f:
+        audio = load_audio(f)
+
+    assert audio.dtype == np.float32
+    # king_16k.wav holds a little over 85 seconds of 16 kHz audio
+    assert 85 * 16000 < len(audio) < 86 * 16000
+    assert np.abs(audio).max() <= 1.0
+
+
+@requires_ffmpeg
+def test_load_audio_reports_ffmpeg_errors():
+    with pytest.raises(RuntimeError, match="Failed to load audio"):
+        load_audio(io.BytesIO(b"not audio" * 100))
+
+
+def _wav_bytes(pcm: np.ndarray, rate: int = 16000, channels: int = 1) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(pcm.dtype.itemsize)
+        f.setframerate(rate)
+        f.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def test_load_audio_decodes_wav_without_ffmpeg(sample_audio_data, monkeypatch):
+    monkeypatch.setattr(utils, "_decode_with_ffmpeg", None)
+    pcm = (sample_audio_data * 32767).astype(np.int16)
+
+    # The header is parsed whether or not encoding was requested
+    for encode in (True, False):
+        audio = load_audio(io.BytesIO(_wav_bytes(pcm)), encode=encode)
+        np.testing.assert_array_equal(audio, pcm.astype(np.float32) / 32768.0)
+
+
+class UploadSpool:
+    """The file API of SpooledTemporaryFile on Python 3.10, which has no seekable() or readinto()."""
+
+    def __init__(self, data: bytes):
+        self._file = tempfile.SpooledTemporaryFile(max_size=1024)
+        self._file.write(data)
+        self._file.seek(0)
+
+    def read(self, *args):
+        return self._file.read(*args)
+
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def tell(self):
+        return self._file.tell()
+
+
+def test_load_audio_decodes_wav_uploads_without_ffmpeg(sample_audio_data, monkeypatch):
+    monkeypatch.setattr(utils, "_decode_with_ffmpeg", None)
+    pcm = (sample_audio_data * 32767).astype(np.int16)
+    expected = pcm.astype(np.float32) / 32768.0
+
+    spool = tempfile.SpooledTemporaryFile(max_size=1024)
+    spool.write(_wav_bytes(pcm))
+    spool.seek(0)
+    upload = UploadFile(spool, filename="speech.wav")
+    np.testing.assert_array_equal(load_audio(upload.file), expected)
+
+    # Read as WAV, not as raw PCM with the header in front, on every supported Python version
+    for encode in (True, False):
+        np.testing.assert_array_equal(load_audio(UploadSpool(_wav_bytes(pcm)), encode=encode), expected)
+
+
+def test_load_audio_downmixes_and_resamples_wav(sample_audio_data, monkeypatch):
+    monkeypatch.setattr(utils, "_decode_with_ffmpeg", None)
+    pcm = (sample_audio_data * 32767).astype(np.int16)
+    stereo = np.stack([pcm, pcm], axis=1)
+
+    audio = load_audio(io.BytesIO(_wav_bytes(stereo, rate=32000, channels=2)))
+
+    assert audio.dtype == np.float32
+    assert len(audio) == len(pcm) // 2
+
+
+@pytest.mark.parametrize(
+    "fmt_chunk",
+    [
+        b"fmt " + (8).to_bytes(4, "little") + bytes(8),
+        b"fmt " + (16).to_bytes(4, "little") + bytes.fromhex("0100 0100 00000000 00000000 0200 1000"),
+    ],
+    ids=["short", "zero_rate"],
+)
+def test_load_audio_leaves_malformed_wav_headers_to_ffmpeg(fmt_chunk, monkeypatch):
+    decoded = []
+    monkeypatch.setattr(utils, "_decode_with_ffmpeg", lambda file, sr: decoded.append(file.read()) or iter(()))
+    data = fmt_chunk + b"data" + (4).to_bytes(4, "little") + bytes(4)
+    wav = b"RIFF" + (4 + len(data)).to_bytes(4, "little") + b"WAVE" + data
+
+    load_audio(io.BytesIO(wav))
+
+    # The whole file, header included, went to ffmpeg
+    assert decoded == [wav]
+
+
+@requires_ffmpeg
+def test_load_audio_wav_fast_path_matches_ffmpeg():
+    with open("audio/king_16k.wav", "rb") as f:
+        data = f.read()
+
+    expected = utils._pcm16_to_float32(list(utils._decode_with_ffmpeg(io.BytesIO(data), 16000)))
+
+    np.testing.assert_array_equal(load_audio(io.BytesIO(data)), expected)
+
+
+@pytest.mark.skipif(utils.soundfile is None, reason="soundfile not installed")
+def test_load_audio_decodes_flac_without_ffmpeg(sample_audio_data, monkeypatch):
+    monkeypatch.setattr(utils, "_decode_with_ffmpeg", None)
+    buffer = io.BytesIO()
+    utils.soundfile.write(buffer, sample_audio_data, 16000, format="FLAC")
+    buffer.seek(0)
+
+    audio = load_audio(buffer)
+
+    np.testing.assert_allclose(audio, sample_audio_data, atol=1 / 32768)
+
+
+def test_load_audio_spools_long_recordings(sample_audio_data):
+    pcm = np.tile((sample_audio_data * 32767).astype(np.int16), 3)
+
+    audio = load_audio(io.BytesIO(pcm.tobytes()), encode=False, spool_threshold=2)
+
+    with audio:
+        assert isinstance(audio, utils.SpooledAudio)
+        assert len(audio) == len(pcm)
+        np.testing.assert_array_equal(audio.window(0, len(audio)), pcm.astype(np.float32) / 32768.0)
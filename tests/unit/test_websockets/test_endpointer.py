@@ -0,0 +1,50 @@
+import numpy as np
+
+from app.audio.ring_buffer import AudioRingBuffer
+from app.websockets.endpointer import Endpointer
+
+RATE = 16000
+
+
+def stream(*parts):
+    """Concatenate (seconds, level in dBFS) parts of white noise into 16-bit PCM."""
+    rng = np.random.default_rng(0)
+    audio = np.concatenate([rng.standard_normal(int(seconds * RATE)) * 10 ** (level / 20) for seconds, level in parts])
+    return (audio * 32767).clip(-32768, 32767).astype(np.int16).tobytes()
+
+
+def speech(seconds, level):
+    """Syllables of noise at ``level`` with short dips in between, like the envelope of speech."""
+    return [part for _ in range(round(seconds / 0.3)) for part in ((0.24, level), (0.06, -60))]
+
+
+def feed(endpointer, pcm, frame_bytes=3200):
+    buffer = AudioRingBuffer(RATE * 20)
+    utterances = []
+    for offset in range(0, len(pcm), frame_bytes):
+        buffer.write(pcm[offset : offset + frame_bytes])
+        utterances += endpointer.process(buffer)
+    return utterances
+
+
+def test_utterances_are_found_between_pauses():
+    endpointer = Endpointer(RATE, silence_ms=300, max_segment_seconds=10, threshold_db=10)
+
+    utterances = feed(endpointer, stream((1.0, -70), (1.5, -20), (1.0, -70), (0.6, -25), (0.5, -70)))
+
+    assert len(utterances) == 2
+    (first_start, first_end), (second_start, second_end) = utterances
+    assert abs(first_start - int(0.8 * RATE)) <= 480 and abs(first_end - int(2.7 * RATE)) <= 480
+    assert abs(second_start - int(3.3 * RATE)) <= 480 and abs(second_end - int(4.3 * RATE)) <= 480
+    assert endpointer.speech_start is None
+
+
+def test_long_speech_is_cut_at_the_segment_limit_and_noise_is_ignored():
+    endpointer = Endpointer(RATE, silence_ms=300, max_segment_seconds=2, threshold_db=10)
+
+    utterances = feed(endpointer, stream((3.0, -45), *speech(4.8, -15)))
+
+    assert len(utterances) == 2
+    assert all(2 * RATE <= end - start < 2 * RATE + endpointer.frame for start, end in utterances)
+    assert utterances[0][0] > 2.7 * RATE
+    assert endpointer.speech_start == utterances[-1][1]
@@ -0,0 +1,108 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import numpy as np
+import pytest
+
+from app.websockets.live_scheduler import LiveScheduler
+from app.websockets.live_session import LiveChunk, LiveSession
+
+
+def make_chunk(label: int) -> LiveChunk:
+    return LiveChunk(audio=np.full(4, label, dtype=np.float32), start=0, offset=0.0, buffer_size=8, submitted_at=0.0)
+
+
+@pytest.mark.asyncio
+async def test_sessions_take_turns_for_the_model():
+    order = []
+    release = asyncio.Event()
+
+    async def process(session, chunk):
+        await release.wait()
+        order.append((session.language, int(chunk.audio[0])))
+
+    scheduler = LiveScheduler(process, concurrency=1, max_pending=8)
+    busy, quiet = LiveSession(AsyncMock(), "busy"), LiveSession(AsyncMock(), "quiet")
+    for session in (busy, quiet):
+        scheduler.open(session)
+    for label in range(3):
+        await scheduler.submit(busy, make_chunk(label))
+    await scheduler.submit(quiet, make_chunk(0))
+
+    assert scheduler.stats()["running"] == 1
+    release.set()
+    while scheduler.stats()["running"] or scheduler.stats()["queued"]:
+        await asyncio.sleep(0)
+
+    assert order == [("busy", 0), ("quiet", 0), ("busy", 1), ("busy", 2)]
+    assert busy.stats.snapshot()["chunks"] == 3
+
+
+@pytest.mark.asyncio
+async def test_full_session_queue_drops_the_oldest_chunk():
+    release = asyncio.Event()
+    processed = []
+
+    async def process(session, chunk):
+        await release.wait()
+        processed.append(int(chunk.audio[0]))
+
+    scheduler = LiveScheduler(process, concurrency=1, max_pending=1)
+    session = LiveSession(AsyncMock(), "no")
+    scheduler.open(session)
+    for label in range(3):
+        await scheduler.submit(session, make_chunk(label))
+
+    release.set()
+    while scheduler.stats()["running"] or scheduler.stats()["queued"]:
+        await asyncio.sleep(0)
+
+    assert processed == [0, 2]
+    assert session.stats.dropped == 1
+    session.websocket.send_text.assert_awaited_once_with("[BUSY]")
+
+
+@pytest.mark.asyncio
+async def test_failed_chunks_are_reported_to_the_session():
+    async def process(session, chunk):
+        raise RuntimeError("boom")
+
+    scheduler = LiveScheduler(process, concurrency=1)
+    session = LiveSession(AsyncMock(), "no")
+    scheduler.open(session)
+    await scheduler.submit(session, make_chunk(0))
+    while scheduler.stats()["running"]:
+        await asyncio.sleep(0)
+
+    session.websocket.send_text.assert_awaited_once_with("[ERROR] boom")
+    scheduler.close(session)
+    assert scheduler.stats()["sessions"] == 0
+
+
+@pytest.mark.asyncio
+async def test_waiting_sessions_of_one_language_share_a_batch():
+    release = asyncio.Event()
+    singles, batches = [], []
+
+    async def process(session, chunk):
+        await release.wait()
+        singles.append(session.language)
+
+    async def process_batch(batch):
+        batches.append(sorted(session.language for session, _ in batch))
+
+    scheduler = LiveScheduler(process, concurrency=1, process_batch=process_batch, batch_size=3)
+    sessions = [LiveSession(AsyncMock(), language) for language in ("no", "no", "sv", "no", "no")]
+    for session in sessions:
+        scheduler.open(session)
+        await scheduler.submit(session, make_chunk(0))
+
+    # The first chunk runs alone, the sessions that waited for it are grouped by language
+    release.set()
+    while scheduler.stats()["running"] or scheduler.stats()["queued"]:
+        await asyncio.sleep(0)
+
+    assert singles == ["no", "sv"]
+    assert batches == [["no", "no", "no"]]
+    assert scheduler.stats()["batched_chunks"] == 3
+    assert all(session.stats.chunks == 1 for session in sessions)
@@ -0,0 +1,236 @@
+import asyncio
+import json
+import time
+from contextlib import nullcontext
+from unittest.mock import AsyncMock, Mock
+
+import numpy as np
+import pytest
+
+from app.asr_models.asr_model import ASRModel
+from app.config import CONFIG
+from app.exceptions import UnsupportedModelError
+from app.services.inference_executor import InferenceExecutor
+from app.websockets.live_session import LiveSession
+from app.websockets.live_transcribe_handler import LiveTranscribeHandler
+
+RESULT = {
+    "text": " hei på deg",
+    "segments": [{"id": 0, "start": 0.0, "end": 1.0, "text": " hei på deg", "words": [{"start": 0.0, "end": 0.4}]}],
+    "language": "no",
+}
+
+
+@pytest.fixture
+def handler():
+    asr_model = Mock(spec=ASRModel)
+    asr_model.select.return_value = asr_model
+    asr_model.use.side_effect = lambda model_name=None: nullcontext(asr_model)
+    asr_model.transcribe_result.side_effect = lambda *args, **kwargs: json.loads(json.dumps(RESULT))
+    asr_model.write_result.side_effect = lambda result, file, output: file.write(result["text"] + "\n")
+    executor = InferenceExecutor(max_workers=1)
+    yield LiveTranscribeHandler(asr_model, executor)
+    executor.shutdown()
+
+
+def make_session(position: int = 0) -> LiveSession:
+    session = LiveSession(AsyncMock(), "no")
+    session.write((np.ones(16000 + position // 2, dtype=np.int16) * 8000).tobytes())
+    session.last_processed_position = position
+    return session
+
+
+@pytest.mark.asyncio
+async def test_json_chunks_are_shifted_and_serialized_once(handler, monkeypatch):
+    monkeypatch.setattr(CONFIG, "LIVE_OUTPUT_FORMAT", "json")
+    monkeypatch.setattr(CONFIG, "LIVE_OVERLAP_CHUNKS", True)
+    session = make_session(position=16000)  # 0.5 seconds of 16-bit samples
+
+    await handler._process_audio_chunk(session, session.take_chunk())
+
+    sent = json.loads(session.websocket.send_text.call_args.args[0])
+    assert sent["segments"][0]["start"] == 0.5
+    assert sent["segments"][0]["words"][0]["end"] == 0.9
+    assert sent["chunk_duration"] == 1.5
+    assert sent["text"] == " hei på deg"
+    handler.asr_model.write_result.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_text_chunks_use_the_model_writer(handler, monkeypatch):
+    monkeypatch.setattr(CONFIG, "LIVE_OUTPUT_FORMAT", "txt")
+    session = make_session()
+    chunk = session.take_chunk()
+
+    await handler._process_audio_chunk(session, chunk)
+    handler.asr_model.transcribe_result.side_effect = lambda *args, **kwargs: {"text": "", "segments": []}
+    await handler._process_audio_chunk(session, chunk)
+
+    sent = [call.args[0] for call in session.websocket.send_text.call_args_list]
+    assert sent == ["hei på deg", "[NO_SPEECH]"]
+
+
+def test_sessions_keep_their_own_buffers(monkeypatch):
+    monkeypatch.setattr(CONFIG, "LIVE_OVERLAP_CHUNKS", True)
+    monkeypatch.setattr(CONFIG, "LIVE_OVERLAP_SIZE", 100)
+    first, second = make_session(), make_session()
+    second.write(b"\x00" * 200)
+
+    chunk = first.take_chunk()
+    first.write((np.ones(10, dtype=np.int16) * -16384).tobytes())
+
+    assert len(chunk.audio) == 16000
+    assert first.buffer_size == 120
+    assert first.take_chunk().audio.tolist() == [8000 / 32768] * 50 + [-0.5] * 10
+    assert second.buffer_size == 32200
+
+
+@pytest.mark.asyncio
+async def test_overwritten_chunks_are_dropped(handler):
+    session = make_session()
+    chunk = session.take_chunk()
+    session.write(bytes(2 * session.buffer.capacity))
+
+    await handler._process_audio_chunk(session, chunk)
+
+    session.websocket.send_text.assert_awaited_once_with("[BUSY]")
+    handler.asr_model.transcribe_result.assert_not_called()
+    assert session.stats.dropped == 1
+
+
+@pytest.mark.asyncio
+async def test_local_agreement_commits_confirmed_words_and_moves_the_window(handler, monkeypatch):
+    monkeypatch.setattr(CONFIG, "LIVE_DECODING", "local_agreement")
+    monkeypatch.setattr(CONFIG, "LIVE_OUTPUT_FORMAT", "txt")
+    words = [{"word": " hei", "start": 0.0, "end": 0.3}, {"word": " på", "start": 0.35, "end": 0.6}]
+    words.append({"word": " deg", "start": 0.65, "end": 1.0})
+    result = {"text": " hei på deg", "segments": [{"start": 0.0, "end": 1.0, "text": " hei på deg", "words": words}]}
+    handler.asr_model.transcribe_result.side_effect = lambda *args, **kwargs: result
+    session = make_session()
+
+    await handler._process_audio_chunk(session, session.take_chunk())
+    session.write((np.ones(16000, dtype=np.int16) * 8000).tobytes())
+    await handler._process_audio_chunk(session, session.take_chunk())
+
+    sent = [call.args[0] for call in session.websocket.send_text.call_args_list]
+    assert sent == ["[TENTATIVE] hei på deg", "hei på deg"]
+    assert session.agreement.tentative == []
+    assert session.buffer_start == 16000
+    assert handler.asr_model.transcribe_result.call_args.kwargs["word_timestamps"] is True
+
+
+@pytest.mark.asyncio
+async def test_endpointing_only_transcribes_utterances(handler, monkeypatch):
+    monkeypatch.setattr(CONFIG, "LIVE_ENDPOINTING", True)
+    monkeypatch.setattr(CONFIG, "LIVE_OUTPUT_FORMAT", "json")
+    rng = np.random.default_rng(0)
+    quiet = (rng.standard_normal(16000) * 3).astype(np.int16)
+    syllable = np.concatenate([(rng.standard_normal(3840) * 3000).astype(np.int16), quiet[:960]])
+    session = LiveSession(AsyncMock(), "no")
+
+    for pcm in (quiet, np.tile(syllable, 4), quiet):
+        for frame in np.array_split(pcm, 10):
+            session.write(frame.tobytes())
+            await handler._on_audio(session)
+    while handler.scheduler.stats()["running"]:
+        await asyncio.sleep(0.01)
+
+    assert handler.asr_model.transcribe_result.call_count == 1
+    audio = handler.asr_model.transcribe_result.call_args.args[0]
+    assert 1.2 <= len(audio) / 16000 <= 1.8
+    sent = [call.args[0] for call in session.websocket.send_text.call_args_list]
+    assert set(sent[:-1]) <= {"[BUFFERING]", "[SILENCE]"}
+    assert json.loads(sent[-1])["segments"][0]["start"] == pytest.approx(0.8, abs=0.05)
+
+
+def test_chunk_size_follows_the_real_time_factor(monkeypatch):
+    monkeypatch.setattr(CONFIG, "LIVE_CHUNK_SIZE", 32000)
+    monkeypatch.setattr(CONFIG, "LIVE_MAX_CHUNK_SIZE", 64000)
+    monkeypatch.setattr(CONFIG, "LIVE_TARGET_RTF", 0.5)
+    session = make_session()
+    chunk = session.take_chunk()._replace(submitted_at=time.monotonic() - 2)
+
+    session.finish_chunk(chunk, started=time.monotonic() - 1.5)
+    assert session.stats.rtf == pytest.approx(1.5, abs=0.01)
+    assert session.chunk_size == 48000
+
+    for _ in range(10):
+        session.finish_chunk(chunk._replace(submitted_at=time.monotonic()), started=time.monotonic())
+    assert session.chunk_size == 32000
+
+
+def test_empty_first_chunk_keeps_the_chunk_size():
+    session = make_session()
+    chunk = session.take_segment(100, 100)
+
+    session.finish_chunk(chunk, started=time.monotonic())
+    assert session.stats.rtf is None
+    assert session.chunk_size == CONFIG.LIVE_CHUNK_SIZE
+
+
+@pytest.mark.asyncio
+async def test_empty_chunks_are_never_submitted(handler):
+    handler.scheduler = AsyncMock()
+    session = make_session()
+
+    await handler._submit(session, session.take_segment(100, 100))
+    handler.scheduler.submit.assert_not_called()
+
+
+@pytest.mark.parametrize("policy", ["merge", "drop"])
+@pytest.mark.asyncio
+async def test_lagging_sessions_merge_or_drop_waiting_chunks(handler, monkeypatch, policy):
+    monkeypatch.setattr(CONFIG, "LIVE_LAG_POLICY", policy)
+    monkeypatch.setattr(CONFIG, "LIVE_MAX_LAG_SECONDS", 5)
+    monkeypatch.setattr(CONFIG, "LIVE_OVERLAP_CHUNKS", False)
+    handler.scheduler = AsyncMock()
+    session = make_session()
+    session.pending.append(session.take_chunk()._replace(submitted_at=time.monotonic() - 8))
+    session.write((np.ones(16000, dtype=np.int16) * 8000).tobytes())
+
+    await handler._submit(session, session.take_chunk())
+
+    chunk = handler.scheduler.submit.call_args.args[1]
+    assert handler.scheduler.submit.call_args.kwargs["replace"] is True
+    assert len(chunk.audio) == (32000 if policy == "merge" else 16000)
+    sent = [call.args[0] for call in session.websocket.send_text.call_args_list]
+    assert sent[-1].startswith("[LAG] 8.")
+    assert session.stats.snapshot()["merged" if policy == "merge" else "dropped"] == 1
+
+
+@pytest.mark.asyncio
+async def test_batched_results_go_back_to_their_own_sessions(handler, monkeypatch):
+    monkeypatch.setattr(CONFIG, "LIVE_OUTPUT_FORMAT", "txt")
+    handler.asr_model.transcribe_batch.side_effect = lambda audios, **kwargs: [
+        {"text": f" {len(audio)}", "segments": []} for audio in audios
+    ]
+    first, second = make_session(), make_session(position=16000)
+
+    await handler._process_batch([(first, first.take_chunk()), (second, second.take_chunk())])
+
+    handler.asr_model.transcribe_result.assert_not_called()
+    first.websocket.send_text.assert_awaited_once_with("16000")
+    second.websocket.send_text.assert_awaited_once_with("24000")
+
+
+@pytest.mark.asyncio
+async def test_unknown_audio_formats_close_the_connection(handler):
+    websocket = AsyncMock()
+
+    await handler.handle_connection(websocket, "no", audio_format="mp3")
+
+    assert websocket.send_text.call_args.args[0].startswith("[ERROR] Invalid audio format 'mp3'")
+    websocket.close.assert_awaited_once_with(code=1003)
+    assert handler.scheduler.stats()["sessions"] == 0
+
+
+@pytest.mark.asyncio
+async def test_unknown_models_close_the_connection(handler):
+    websocket = AsyncMock()
+    handler.asr_model.resolve_model_name.side_effect = UnsupportedModelError("Unsupported model: tiny")
+
+    await handler.handle_connection(websocket, "no", model="tiny")
+
+    assert websocket.send_text.call_args.args[0] == "[ERROR] Unsupported model: tiny"
+    websocket.close.assert_awaited_once_with(code=1003)
+    assert handler.scheduler.stats()["sessions"] == 0
@@ -0,0 +1,50 @@
+from app.output.segments import Word
+from app.websockets.local_agreement import LocalAgreement, result_words
+
+
+def words(*timed):
+    return [Word(" " + text, start, start + 0.4) for text, start in timed]
+
+
+def test_words_are_committed_once_two_passes_agree():
+    agreement = LocalAgreement()
+
+    assert agreement.insert(words(("hei", 0.0), ("på", 0.5))) == ([], words(("hei", 0.0), ("på", 0.5)))
+    committed, tentative = agreement.insert(words(("Hei,", 0.0), ("på", 0.5), ("deg", 1.0)))
+
+    assert [word.word for word in committed] == [" Hei,", " på"]
+    assert tentative == words(("deg", 1.0))
+    assert agreement.committed_end == 0.9
+
+
+def test_repeated_words_after_a_commit_are_skipped():
+    agreement = LocalAgreement()
+    agreement.insert(words(("hei", 0.0), ("på", 0.5)))
+    agreement.insert(words(("hei", 0.0), ("på", 0.5)))
+
+    # The next window starts at the commit, the model hears the end of the last word again
+    committed, tentative = agreement.insert(words(("på", 0.85), ("deg", 1.0)))
+
+    assert committed == []
+    assert tentative == words(("deg", 1.0))
+    assert agreement.flush() == words(("deg", 1.0))
+
+
+def test_result_words_are_shifted_and_spread_over_segments_without_words():
+    result = {
+        "segments": [
+            {
+                "start": 0.0,
+                "end": 1.0,
+                "text": "General Kenobi",
+                "words": [{"word": "General", "start": 0.1, "end": 0.5}],
+            },
+            {"start": 1.0, "end": 2.0, "text": " you are"},
+        ]
+    }
+
+    assert result_words(result, 10.0) == [
+        Word(" General", 10.1, 10.5),
+        Word(" you", 11.0, 11.5),
+        Word(" are", 11.5, 12.0),
+    ]